@@ -1,13 +1,17 @@
+import asyncio
 import logging
 import os
 import json
-import requests
+import httpx
 from typing import Literal
 
 from pydantic import BaseModel, Field
 from langgraph.graph import StateGraph, END
 
-from .tools import get_usage, list_processes, stop_agent
+from .router import decision_cache, decision_key, route
+from .timing import span
+from .toolcall import MalformedToolCall, ToolCallParser
+from .tools import get_usage, get_usage_all, list_processes, list_processes_all, stop_agent
 
 logger = logging.getLogger("backend_agentic.graph")
 
@@ -26,22 +30,59 @@ class GetUsage(BaseModel):
 
 class ListProcesses(BaseModel):
     machine_url: str = Field(..., description="URL")
-KRUTRIM_API_URL = "https://cloud.olakrutrim.com/v1/chat/completions"
+
+class ClusterGetUsage(BaseModel):
+    pid: int = Field(..., description="PID, looked up on every machine")
+
+class ClusterListProcesses(BaseModel):
+    pass
+KRUTRIM_API_URL = os.getenv("KRUTRIM_API_URL", "https://cloud.olakrutrim.com/v1/chat/completions")
 KRUTRIM_MODEL = "Qwen3-Next-80B-A3B-Instruct"
+KRUTRIM_TIMEOUT = 12
+KRUTRIM_STREAM = os.getenv("KRUTRIM_STREAM", "1") != "0"
+
+_llm_client: httpx.AsyncClient | None = None
+
+def get_llm_client() -> httpx.AsyncClient:
+    global _llm_client
+    if _llm_client is None or _llm_client.is_closed:
+        _llm_client = httpx.AsyncClient(timeout=KRUTRIM_TIMEOUT)
+    return _llm_client
+
+async def close_llm_client():
+    global _llm_client
+    if _llm_client is not None:
+        await _llm_client.aclose()
+        _llm_client = None
 
 def should_continue(state: AgentState) -> Literal["tools", "__end__"]:
     return "tools"
 
-def call_model(state: AgentState):
+async def call_model(state: AgentState):
     logger.info("🤖 Agent thinking | query=%s \n machines=%s", state.query, len(state.machines))
+    with span("agent.route"):
+        decision = route(state.query, state.machines)
+    if decision:
+        logger.info("⚡ Fast path: tool=%s args=%s", decision["tool_name"], decision["tool_args"])
+        return decision
+    cache_key = decision_key(state.query, state.machines)
+    decision = decision_cache.get(cache_key)
+    if decision:
+        logger.info("⚡ Cached decision: tool=%s args=%s", decision["tool_name"], decision["tool_args"])
+        return decision
+    return await call_llm(state, cache_key)
+
+async def call_llm(state: AgentState, cache_key: tuple[str, str]):
     api_key = os.getenv("KRUTRIM_API_KEY")
     logger.info("🔑 Krutrim API key present=%s", "yes" if api_key else "no")
     sys_msg = (
         "ROLE: Tool Router. "
-        "TOOLS: GetUsage, ListProcesses, Stop. "
+        "TOOLS: GetUsage, ListProcesses, ClusterGetUsage, ClusterListProcesses, Stop. "
         "SCHEMA: "
         "GetUsage {tool:\"GetUsage\", args:{machine_url:string(one of machines[].url), pid:int, interval?:number, samples?:number}}. "
         "ListProcesses {tool:\"ListProcesses\", args:{machine_url:string(one of machines[].url)}}. "
+        "ClusterGetUsage {tool:\"ClusterGetUsage\", args:{pid:int}}. "
+        "ClusterListProcesses {tool:\"ClusterListProcesses\", args:{}}. "
         "Stop {tool:\"Stop\", args:{}}. "
         "MACHINES: " + json.dumps(state.machines) + ". "
         "RULES: "
@@ -50,10 +91,13 @@ def call_model(state: AgentState):
         "3) Map machine by name; set machine_url to that machine's url. If no name matches, use the first machine. "
         "4) If the request is to list/show processes or no pid is specified, choose ListProcesses. "
         "5) For stop/cancel/end, choose Stop. "
+        "6) If the request is about all/every machine(s), everywhere, or asks which machine, choose ClusterListProcesses or ClusterGetUsage (with pid). "
         "EXAMPLES: "
         "Monitor process id 123 on machine alpha -> {\"tool\":\"GetUsage\",\"args\":{\"machine_url\":\"http://127.0.0.1:8001\",\"pid\":123}} "
         "Monitor id 123 every 2s for 3 samples -> {\"tool\":\"GetUsage\",\"args\":{\"machine_url\":\"http://127.0.0.1:8001\",\"pid\":123,\"interval\":2,\"samples\":3}} "
         "list processes on beta -> {\"tool\":\"ListProcesses\",\"args\":{\"machine_url\":\"http://127.0.0.1:8001\"}} "
+        "list processes everywhere -> {\"tool\":\"ClusterListProcesses\",\"args\":{}} "
+        "which machine is running pid 42 hot -> {\"tool\":\"ClusterGetUsage\",\"args\":{\"pid\":42}} "
         "stop -> {\"tool\":\"Stop\",\"args\":{}}"
     )
     payload = {
@@ -70,57 +114,77 @@ def call_model(state: AgentState):
         "Content-Type": "application/json",
     }
     try:
-        logger.info("🤖 Calling Krutrim model=%s", KRUTRIM_MODEL)
-        r = requests.post(KRUTRIM_API_URL, headers=headers, json=payload, timeout=12)
-        data = r.json()
-        content = data.get("choices", [{}])[0].get("message", {}).get("content", "{}")
-        logger.info("🤖 Krutrim status=%s", r.status_code)
-        logger.info("🤖 Krutrim raw content=%s", (content[:1000] + ("..." if len(content) > 1000 else "")))
-        try:
-            parsed = json.loads(content)
-        except Exception:
-            parsed = {}
-            if "```" in content:
-                fence_start = content.find("```")
-                fence_end = content.find("```", fence_start + 3)
-                snippet = content[fence_start + 3:fence_end] if fence_end != -1 else content[fence_start + 3:]
-                brace_start = snippet.find("{")
-                brace_end = snippet.rfind("}")
-                if brace_start != -1 and brace_end != -1 and brace_end > brace_start:
-                    try:
-                        parsed = json.loads(snippet[brace_start:brace_end+1])
-                    except Exception:
-                        parsed = {}
-            if not parsed:
-                brace_start = content.find("{")
-                brace_end = content.rfind("}")
-                if brace_start != -1 and brace_end != -1 and brace_end > brace_start:
-                    try:
-                        parsed = json.loads(content[brace_start:brace_end+1])
-                    except Exception:
-                        parsed = {}
-        tool_name = parsed.get("tool")
-        tool_args = parsed.get("args", {})
-        logger.info("🤖 Agent Infers: tool=%s args=%s", tool_name, tool_args)
-        if tool_name:
-            return {"tool_name": tool_name, "tool_args": tool_args}
-        else:
-            logger.warning("⚠️ Krutrim call failed")
-            return {"tool_name": None, "tool_args": {}}
+        logger.info("🤖 Calling Krutrim model=%s stream=%s", KRUTRIM_MODEL, KRUTRIM_STREAM)
+        with span("agent.llm"):
+            if KRUTRIM_STREAM:
+                decision = await asyncio.wait_for(_stream_decision(headers, payload), KRUTRIM_TIMEOUT)
+            else:
+                r = await get_llm_client().post(KRUTRIM_API_URL, headers=headers, json=payload)
+                logger.info("🤖 Krutrim status=%s", r.status_code)
+                decision = _decision_from_content(_completion_content(r.json()))
+    except MalformedToolCall as e:
+        logger.warning("⚠️ Krutrim output rejected: %s", e)
+        return {"tool_name": None, "tool_args": {}}
     except Exception:
         logger.warning("⚠️ Krutrim call failed")
         return {"tool_name": None, "tool_args": {}}
+    logger.info("🤖 Agent Infers: tool=%s args=%s", decision["tool_name"], decision["tool_args"])
+    decision_cache.put(cache_key, decision)
+    return decision
+
+async def _stream_decision(headers: dict, payload: dict) -> dict:
+    """
+    Streams the completion and returns as soon as the tool call is
+    dispatchable. Leaving the stream early closes the connection, which
+    stops the generation.
+    """
+    parser = ToolCallParser()
+    async with get_llm_client().stream("POST", KRUTRIM_API_URL, headers=headers,
+                                       json={**payload, "stream": True}) as r:
+        logger.info("🤖 Krutrim status=%s", r.status_code)
+        if "text/event-stream" not in r.headers.get("content-type", ""):
+            # Provider answered without streaming
+            return _decision_from_content(_completion_content(json.loads(await r.aread())))
+        async for line in r.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            choices = json.loads(data).get("choices") or [{}]
+            decision = parser.feed((choices[0].get("delta") or {}).get("content") or "")
+            if decision:
+                logger.info("⚡ Tool call complete after %s chars", len(parser.text))
+                return decision
+    return _decision_from_content(parser.text)
+
+def _completion_content(data: dict) -> str:
+    return data.get("choices", [{}])[0].get("message", {}).get("content", "{}")
+
+def _decision_from_content(content: str) -> dict:
+    """Parses a complete reply, tolerating code fences and surrounding prose."""
+    logger.info("🤖 Krutrim raw content=%s", (content[:1000] + ("..." if len(content) > 1000 else "")))
+    parser = ToolCallParser()
+    parser.feed(content)
+    decision = parser.decision
+    if decision is None:
+        raise MalformedToolCall("incomplete tool call")
+    return decision
 
-def call_tool(state: AgentState):
+async def call_tool(state: AgentState):
     tool_name = state.tool_name
     tool_args = state.tool_args or {}
     if not tool_name:
         return {"result": {"error": "no_tool"}}
     logger.info("🤖 Agent decided to use tool: %s with args: %s", tool_name, tool_args)
     if tool_name == "GetUsage":
-        result = get_usage(**tool_args)
+        result = await get_usage(**tool_args)
     elif tool_name == "ListProcesses":
-        result = list_processes(**tool_args)
+        result = await list_processes(**tool_args)
+    elif tool_name == "ClusterGetUsage":
+        result = await get_usage_all(state.machines, int(tool_args.get("pid", 0)))
+    elif tool_name == "ClusterListProcesses":
+        result = await list_processes_all(state.machines)
     elif tool_name == "Stop":
         result = stop_agent()
     else:
@@ -1,15 +1,25 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Body
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Body, Query
 from fastapi.middleware.cors import CORSMiddleware
-import asyncio
 import time
 import logging
 import json
 import os
 from pathlib import Path
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from dotenv import load_dotenv
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    from .agent_graph import close_llm_client
+    from .scheduler import scheduler
+    from .tools import close_clients
+    await scheduler.stop()
+    await close_clients()
+    await close_llm_client()
+
+app = FastAPI(lifespan=lifespan)
 
 logger = logging.getLogger("backend_agentic")
 logging.basicConfig(level=logging.INFO)
@@ -39,77 +49,141 @@ _load_env()
 logger.info("🔑 KRUTRIM_API_KEY present=%s", "yes" if os.getenv("KRUTRIM_API_KEY") else "no")
 
 from .agent_graph import graph, call_model, AgentState
-from .tools import get_usage, list_processes
+from .outbox import POLICIES, SEND_QUEUE_POLICY, SEND_QUEUE_SIZE, ClientOutbox
+from .scheduler import scheduler
+from .streams import DEFAULT_STREAM_ID, ConnectionStreams
+from .timing import span, timings
+from .wire import WIRE_BATCH_MS, WIRE_BATCH_SIZE, WIRE_ENCODING, Codec, available_encodings
+from .tools import get_usage_all, list_processes, list_processes_all
 
 @app.get("/")
 def root():
     return {"status": "ok"}
 
+@app.get("/streams/stats")
+def streams_stats():
+    return scheduler.stats()
+
+@app.get("/debug/timings")
+def debug_timings(reset: bool = Query(default=False)):
+    snapshot = timings.snapshot()
+    if reset:
+        timings.reset()
+    return snapshot
+
 @app.post("/agent/query")
-def agent_query(payload: dict = Body(...)):
+async def agent_query(payload: dict = Body(...)):
     query = str(payload.get("query", ""))
     machines = payload.get("machines", [])
     inputs = {"query": query, "machines": machines}
-    result = graph.invoke(inputs)
+    with span("agent.query"):
+        result = await graph.ainvoke(inputs)
     return {"result": result.get("result")}
 
 @app.websocket("/ws")
 async def ws_endpoint(ws: WebSocket):
     await ws.accept()
-    task = None
+    policy = ws.query_params.get("queue_policy", SEND_QUEUE_POLICY)
+    if policy not in POLICIES:
+        await ws.send_json({"error": "invalid_queue_policy", "policies": list(POLICIES)})
+        policy = SEND_QUEUE_POLICY
+    try:
+        queue_size = int(ws.query_params.get("queue_size", SEND_QUEUE_SIZE))
+    except ValueError:
+        queue_size = SEND_QUEUE_SIZE
+    try:
+        codec = Codec(
+            ws.query_params.get("encoding", WIRE_ENCODING),
+            int(ws.query_params.get("batch", WIRE_BATCH_SIZE)),
+            float(ws.query_params.get("batch_ms", WIRE_BATCH_MS)),
+        )
+    except ValueError:
+        await ws.send_json({"error": "invalid_encoding", "encodings": available_encodings()})
+        codec = Codec("json", 1, 0)
+    outbox = ClientOutbox(ws.send_text, close=lambda code: ws.close(code=code), maxsize=queue_size,
+                          policy=policy, codec=codec, send_bytes=ws.send_bytes)
+    outbox.start()
+    streams = ConnectionStreams(outbox)
     try:
         while True:
             raw = await ws.receive_text()
             try:
                 payload = json.loads(raw)
             except Exception:
-                await ws.send_json({"error": "invalid_payload"})
+                outbox.put({"error": "invalid_payload"})
+                continue
+            if not isinstance(payload, dict):
+                outbox.put({"error": "invalid_payload"})
+                continue
+            stream_id = payload.get("stream_id")
+            stream_id = str(stream_id) if stream_id is not None else None
+            if payload.get("type") == "stop":
+                stopped = streams.stop(stream_id)
+                logger.info("🛑 Agent stopped streams=%s", stopped)
+                outbox.put({"type": "stopped", "stream_ids": stopped})
+                continue
+            if payload.get("type") == "modify":
+                try:
+                    interval = payload.get("interval")
+                    interval = float(interval) if interval is not None else None
+                    samples = payload.get("samples")
+                    samples = int(samples) if samples is not None else None
+                    if (interval is not None and not 0 < interval < float("inf")) or (samples is not None and samples < 1):
+                        raise ValueError
+                except (TypeError, ValueError):
+                    outbox.put({"error": "invalid_modify", "stream_id": stream_id})
+                    continue
+                stream = streams.modify(stream_id or DEFAULT_STREAM_ID, interval=interval, samples=samples)
+                if stream is None:
+                    outbox.put({"error": "unknown_stream", "stream_id": stream_id})
+                else:
+                    outbox.put({"type": "stream_modified", **stream.info()})
+                continue
+            if payload.get("type") == "queue_stats":
+                outbox.put(outbox.stats())
                 continue
-            if isinstance(payload, dict) and payload.get("type") == "stop":
-                if task and not task.done():
-                    task.cancel()
-                task = None
-                logger.info("🛑 Agent stopped")
-                await ws.send_json({"type": "stopped"})
+            if payload.get("type") == "streams":
+                outbox.put({"type": "streams", "data": streams.info()})
                 continue
             query = str(payload.get("query", ""))
             machines = payload.get("machines", [])
             state = AgentState(query=query, machines=machines)
-            decision = call_model(state)
+            with span("agent.call_model"):
+                decision = await call_model(state)
             tool = decision.get("tool_name")
             args = decision.get("tool_args", {})
             if tool == "GetUsage":
+                if payload.get("timings") and not codec.supports_timings:
+                    outbox.put({"error": "timings_unsupported", "encoding": codec.encoding})
+                    continue
                 base_url = str(args.get("machine_url", ""))
                 pid = int(args.get("pid", 0))
                 interval = float(args.get("interval", 0)) if args.get("interval") is not None else 0.0
                 samples = int(args.get("samples", 1)) if args.get("samples") is not None else 1
-                async def loop_samples():
-                    count = 0
-                    while True:
-                        try:
-                            usage = get_usage(base_url, pid)
-                        except Exception:
-                            usage = None
-                        await ws.send_json({"ts": time.time(), "type": "usage", "data": usage})
-                        count += 1
-                        if samples and count >= samples:
-                            break
-                        await asyncio.sleep(interval if interval and interval > 0 else 0)
-                if task and not task.done():
-                    task.cancel()
-                task = asyncio.create_task(loop_samples())
+                stream = streams.start(stream_id, base_url, pid, interval, samples, bool(payload.get("timings")))
+                if stream is None:
+                    outbox.put({"error": "too_many_streams", "limit": streams.max_streams})
+                else:
+                    outbox.put({"type": "stream_started", **stream.info()})
             elif tool == "ListProcesses":
                 base_url = str(args.get("machine_url", ""))
-                procs = list_processes(base_url)
-                await ws.send_json({"ts": time.time(), "type": "processes", "data": procs})
+                procs = await list_processes(base_url)
+                outbox.put({"ts": time.time(), "type": "processes", "data": procs})
+            elif tool == "ClusterListProcesses":
+                merged = await list_processes_all(machines)
+                outbox.put({"ts": time.time(), "type": "processes", "data": merged["processes"],
+                            "hosts": merged["hosts"], "partial": merged["partial"]})
+            elif tool == "ClusterGetUsage":
+                merged = await get_usage_all(machines, int(args.get("pid", 0)))
+                outbox.put({"ts": time.time(), "type": "cluster_usage", "data": merged["usage"],
+                            "hosts": merged["hosts"], "partial": merged["partial"]})
             elif tool == "Stop":
-                if task and not task.done():
-                    task.cancel()
-                task = None
-                await ws.send_json({"type": "stopped"})
+                stopped = streams.stop(stream_id)
+                outbox.put({"type": "stopped", "stream_ids": stopped})
             else:
-                await ws.send_json({"error": "no_tool", "args": args})
+                outbox.put({"error": "no_tool", "args": args})
     except WebSocketDisconnect:
-        if task and not task.done():
-            task.cancel()
         return
+    finally:
+        streams.stop()
+        outbox.stop()
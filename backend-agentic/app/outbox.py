@@ -0,0 +1,211 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+
+from .timing import timings
+from .wire import Codec
+
+logger = logging.getLogger("backend_agentic.outbox")
+
+SEND_QUEUE_SIZE = int(os.getenv("SEND_QUEUE_SIZE", "256"))
+SEND_QUEUE_POLICY = os.getenv("SEND_QUEUE_POLICY", "conflate")
+SEND_QUEUE_STATS_INTERVAL = float(os.getenv("SEND_QUEUE_STATS_INTERVAL", "1.0"))
+
+# conflate:    keep only the newest unsent sample of each stream
+# drop_oldest: keep up to `maxsize` samples, dropping the oldest when full
+# disconnect:  close the socket once `maxsize` samples are waiting
+POLICIES = ("conflate", "drop_oldest", "disconnect")
+
+# WebSocket close code for "try again later"
+CLOSE_OVERLOADED = 1013
+
+
+class _Entry:
+    __slots__ = ("message", "stream_id", "enqueued")
+
+    def __init__(self, message: dict, stream_id: str | None):
+        self.message = message
+        self.stream_id = stream_id
+        self.enqueued = time.monotonic()
+
+
+class ClientOutbox:
+    """
+    Bounded, per-connection outbound queue drained by one writer task.
+
+    Stream samples are subject to the backpressure policy; control messages
+    (replies, stream_done, errors) are never dropped. Everything is sent in
+    the order it was queued. When samples are dropped or conflated, the
+    client receives a "queue_stats" message with the counters, at most once
+    per SEND_QUEUE_STATS_INTERVAL.
+
+    `send` takes text frames and `send_bytes` binary ones. With a batching
+    codec, consecutive samples are collected (up to the codec's batch size,
+    waiting at most batch_ms for more) and sent as one encoded frame.
+    """
+
+    def __init__(self, send, close=None, maxsize: int = SEND_QUEUE_SIZE, policy: str = SEND_QUEUE_POLICY,
+                 codec: Codec | None = None, send_bytes=None):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown queue policy '{policy}'")
+        self.send = send
+        self.send_bytes = send_bytes
+        self.close_fn = close
+        self.codec = codec or Codec("json", 1, 0)
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self._queue: deque[_Entry] = deque()
+        self._pending: dict[str, _Entry] = {} # conflate: stream id -> queued sample
+        self._samples = 0
+        self._ready = asyncio.Event()
+        self._writer: asyncio.Task | None = None
+        self.overflowed = False
+        self.sent = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.lag = 0.0
+        self.frames = 0
+        self.bytes_sent = 0
+        self.encode_time = 0.0
+        self._reported = (0, 0)
+        self._reported_at = 0.0
+
+    def start(self):
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._writer and not self._writer.done():
+            self._writer.cancel()
+
+    def put(self, message: dict, stream_id: str | None = None):
+        """Queues a message; pass `stream_id` for droppable stream samples."""
+        if stream_id is None:
+            self._queue.append(_Entry(message, None))
+        elif self.policy == "conflate":
+            entry = self._pending.get(stream_id)
+            if entry is not None:
+                # Newest value, but keeps the older sample's place in line
+                entry.message = message
+                self.conflated += 1
+                return
+            entry = _Entry(message, stream_id)
+            self._pending[stream_id] = entry
+            self._queue.append(entry)
+            self._samples += 1
+        else:
+            if self._samples >= self.maxsize:
+                if self.policy == "disconnect":
+                    self.overflowed = True
+                    self._ready.set()
+                    return
+                self._drop_oldest_sample()
+            self._queue.append(_Entry(message, stream_id))
+            self._samples += 1
+        self._ready.set()
+
+    def stats(self) -> dict:
+        return {
+            "type": "queue_stats",
+            "policy": self.policy,
+            "depth": len(self._queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+            "lag_ms": self.lag * 1000.0,
+            "frames": self.frames,
+            "bytes_sent": self.bytes_sent,
+            "encode_ms": self.encode_time * 1000.0,
+            **self.codec.info(),
+        }
+
+    def _drop_oldest_sample(self):
+        for entry in self._queue:
+            if entry.stream_id is not None:
+                self._queue.remove(entry)
+                self._samples -= 1
+                self.dropped += 1
+                return
+
+    def _pop(self) -> _Entry:
+        entry = self._queue.popleft()
+        if entry.stream_id is not None:
+            self._samples -= 1
+            if self._pending.get(entry.stream_id) is entry:
+                del self._pending[entry.stream_id]
+        return entry
+
+    async def _run(self):
+        try:
+            while True:
+                while not self._queue and not self.overflowed:
+                    self._ready.clear()
+                    await self._ready.wait()
+                if self.overflowed:
+                    logger.warning("⚠️ Client fell %s samples behind, disconnecting", self.maxsize)
+                    if self.close_fn:
+                        await self.close_fn(CLOSE_OVERLOADED)
+                    return
+                entry = self._pop()
+                self.lag = time.monotonic() - entry.enqueued
+                timings.record("ws.queue_lag", int(self.lag * 1e9))
+                if entry.stream_id is not None and self.codec.batched:
+                    batch = await self._collect(entry)
+                    await self._send_frame(self.codec.encode, [e.message for e in batch])
+                    self.sent += len(batch)
+                else:
+                    await self._send_frame(_dumps, entry.message)
+                    self.sent += 1
+                await self._maybe_report()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning("⚠️ Outbox writer stopped: client unreachable")
+
+    async def _collect(self, first: _Entry) -> list[_Entry]:
+        """Gathers the samples queued right behind `first` into one batch."""
+        batch = [first]
+        deadline = time.monotonic() + self.codec.batch_ms / 1000.0
+        while len(batch) < self.codec.batch_size and not self.overflowed:
+            if self._queue:
+                if self._queue[0].stream_id is None:
+                    break # Control messages keep their place in line
+                batch.append(self._pop())
+                continue
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _send_frame(self, encode, payload):
+        start = time.perf_counter()
+        frame = encode(payload)
+        self.encode_time += time.perf_counter() - start
+        self.frames += 1
+        self.bytes_sent += len(frame)
+        start = time.perf_counter_ns()
+        if isinstance(frame, bytes):
+            await self.send_bytes(frame)
+        else:
+            await self.send(frame)
+        timings.record("ws.send", time.perf_counter_ns() - start)
+
+    async def _maybe_report(self):
+        counters = (self.dropped, self.conflated)
+        now = time.monotonic()
+        if counters != self._reported and now - self._reported_at >= SEND_QUEUE_STATS_INTERVAL:
+            self._reported = counters
+            self._reported_at = now
+            await self._send_frame(_dumps, self.stats())
+
+
+def _dumps(message: dict) -> str:
+    return json.dumps(message, separators=(",", ":"))
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger("backend_agentic.router")
+
+ROUTER_CACHE_SIZE = int(os.getenv("ROUTER_CACHE_SIZE", "512"))
+
+# --- Deterministic fast path ---
+#
+# Handles the common command shapes without calling the model. Every rule
+# must account for the whole query; anything it doesn't fully understand
+# returns None and goes to the LLM.
+
+_STOP = re.compile(r"^(?:please )?(?:stop|cancel|end|halt|quit|abort)(?: (?:it|all|now|monitoring|streaming|watching|everything))*$")
+_CLUSTER = re.compile(r"\b(?:everywhere|on (?:all|every) (?:the )?machines?|across (?:all )?(?:the )?machines|on all hosts|cluster[- ]wide)\b")
+_LIST = re.compile(
+    r"^(?:please )?(?:list|show|get|display|ps)(?: me)?(?: all| the)?(?: running)?"
+    r"(?: (?:processes|procs|process list|ps))?(?: (?:on|at|from|in) (?:machine |host )?(?P<machine>.+))?$"
+)
+_USAGE = re.compile(
+    r"^(?:please )?(?:(?:monitor|watch|track|get|show|check|sample|stream)(?: me)? )?(?:the )?"
+    r"(?:(?:resource )?(?:usage|stats) (?:of |for )?)?(?:process|proc|pid)?(?: id)?(?: (?:no\.?|number))? ?#?(?P<pid>\d+)(?P<rest>.*)$"
+)
+_INTERVAL = re.compile(r"\bevery (?P<n>\d+(?:\.\d+)?)? ?(?P<unit>ms|milliseconds?|s|secs?|seconds?|m|mins?|minutes?)\b")
+_SAMPLES = re.compile(r"\bfor (?P<n>\d+) (?:samples?|times|readings?|ticks?)\b")
+_MACHINE = re.compile(r"\b(?:on|at|from|in) (?:machine |host )?(?P<machine>[\w.:/-]+)")
+_FILLER = re.compile(r"\b(?:and|with|please|then)\b|[,.!]")
+
+_UNITS = {"ms": 0.001, "millisecond": 0.001, "milliseconds": 0.001, "m": 60.0, "min": 60.0,
+          "mins": 60.0, "minute": 60.0, "minutes": 60.0}
+
+
+def normalize_query(query: str) -> str:
+    return " ".join((query or "").lower().split()).rstrip(" ?.!")
+
+
+def _find_machine(name: str, machines: list[dict]) -> dict | None:
+    name = name.strip()
+    for m in machines:
+        if str(m.get("name", "")).lower() == name or str(m.get("url", "")).lower().rstrip("/") == name.rstrip("/"):
+            return m
+    return None
+
+
+def _default_machine(machines: list[dict]) -> dict | None:
+    return machines[0] if machines else None
+
+
+def route(query: str, machines: list[dict]) -> dict | None:
+    """Returns {"tool_name", "tool_args"} for recognised commands, else None."""
+    q = normalize_query(query)
+    if not q:
+        return None
+
+    if _STOP.match(q):
+        return {"tool_name": "Stop", "tool_args": {}}
+
+    cluster = bool(_CLUSTER.search(q))
+    if cluster:
+        q = _CLUSTER.sub("", q).strip()
+
+    m = _LIST.match(q)
+    if m and not re.search(r"\d", q):
+        if cluster:
+            return {"tool_name": "ClusterListProcesses", "tool_args": {}}
+        machine = _find_machine(m.group("machine"), machines) if m.group("machine") else _default_machine(machines)
+        if machine is None:
+            return None
+        return {"tool_name": "ListProcesses", "tool_args": {"machine_url": machine.get("url", "")}}
+
+    m = _USAGE.match(q)
+    if not m:
+        return None
+    pid = int(m.group("pid"))
+    rest = m.group("rest")
+    if cluster:
+        return {"tool_name": "ClusterGetUsage", "tool_args": {"pid": pid}} if not rest.strip() else None
+
+    args: dict = {"pid": pid}
+    interval = _INTERVAL.search(rest)
+    if interval:
+        unit = interval.group("unit")
+        args["interval"] = float(interval.group("n") or 1) * _UNITS.get(unit, 1.0)
+        rest = rest[:interval.start()] + rest[interval.end():]
+    samples = _SAMPLES.search(rest)
+    if samples:
+        args["samples"] = int(samples.group("n"))
+        rest = rest[:samples.start()] + rest[samples.end():]
+    machine_match = _MACHINE.search(rest)
+    if machine_match:
+        machine = _find_machine(machine_match.group("machine"), machines)
+        rest = rest[:machine_match.start()] + rest[machine_match.end():]
+    else:
+        machine = _default_machine(machines)
+    if machine is None or _FILLER.sub("", rest).strip():
+        return None
+    return {"tool_name": "GetUsage", "tool_args": {"machine_url": machine.get("url", ""), **args}}
+
+
+# --- LLM decision cache ---
+
+def decision_key(query: str, machines: list[dict]) -> tuple[str, str]:
+    digest = hashlib.sha1(json.dumps(machines, sort_keys=True).encode()).hexdigest()
+    return normalize_query(query), digest
+
+
+class DecisionCache:
+    """LRU of model routing decisions keyed by (normalized query, machines hash)."""
+
+    def __init__(self, maxsize: int = ROUTER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[tuple[str, str], dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple[str, str]) -> dict | None:
+        with self._lock:
+            decision = self._entries.get(key)
+            if decision is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return {"tool_name": decision["tool_name"], "tool_args": dict(decision["tool_args"])}
+
+    def put(self, key: tuple[str, str], decision: dict):
+        if not decision.get("tool_name"):
+            return
+        with self._lock:
+            self._entries[key] = {"tool_name": decision["tool_name"], "tool_args": dict(decision.get("tool_args") or {})}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+decision_cache = DecisionCache()
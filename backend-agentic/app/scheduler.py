@@ -0,0 +1,181 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+import time
+
+from .timing import timings
+from .tools import build_machine_url, get_usage
+
+logger = logging.getLogger("backend_agentic.scheduler")
+
+MIN_STREAM_INTERVAL = float(os.getenv("MIN_STREAM_INTERVAL", "0.1"))
+
+
+class Subscription:
+    """All subscribers of one (machine_url, pid, interval) key."""
+
+    def __init__(self, key: tuple[str, int, float], due: float):
+        self.key = key
+        self.due = due
+        self.subscribers: dict[int, object] = {}
+        self.timed: set[int] = set() # Subscribers that want per-sample timings
+        self.fetch: asyncio.Task | None = None
+        self.last_sample: tuple[float, float, dict | None, dict] | None = None # (loop time, ts, usage, timings)
+
+    @property
+    def interval(self) -> float:
+        return self.key[2]
+
+
+class SubscriptionScheduler:
+    """
+    Central usage poller shared by every WebSocket client.
+
+    Subscriptions are keyed by (machine_url, pid, interval); each key is
+    fetched once per tick no matter how many clients watch it, and the sample
+    is fanned out to every subscriber callback. Ticks sit on a fixed grid
+    (start + n * interval) kept in a heap, so slow fetches don't add drift;
+    a tick whose previous fetch is still running is skipped instead of piling
+    up. A key is torn down when its last subscriber leaves.
+    """
+
+    def __init__(self, fetch=get_usage, min_interval: float = MIN_STREAM_INTERVAL):
+        self.fetch_fn = fetch
+        self.min_interval = min_interval
+        self.subscriptions: dict[tuple[str, int, float], Subscription] = {}
+        self._tokens: dict[int, tuple[str, int, float]] = {}
+        self._ids = itertools.count(1)
+        self._order = itertools.count()
+        self._heap: list[tuple[float, int, Subscription]] = []
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self.fetches = 0
+        self.skipped = 0
+
+    def subscribe(self, machine_url: str, pid: int, interval: float | None, callback,
+                  timings: bool = False) -> int:
+        """
+        Registers `callback(ts, usage, breakdown)` for a key and returns a
+        token for unsubscribe(). Intervals below the minimum are raised to
+        it. `breakdown` has the fetch time, plus the node's own stage
+        timings while any subscriber of the key asked for them.
+        """
+        loop = asyncio.get_running_loop()
+        interval = max(float(interval or 0), self.min_interval)
+        key = (build_machine_url(machine_url), int(pid), interval)
+        token = next(self._ids)
+        sub = self.subscriptions.get(key)
+        if sub is None:
+            sub = Subscription(key, loop.time())
+            self.subscriptions[key] = sub
+            self._push(sub)
+            logger.info("➕ Polling pid=%s on %s every %ss", pid, machine_url, interval)
+        elif sub.last_sample is not None and loop.time() - sub.last_sample[0] < interval:
+            # Joining a running key: hand over the current sample right away
+            loop.call_soon(callback, *sub.last_sample[1:])
+        sub.subscribers[token] = callback
+        if timings:
+            sub.timed.add(token)
+        self._tokens[token] = key
+        self._ensure_running()
+        return token
+
+    def unsubscribe(self, token: int):
+        key = self._tokens.pop(token, None)
+        sub = self.subscriptions.get(key) if key else None
+        if sub is None:
+            return
+        sub.subscribers.pop(token, None)
+        sub.timed.discard(token)
+        if not sub.subscribers:
+            del self.subscriptions[key]
+            if sub.fetch and not sub.fetch.done():
+                sub.fetch.cancel()
+            logger.info("➖ Stopped polling pid=%s on %s", key[1], key[0])
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        for sub in self.subscriptions.values():
+            if sub.fetch and not sub.fetch.done():
+                sub.fetch.cancel()
+        self.subscriptions.clear()
+        self._tokens.clear()
+        self._heap.clear()
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self.subscriptions),
+            "subscribers": len(self._tokens),
+            "fetches": self.fetches,
+            "skipped_ticks": self.skipped,
+            "min_interval": self.min_interval,
+        }
+
+    def _push(self, sub: Subscription):
+        heapq.heappush(self._heap, (sub.due, next(self._order), sub))
+        if self._wake is not None:
+            self._wake.set()
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._heap:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            due, _, sub = self._heap[0]
+            if self.subscriptions.get(sub.key) is not sub or sub.due != due:
+                heapq.heappop(self._heap) # Torn down or rescheduled
+                continue
+            delay = due - loop.time()
+            if delay > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            if sub.fetch is None or sub.fetch.done():
+                sub.fetch = asyncio.create_task(self._fetch(sub))
+            else:
+                self.skipped += 1
+            # Next point on the grid that is still in the future
+            missed = math.floor((loop.time() - due) / sub.interval)
+            sub.due = due + (missed + 1) * sub.interval
+            self._push(sub)
+
+    async def _fetch(self, sub: Subscription):
+        self.fetches += 1
+        start = time.perf_counter_ns()
+        try:
+            if sub.timed:
+                usage = await self.fetch_fn(sub.key[0], sub.key[1], timings=True)
+            else:
+                usage = await self.fetch_fn(sub.key[0], sub.key[1])
+        except Exception:
+            usage = None
+        elapsed = time.perf_counter_ns() - start
+        timings.record("scheduler.fetch", elapsed)
+        breakdown = {"fetch_ms": elapsed / 1e6}
+        if isinstance(usage, dict) and "timings" in usage:
+            breakdown["node"] = usage.pop("timings")
+        ts = time.time()
+        sub.last_sample = (asyncio.get_running_loop().time(), ts, usage, breakdown)
+        for callback in list(sub.subscribers.values()):
+            try:
+                callback(ts, usage, breakdown)
+            except Exception:
+                logger.exception("⚠️ Subscriber callback failed")
+
+
+scheduler = SubscriptionScheduler()
@@ -0,0 +1,110 @@
+import functools
+import logging
+import os
+import time
+
+from .outbox import ClientOutbox
+from .scheduler import scheduler
+
+logger = logging.getLogger("backend_agentic.streams")
+
+MAX_STREAMS_PER_CONNECTION = int(os.getenv("MAX_STREAMS_PER_CONNECTION", "64"))
+# Clients that don't name their streams get this one, so starting a new
+# stream replaces the previous one exactly like before stream ids existed.
+DEFAULT_STREAM_ID = "default"
+
+
+class UsageStream:
+    def __init__(self, stream_id: str, machine_url: str, pid: int, interval: float, samples: int | None,
+                 timings: bool = False):
+        self.stream_id = stream_id
+        self.machine_url = machine_url
+        self.pid = pid
+        self.interval = interval
+        self.samples = samples
+        self.timings = timings
+        self.count = 0
+        self.token: int | None = None
+
+    def info(self) -> dict:
+        return {
+            "stream_id": self.stream_id,
+            "machine_url": self.machine_url,
+            "pid": self.pid,
+            "interval": self.interval,
+            "samples": self.samples,
+            "count": self.count,
+            "timings": self.timings,
+        }
+
+
+class ConnectionStreams:
+    """
+    Registry of the usage streams running on one WebSocket connection. Each
+    stream is a subscription on the shared scheduler and can be stopped or
+    modified by id. Samples go to the connection's outbox, which applies
+    the client's backpressure policy.
+    """
+
+    def __init__(self, outbox: ClientOutbox, max_streams: int = MAX_STREAMS_PER_CONNECTION):
+        self.outbox = outbox
+        self.max_streams = max_streams
+        self.streams: dict[str, UsageStream] = {}
+
+    def start(self, stream_id: str | None, machine_url: str, pid: int, interval: float,
+              samples: int | None, timings: bool = False) -> UsageStream | None:
+        stream_id = stream_id or DEFAULT_STREAM_ID
+        self.stop(stream_id)
+        if len(self.streams) >= self.max_streams:
+            return None
+        stream = UsageStream(stream_id, machine_url, pid, interval, samples, timings)
+        self.streams[stream_id] = stream
+        self._subscribe(stream)
+        logger.info("▶️ Stream %s started pid=%s on %s", stream_id, pid, machine_url)
+        return stream
+
+    def stop(self, stream_id: str | None = None) -> list[str]:
+        """Stops one stream, or every stream when no id is given."""
+        ids = list(self.streams) if stream_id is None else [stream_id]
+        stopped = []
+        for sid in ids:
+            stream = self.streams.pop(sid, None)
+            if stream is None:
+                continue
+            scheduler.unsubscribe(stream.token)
+            stopped.append(sid)
+        return stopped
+
+    def modify(self, stream_id: str, interval: float | None = None, samples: int | None = None) -> UsageStream | None:
+        stream = self.streams.get(stream_id)
+        if stream is None:
+            return None
+        if samples is not None:
+            stream.samples = samples
+        if interval is not None and interval != stream.interval:
+            # A different interval is a different shared key
+            scheduler.unsubscribe(stream.token)
+            stream.interval = interval
+            self._subscribe(stream)
+        return stream
+
+    def info(self) -> list[dict]:
+        return [s.info() for s in self.streams.values()]
+
+    def _subscribe(self, stream: UsageStream):
+        stream.token = scheduler.subscribe(
+            stream.machine_url, stream.pid, stream.interval,
+            functools.partial(self._deliver, stream), timings=stream.timings,
+        )
+
+    def _deliver(self, stream: UsageStream, ts: float, usage: dict | None, breakdown: dict):
+        if self.streams.get(stream.stream_id) is not stream:
+            return
+        msg = {"ts": ts, "type": "usage", "stream_id": stream.stream_id, "data": usage}
+        if stream.timings:
+            msg["timings"] = breakdown
+        self.outbox.put(msg, stream.stream_id)
+        stream.count += 1
+        if stream.samples and stream.count >= stream.samples:
+            self.stop(stream.stream_id)
+            self.outbox.put({"ts": time.time(), "type": "stream_done", "stream_id": stream.stream_id})
@@ -0,0 +1,116 @@
+import json
+
+# Tool name -> args that must be present before the call can be dispatched
+REQUIRED_ARGS = {
+    "GetUsage": ("machine_url", "pid"),
+    "ListProcesses": ("machine_url",),
+    "ClusterGetUsage": ("pid",),
+    "ClusterListProcesses": (),
+    "Stop": (),
+}
+
+# Prose or a code fence may precede the object, but not forever
+MAX_PREAMBLE = 256
+
+
+class MalformedToolCall(ValueError):
+    pass
+
+
+class ToolCallParser:
+    """
+    Incremental parser for the router's {"tool": ..., "args": {...}} reply.
+
+    Text is fed as it streams in. Top-level members are decoded as soon as
+    their value ends, so `decision` is available once the tool name and its
+    required args are complete, usually before the model has finished
+    generating. Output that cannot become a valid call raises
+    MalformedToolCall immediately instead of at the end of the stream.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.fields: dict = {}
+        self.closed = False
+        self._start = -1 # index of the opening brace
+        self._pos = 0 # next character to scan
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member = -1 # start of the current top-level member
+
+    def feed(self, chunk: str) -> dict | None:
+        """Consumes more text; returns the decision once it is dispatchable."""
+        self.text += chunk
+        if self._start < 0:
+            brace = self.text.find("{")
+            if brace < 0:
+                if len(self.text) > MAX_PREAMBLE:
+                    raise MalformedToolCall("no JSON object in model output")
+                return None
+            self._start = self._pos = brace
+        self._scan()
+        return self.decision
+
+    def _scan(self):
+        text = self.text
+        i = self._pos
+        while i < len(text) and not self.closed:
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._member = i + 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish_member(i)
+                    self.closed = True
+                elif self._depth < 0:
+                    raise MalformedToolCall("unbalanced brackets in model output")
+            elif c == "," and self._depth == 1:
+                self._finish_member(i)
+                self._member = i + 1
+            i += 1
+        self._pos = i
+
+    def _finish_member(self, end: int):
+        member = self.text[self._member:end].strip()
+        if not member:
+            return
+        try:
+            parsed = json.loads("{" + member + "}")
+        except ValueError:
+            raise MalformedToolCall(f"invalid JSON member: {member[:80]}") from None
+        self.fields.update(parsed)
+        tool = self.fields.get("tool")
+        if tool is not None and tool not in REQUIRED_ARGS:
+            raise MalformedToolCall(f"unknown tool '{tool}'")
+        if "args" in parsed and not isinstance(parsed["args"], dict):
+            raise MalformedToolCall("args is not an object")
+
+    @property
+    def decision(self) -> dict | None:
+        tool = self.fields.get("tool")
+        if tool is None:
+            if self.closed:
+                raise MalformedToolCall("model output has no tool")
+            return None
+        required = REQUIRED_ARGS[tool]
+        # Argument-free tools don't wait for an (empty) args object
+        args = self.fields.get("args") or {}
+        missing = [a for a in required if a not in args]
+        if missing:
+            if self.closed:
+                raise MalformedToolCall(f"{tool} is missing {', '.join(missing)}")
+            return None
+        return {"tool_name": tool, "tool_args": args}
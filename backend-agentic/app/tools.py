@@ -1,8 +1,34 @@
-import requests
+import asyncio
 import logging
+import os
+import random
+from collections import OrderedDict
+
+import httpx
+
+from .timing import span
 
 logger = logging.getLogger("backend_agentic.tools")
 
+NODE_HTTP_TIMEOUT = float(os.getenv("NODE_HTTP_TIMEOUT", "10"))
+NODE_HTTP_CONNECT_TIMEOUT = float(os.getenv("NODE_HTTP_CONNECT_TIMEOUT", "3"))
+NODE_HTTP_MAX_CONNECTIONS = int(os.getenv("NODE_HTTP_MAX_CONNECTIONS", "20"))
+NODE_HTTP_MAX_KEEPALIVE = int(os.getenv("NODE_HTTP_MAX_KEEPALIVE", "10"))
+NODE_HTTP_RETRIES = int(os.getenv("NODE_HTTP_RETRIES", "2"))
+NODE_HTTP_BACKOFF = float(os.getenv("NODE_HTTP_BACKOFF", "0.1"))
+NODE_HTTP_MAX_CLIENTS = int(os.getenv("NODE_HTTP_MAX_CLIENTS", "64"))
+FANOUT_HOST_TIMEOUT = float(os.getenv("FANOUT_HOST_TIMEOUT", "3"))
+
+# What a node answers for a PID it doesn't have (strerror(ESRCH))
+NOT_FOUND_ERROR = "No such process"
+
+# One keep-alive connection pool per node backend. Machine URLs come from
+# clients, so only the NODE_HTTP_MAX_CLIENTS most recently used are kept.
+_clients: OrderedDict[str, httpx.AsyncClient] = OrderedDict()
+_closing: set[asyncio.Task] = set()
+# base url -> (etag, body) of the last full process listing
+_process_lists: dict[str, tuple[str, list]] = {}
+
 def build_machine_url(u: str) -> str:
     s = (u or "").strip()
     if not s:
@@ -11,11 +37,59 @@ def build_machine_url(u: str) -> str:
         return s.rstrip("/")
     return ("http://" + s).rstrip("/")
 
-def get_usage(machine_url: str, pid: int, interval: float | int | None = None, samples: int | None = None) -> dict | None:
+def get_client(base: str) -> httpx.AsyncClient:
+    client = _clients.get(base)
+    if client is not None and not client.is_closed:
+        _clients.move_to_end(base)
+        return client
+    client = httpx.AsyncClient(
+        base_url=base,
+        timeout=httpx.Timeout(NODE_HTTP_TIMEOUT, connect=NODE_HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=NODE_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=NODE_HTTP_MAX_KEEPALIVE,
+        ),
+    )
+    _clients[base] = client
+    _clients.move_to_end(base)
+    while len(_clients) > NODE_HTTP_MAX_CLIENTS:
+        evicted_base, evicted = _clients.popitem(last=False)
+        _process_lists.pop(evicted_base, None)
+        task = asyncio.get_running_loop().create_task(evicted.aclose())
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+    return client
+
+async def close_clients():
+    clients = list(_clients.values())
+    _clients.clear()
+    _process_lists.clear()
+    await asyncio.gather(*(c.aclose() for c in clients), *_closing, return_exceptions=True)
+
+async def request_with_retry(base: str, path: str, **kwargs) -> httpx.Response:
+    """
+    GET `path` on a node backend, retrying connection errors and 5xx replies
+    with exponential backoff and full jitter.
+    """
+    client = get_client(base)
+    for attempt in range(NODE_HTTP_RETRIES + 1):
+        try:
+            r = await client.get(path, **kwargs)
+            if r.status_code < 500 or attempt == NODE_HTTP_RETRIES:
+                return r
+        except httpx.TransportError:
+            if attempt == NODE_HTTP_RETRIES:
+                raise
+        await asyncio.sleep(random.uniform(0, NODE_HTTP_BACKOFF * (2 ** attempt)))
+
+async def get_usage(machine_url: str, pid: int, interval: float | int | None = None, samples: int | None = None,
+                    timings: bool = False) -> dict | None:
     base = build_machine_url(machine_url)
     try:
         logger.info("➡️ Calling %s/usage?pid=%s", base, pid)
-        r = requests.get(f"{base}/usage", params={"pid": pid}, timeout=10)
+        params = {"pid": pid, "timings": "true"} if timings else {"pid": pid}
+        with span("node.usage"):
+            r = await request_with_retry(base, "/usage", params=params)
         r.raise_for_status()
         usage = r.json()
         logger.info("✅ Usage fetched status=%s", r.status_code)
@@ -24,19 +98,98 @@ def get_usage(machine_url: str, pid: int, interval: float | int | None = None, s
         logger.warning("⚠️ Usage fetch failed")
         return None
 
-def list_processes(machine_url: str) -> list[dict] | None:
+async def list_processes(machine_url: str) -> list[dict] | None:
     base = build_machine_url(machine_url)
     try:
         logger.info("➡️ Calling %s/processes", base)
-        r = requests.get(f"{base}/processes", timeout=10)
+        cached = _process_lists.get(base)
+        headers = {"If-None-Match": cached[0]} if cached else None
+        with span("node.processes"):
+            r = await request_with_retry(base, "/processes", headers=headers)
+        if r.status_code == 304 and cached:
+            logger.info("✅ Processes unchanged status=%s", r.status_code)
+            return cached[1]
         r.raise_for_status()
         processes = r.json()
+        etag = r.headers.get("ETag")
+        if etag:
+            _process_lists[base] = (etag, processes)
         logger.info("✅ Processes fetched status=%s", r.status_code)
         return processes
     except Exception:
         logger.warning("⚠️ Process list fetch failed")
         return None
 
+async def fan_out(machines: list[dict], fn, *args, timeout: float = FANOUT_HOST_TIMEOUT) -> list[dict]:
+    """
+    Runs `fn(machine_url, *args)` against every machine concurrently, each
+    under its own deadline. Returns one host-tagged entry per machine with
+    status "ok", "not_found" (the host answered, but has no such PID),
+    "error" or "timeout", so slow hosts only cost their share.
+    """
+    loop = asyncio.get_running_loop()
+
+    async def one(machine: dict) -> dict:
+        entry = {"machine": machine.get("name"), "machine_url": machine.get("url")}
+        start = loop.time()
+        try:
+            data = await asyncio.wait_for(fn(machine.get("url", ""), *args), timeout)
+            error = data.get("error") if isinstance(data, dict) else None
+            if data is None:
+                status = "error"
+            elif error is None:
+                status = "ok"
+            else:
+                status = "not_found" if error == NOT_FOUND_ERROR else "error"
+            entry.update(status=status, data=data)
+        except asyncio.TimeoutError:
+            logger.warning("⏱️ %s timed out after %ss", entry["machine_url"], timeout)
+            entry.update(status="timeout", data=None)
+        entry["elapsed"] = loop.time() - start
+        return entry
+
+    return await asyncio.gather(*(one(m) for m in machines))
+
+def _host_summary(results: list[dict]) -> dict:
+    return {
+        # A host without the PID answered fine; only failed hosts make it partial
+        "partial": any(r["status"] in ("error", "timeout") for r in results),
+        "hosts": [{k: r[k] for k in ("machine", "machine_url", "status", "elapsed")} for r in results],
+    }
+
+async def list_processes_all(machines: list[dict]) -> dict:
+    results = await fan_out(machines, list_processes)
+    merged = [
+        {**p, "machine": r["machine"], "machine_url": r["machine_url"]}
+        for r in results if r["status"] == "ok"
+        for p in r["data"]
+    ]
+    logger.info("✅ Processes fetched from %s/%s machines", sum(r["status"] == "ok" for r in results), len(results))
+    return {**_host_summary(results), "processes": merged}
+
+def _hottest_first(usage: dict) -> tuple:
+    """
+    Sort key for usage from several machines. Entries with a recent CPU% come
+    first, highest first; entries without rates (a node's first sample of a
+    PID) follow, ordered by cumulative CPU seconds. The two are never compared
+    with each other, since a long-lived idle process can have more CPU seconds
+    than a busy one has percent.
+    """
+    cpu_percent = (usage.get("rates") or {}).get("cpu_percent")
+    if cpu_percent is not None:
+        return (0, -cpu_percent)
+    return (1, -((usage.get("user_time") or 0) + (usage.get("sys_time") or 0)))
+
+async def get_usage_all(machines: list[dict], pid: int) -> dict:
+    results = await fan_out(machines, get_usage, pid)
+    merged = [
+        {**r["data"], "machine": r["machine"], "machine_url": r["machine_url"]}
+        for r in results if r["status"] == "ok"
+    ]
+    merged.sort(key=_hottest_first)
+    logger.info("✅ Usage for pid=%s found on %s/%s machines", pid, len(merged), len(results))
+    return {**_host_summary(results), "usage": merged}
+
 def stop_agent() -> dict:
     logger.info("🛑 Stop tool invoked")
     return {"stopped": True}
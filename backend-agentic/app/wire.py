@@ -0,0 +1,188 @@
+import json
+import os
+import struct
+
+try:
+    import msgpack
+except ImportError: # optional: pip install msgpack
+    msgpack = None
+
+WIRE_ENCODING = os.getenv("WIRE_ENCODING", "json")
+WIRE_BATCH_SIZE = int(os.getenv("WIRE_BATCH_SIZE", "1"))
+WIRE_BATCH_MS = float(os.getenv("WIRE_BATCH_MS", "0"))
+MAX_BATCH_SIZE = 1024
+
+ENCODINGS = ("json", "msgpack", "binary")
+
+# Same order as the CRusage fields reported by the node
+TIME_FIELDS = ("user_time", "sys_time")
+COUNT_FIELDS = (
+    "max_rss_kb",
+    "minor_page_faults",
+    "major_page_faults",
+    "block_input_ops",
+    "block_output_ops",
+    "voluntary_ctx_switches",
+    "involuntary_ctx_switches",
+)
+USAGE_FIELDS = TIME_FIELDS + COUNT_FIELDS
+# The node's "rates" entry, present from a PID's second sample on
+RATE_FIELDS = (
+    "interval",
+    "cpu_percent",
+    "user_percent",
+    "sys_percent",
+    "minor_faults_per_sec",
+    "major_faults_per_sec",
+    "voluntary_ctx_switches_per_sec",
+    "involuntary_ctx_switches_per_sec",
+    "block_input_ops_per_sec",
+    "block_output_ops_per_sec",
+)
+
+# Error text for a sample the node could not be asked for at all
+FETCH_FAILED = "usage fetch failed"
+
+# Binary frame: header, then `count` records of
+#   u8 stream id length, stream id (utf-8), u8 flags,
+#   u8 engine length, engine, u8 error length, error, RECORD,
+#   then RATES when flags has RATES_PRESENT.
+# Counters are -1 and times NaN when the sample failed.
+BINARY_VERSION = 2
+HEADER = struct.Struct("<BBH")  # version, flags (unused), record count
+RECORD = struct.Struct("<di" + "d" * len(TIME_FIELDS) + "q" * len(COUNT_FIELDS))
+RATES = struct.Struct("<" + "d" * len(RATE_FIELDS))
+RATES_PRESENT = 0x01
+_NAN = float("nan")
+
+
+def available_encodings() -> list[str]:
+    return [e for e in ENCODINGS if e != "msgpack" or msgpack is not None]
+
+
+def _usage(message: dict) -> dict:
+    data = message.get("data")
+    return data if isinstance(data, dict) and "error" not in data else {}
+
+
+def _error(message: dict) -> str | None:
+    data = message.get("data")
+    if data is None:
+        return FETCH_FAILED
+    return data.get("error") if isinstance(data, dict) else None
+
+
+def columnar(messages: list[dict]) -> dict:
+    """Turns a run of usage messages into one usage_batch message of columns."""
+    rows = [_usage(m) for m in messages]
+    batch = {
+        "type": "usage_batch",
+        "count": len(messages),
+        "stream_id": [m.get("stream_id") for m in messages],
+        "ts": [m.get("ts") for m in messages],
+        "pid": [u.get("pid") for u in rows],
+        "process_name": [u.get("process_name") for u in rows],
+        "engine": [u.get("engine") for u in rows],
+        "error": [_error(m) for m in messages],
+    }
+    for field in USAGE_FIELDS:
+        batch[field] = [u.get(field) for u in rows]
+    rates = [u.get("rates") or {} for u in rows]
+    batch["rates"] = {field: [r.get(field) for r in rates] for field in RATE_FIELDS}
+    if any("timings" in m for m in messages):
+        batch["timings"] = [m.get("timings") for m in messages]
+    return batch
+
+
+def _short(text: str | None) -> bytes:
+    raw = (text or "").encode()[:255]
+    return bytes((len(raw),)) + raw
+
+
+def pack_binary(messages: list[dict]) -> bytes:
+    parts = [HEADER.pack(BINARY_VERSION, 0, len(messages))]
+    for m in messages:
+        u = _usage(m)
+        rates = u.get("rates")
+        parts.append(_short(str(m.get("stream_id") or "")))
+        parts.append(bytes((RATES_PRESENT if rates else 0,)))
+        parts.append(_short(u.get("engine")))
+        parts.append(_short(_error(m)))
+        parts.append(RECORD.pack(
+            float(m.get("ts") or 0.0),
+            int(u.get("pid", -1)),
+            *(float(u[f]) if u.get(f) is not None else _NAN for f in TIME_FIELDS),
+            *(int(u[f]) if u.get(f) is not None else -1 for f in COUNT_FIELDS),
+        ))
+        if rates:
+            parts.append(RATES.pack(*(float(rates.get(f) or 0.0) for f in RATE_FIELDS)))
+    return b"".join(parts)
+
+
+def unpack_binary(frame: bytes) -> list[dict]:
+    """Decodes a binary frame back into flat records, as a client would."""
+    version, _, count = HEADER.unpack_from(frame)
+    if version != BINARY_VERSION:
+        raise ValueError(f"unsupported frame version {version}")
+    offset = HEADER.size
+
+    def short() -> str:
+        nonlocal offset
+        n = frame[offset]
+        text = frame[offset + 1:offset + 1 + n].decode()
+        offset += 1 + n
+        return text
+
+    out = []
+    for _ in range(count):
+        sid = short()
+        flags = frame[offset]
+        offset += 1
+        engine = short()
+        error = short()
+        values = RECORD.unpack_from(frame, offset)
+        offset += RECORD.size
+        rates = None
+        if flags & RATES_PRESENT:
+            rates = dict(zip(RATE_FIELDS, RATES.unpack_from(frame, offset)))
+            offset += RATES.size
+        out.append({
+            "stream_id": sid, "ts": values[0], "pid": values[1], **dict(zip(USAGE_FIELDS, values[2:])),
+            "engine": engine or None, "error": error or None, "rates": rates,
+        })
+    return out
+
+
+class Codec:
+    """
+    Per-connection encoding of usage samples. JSON with a batch size of one
+    is the original protocol; anything else sends a frame per batch, either
+    a columnar usage_batch message (json/msgpack) or a binary frame.
+    """
+
+    def __init__(self, encoding: str = WIRE_ENCODING, batch_size: int = WIRE_BATCH_SIZE,
+                 batch_ms: float = WIRE_BATCH_MS):
+        if encoding not in available_encodings():
+            raise ValueError(f"unsupported encoding '{encoding}'")
+        self.encoding = encoding
+        self.batch_size = min(max(1, batch_size), MAX_BATCH_SIZE)
+        self.batch_ms = max(0.0, batch_ms)
+
+    @property
+    def supports_timings(self) -> bool:
+        """Binary records have no room for the per-sample timing breakdown."""
+        return self.encoding != "binary"
+
+    @property
+    def batched(self) -> bool:
+        return self.encoding != "json" or self.batch_size > 1 or self.batch_ms > 0
+
+    def info(self) -> dict:
+        return {"encoding": self.encoding, "batch_size": self.batch_size, "batch_ms": self.batch_ms}
+
+    def encode(self, messages: list[dict]) -> str | bytes:
+        if self.encoding == "binary":
+            return pack_binary(messages)
+        if self.encoding == "msgpack":
+            return msgpack.packb(columnar(messages))
+        return json.dumps(columnar(messages) if self.batched else messages[0], separators=(",", ":"))
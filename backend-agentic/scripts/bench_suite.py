@@ -0,0 +1,349 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+import psutil
+import uvicorn
+import websockets
+from fastapi import Body, FastAPI
+from fastapi.responses import StreamingResponse
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+NODE_DIR = os.path.join(ROOT, "backend")
+AGENT_DIR = os.path.join(ROOT, "backend-agentic")
+
+# Per-request p99 regressions beyond this fraction are flagged by --baseline
+REGRESSION_THRESHOLD = 0.2
+
+
+def fake_krutrim(latency: float, tail: float = 0.0) -> FastAPI:
+    """
+    Stand-in for the Krutrim chat-completions API. Picks the tool the real
+    model would for the benchmark's queries, generating the reply over
+    `latency` seconds. Streamed replies keep generating whitespace for
+    another `tail` seconds after the JSON, like a model that doesn't stop
+    right away.
+    """
+    llm = FastAPI()
+
+    @llm.post("/v1/chat/completions")
+    async def completions(payload: dict = Body(...)):
+        system, query = payload["messages"][0]["content"], payload["messages"][-1]["content"]
+        urls = re.findall(r'"url": "([^"]+)"', system)
+        pid = re.search(r"\d+", query)
+        if pid:
+            decision = {"tool": "GetUsage", "args": {"machine_url": urls[0] if urls else "", "pid": int(pid.group())}}
+        else:
+            decision = {"tool": "ListProcesses", "args": {"machine_url": urls[0] if urls else ""}}
+        content = json.dumps(decision)
+        if not payload.get("stream"):
+            await asyncio.sleep(latency + tail)
+            return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+        async def events():
+            tokens = [content[i:i + 4] for i in range(0, len(content), 4)]
+            trailing = 10
+            delays = [latency / len(tokens)] * len(tokens) + [tail / trailing] * trailing
+            for token, delay in zip(tokens + [" "] * trailing, delays):
+                await asyncio.sleep(delay)
+                yield f"data: {json.dumps({'choices': [{'delta': {'content': token}}]})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return llm
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def summarize(latencies: list[float], elapsed: float, errors: int) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000.0,
+        "p99_ms": percentile(latencies, 0.99) * 1000.0,
+        "max_ms": max(latencies, default=0.0) * 1000.0,
+    }
+
+
+async def wait_for_port(port: int, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"nothing listening on port {port}")
+
+
+class Probe:
+    """
+    Event-loop lag of a service, seen from outside: polls a trivial endpoint
+    and reports how much slower it answers than when the service was idle.
+    """
+
+    def __init__(self, url: str, every: float = 0.05):
+        self.url = url
+        self.every = every
+        self.idle = 0.0
+        self.samples: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _ping(self, client: httpx.AsyncClient) -> float:
+        start = time.perf_counter()
+        await client.get(self.url)
+        return time.perf_counter() - start
+
+    async def calibrate(self, client: httpx.AsyncClient):
+        self.idle = statistics.median([await self._ping(client) for _ in range(20)])
+
+    def start(self, client: httpx.AsyncClient):
+        self.samples = []
+
+        async def run():
+            while True:
+                try:
+                    self.samples.append(max(0.0, await self._ping(client) - self.idle))
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(self.every)
+
+        self._task = asyncio.create_task(run())
+
+    async def stop(self) -> dict:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return {"p50_ms": percentile(self.samples, 0.5) * 1000.0, "p99_ms": percentile(self.samples, 0.99) * 1000.0}
+
+
+def rss_mb(proc: subprocess.Popen) -> float:
+    try:
+        return psutil.Process(proc.pid).memory_info().rss / 2**20
+    except psutil.NoSuchProcess:
+        return 0.0
+
+
+async def hammer(make_request, concurrency: int, total: int) -> dict:
+    """Runs `total` requests with `concurrency` workers; returns latency stats."""
+    latencies, errors = [], 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in remaining:
+            start = time.perf_counter()
+            try:
+                ok = await make_request(i)
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+async def stream_gaps(url: str, machines: list[dict], pid: int, interval: float, samples: int) -> tuple[list[float], int]:
+    arrivals = []
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.send(json.dumps({"query": f"monitor pid {pid} every {int(interval * 1000)}ms for {samples} samples",
+                                  "machines": machines}))
+        while len(arrivals) < samples:
+            msg = json.loads(await ws.recv())
+            if msg.get("type") == "usage":
+                arrivals.append(time.perf_counter())
+            elif msg.get("type") == "stream_done" or "error" in msg:
+                break
+    return [b - a for a, b in zip(arrivals, arrivals[1:])], len(arrivals)
+
+
+async def run(args) -> dict:
+    llm = uvicorn.Server(uvicorn.Config(fake_krutrim(args.llm_latency / 1000.0, args.llm_tail / 1000.0), host="127.0.0.1",
+                                        port=args.llm_port, log_level="warning"))
+    llm_task = asyncio.create_task(llm.serve())
+    node_ports = [args.node_port + i for i in range(args.nodes)]
+    env = {**os.environ, "USAGE_ENGINE": "fake", "USAGE_FAKE_ENGINE": "1", "USAGE_FAKE_LATENCY_MS": str(args.engine_latency)}
+    nodes = [
+        subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(p), "--log-level", "warning"],
+                         cwd=NODE_DIR, env=env, stderr=subprocess.DEVNULL)
+        for p in node_ports
+    ]
+    agent = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.agent_port), "--log-level", "warning"],
+        cwd=AGENT_DIR, stderr=subprocess.DEVNULL,
+        env={**os.environ, "KRUTRIM_API_URL": f"http://127.0.0.1:{args.llm_port}/v1/chat/completions",
+             "KRUTRIM_API_KEY": "bench"},
+    )
+    results = {}
+    try:
+        for port in [args.llm_port, args.agent_port, *node_ports]:
+            await wait_for_port(port)
+        node = f"http://127.0.0.1:{node_ports[0]}"
+        agent_url = f"http://127.0.0.1:{args.agent_port}"
+        machines = [{"name": f"node{i}", "url": f"http://127.0.0.1:{p}"} for i, p in enumerate(node_ports)]
+        limits = httpx.Limits(max_connections=args.concurrency * 2)
+
+        async with httpx.AsyncClient(timeout=30, limits=limits) as client:
+            node_probe, agent_probe = Probe(node + "/"), Probe(agent_url + "/streams/stats")
+            await node_probe.calibrate(client)
+            await agent_probe.calibrate(client)
+
+            async def node_usage(i):
+                r = await client.get(node + "/usage", params={"pid": 1000 + i % args.pids})
+                return r.status_code == 200 and "error" not in r.json()
+
+            async def node_processes(i):
+                r = await client.get(node + "/processes")
+                return r.status_code == 200
+
+            async def agent_routed(i):
+                r = await client.post(agent_url + "/agent/query",
+                                      json={"query": f"get usage of pid {1000 + i % args.pids}", "machines": machines})
+                return r.status_code == 200 and r.json().get("result") is not None
+
+            async def agent_llm(i):
+                # Unique wording defeats the router and the decision cache
+                r = await client.post(agent_url + "/agent/query",
+                                      json={"query": f"how busy is process {1000 + i % args.pids}, run {i}?", "machines": machines})
+                return r.status_code == 200 and r.json().get("result") is not None
+
+            async def cluster_usage(i):
+                r = await client.post(agent_url + "/agent/query",
+                                      json={"query": f"get usage of pid {1000 + i % args.pids} everywhere", "machines": machines})
+                return r.status_code == 200
+
+            scenarios = {
+                "node_usage": (node_usage, args.requests, node_probe),
+                "node_processes": (node_processes, max(1, args.requests // 10), node_probe),
+                "agent_query_routed": (agent_routed, args.requests, agent_probe),
+                "agent_query_llm": (agent_llm, max(1, args.requests // 4), agent_probe),
+                "agent_query_cluster": (cluster_usage, max(1, args.requests // 4), agent_probe),
+            }
+            for name, (fn, total, probe) in scenarios.items():
+                if args.only and name not in args.only:
+                    continue
+                probe.start(client)
+                stats = await hammer(fn, args.concurrency, total)
+                stats["loop_lag_ms"] = await probe.stop()
+                stats["rss_mb"] = {"node": rss_mb(nodes[0]), "agent": rss_mb(agent)}
+                results[name] = stats
+                print(f"{name:>22}: {stats['throughput_rps']:8.1f} req/s  p50={stats['p50_ms']:.1f}ms  "
+                      f"p99={stats['p99_ms']:.1f}ms  errors={stats['errors']}", file=sys.stderr)
+
+            if not args.only or "ws_streams" in args.only:
+                agent_probe.start(client)
+                ws_url = f"ws://127.0.0.1:{args.agent_port}/ws"
+                start = time.perf_counter()
+                runs = await asyncio.gather(*(
+                    stream_gaps(ws_url, [machines[i % len(machines)]], 1000 + i % args.pids,
+                                args.stream_interval, args.stream_samples)
+                    for i in range(args.streams)
+                ), return_exceptions=True)
+                elapsed = time.perf_counter() - start
+                ok = [r for r in runs if not isinstance(r, BaseException)]
+                gaps = [g for r in ok for g in r[0]]
+                delivered = sum(r[1] for r in ok)
+                results["ws_streams"] = {
+                    "streams": args.streams,
+                    "errors": len(runs) - len(ok),
+                    "samples": delivered,
+                    "throughput_sps": delivered / elapsed if elapsed else 0.0,
+                    "p50_gap_ms": percentile(gaps, 0.50) * 1000.0,
+                    "p99_gap_ms": percentile(gaps, 0.99) * 1000.0,
+                    "loop_lag_ms": await agent_probe.stop(),
+                    "rss_mb": {"node": rss_mb(nodes[0]), "agent": rss_mb(agent)},
+                }
+                print(f"{'ws_streams':>22}: {results['ws_streams']['throughput_sps']:8.1f} samples/s  "
+                      f"p99_gap={results['ws_streams']['p99_gap_ms']:.1f}ms", file=sys.stderr)
+    finally:
+        for proc in (agent, *nodes):
+            proc.terminate()
+        for proc in (agent, *nodes):
+            proc.wait()
+        llm.should_exit = True
+        await llm_task
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline: dict):
+    """Prints p99 changes against an earlier run and flags regressions."""
+    for name, stats in current["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        key = "p99_gap_ms" if "p99_gap_ms" in stats else "p99_ms"
+        if not old or not old.get(key):
+            continue
+        change = stats[key] / old[key] - 1.0
+        flag = "  REGRESSION" if change > REGRESSION_THRESHOLD else ""
+        print(f"{name:>22}: {key} {old[key]:.1f} -> {stats[key]:.1f} ({change:+.0%}){flag}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load and latency benchmark for the node and agent services.")
+    parser.add_argument("--nodes", type=int, default=3, help="synthetic node backends (fake usage engine)")
+    parser.add_argument("--pids", type=int, default=50, help="distinct PIDs to query")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--streams", type=int, default=100, help="concurrent /ws usage streams")
+    parser.add_argument("--stream-samples", type=int, default=20)
+    parser.add_argument("--stream-interval", type=float, default=0.1)
+    parser.add_argument("--llm-latency", type=float, default=300, help="fake Krutrim latency in ms")
+    parser.add_argument("--llm-tail", type=float, default=0, help="extra fake Krutrim generation after the JSON, in ms")
+    parser.add_argument("--engine-latency", type=float, default=0, help="fake engine read latency in ms")
+    parser.add_argument("--only", nargs="*", help="scenario names to run")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--node-port", type=int, default=18201)
+    parser.add_argument("--agent-port", type=int, default=18200)
+    parser.add_argument("--llm-port", type=int, default=18199)
+    args = parser.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        "scenarios": asyncio.run(run(args)),
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import uvicorn
+import websockets
+from fastapi import FastAPI
+
+STALLED_PID = 1
+
+
+def fake_node(stall: float) -> FastAPI:
+    """A node backend whose /usage hangs for `stall` seconds for STALLED_PID."""
+    node = FastAPI()
+
+    @node.get("/usage")
+    async def usage(pid: int):
+        if pid == STALLED_PID:
+            await asyncio.sleep(stall)
+        return {"pid": pid, "process_name": "fake", "user_time": 0.0, "sys_time": 0.0,
+                "max_rss_kb": 0, "minor_page_faults": 0, "major_page_faults": 0}
+
+    return node
+
+
+async def wait_for_port(port: int, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"nothing listening on port {port}")
+
+
+async def stream(url: str, query: str, machines: list[dict], samples: int) -> list[float]:
+    """Runs one usage stream and returns the arrival time of every sample."""
+    arrivals = []
+    async with websockets.connect(url) as ws:
+        await ws.send(json.dumps({"query": query, "machines": machines}))
+        while len(arrivals) < samples:
+            msg = json.loads(await ws.recv())
+            if msg.get("type") == "usage":
+                arrivals.append(time.perf_counter())
+    return arrivals
+
+
+async def run_phase(url, machines, sockets, samples, interval, stalled):
+    healthy = [
+        stream(url, f"monitor pid {100 + i} every {int(interval * 1000)}ms for {samples} samples on machine fast",
+               machines, samples)
+        for i in range(sockets)
+    ]
+    tasks = [asyncio.create_task(t) for t in healthy]
+    stall_task = None
+    if stalled:
+        stall_task = asyncio.create_task(stream(
+            url, f"monitor pid {STALLED_PID} every {int(interval * 1000)}ms for {samples} samples on machine stalled",
+            machines, samples))
+    results = await asyncio.gather(*tasks)
+    if stall_task:
+        stall_task.cancel()
+    gaps = sorted(b - a for arrivals in results for a, b in zip(arrivals, arrivals[1:]))
+    return {
+        "p50_gap_ms": statistics.median(gaps) * 1000.0,
+        "p99_gap_ms": gaps[min(len(gaps) - 1, int(len(gaps) * 0.99))] * 1000.0,
+        "max_gap_ms": gaps[-1] * 1000.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Checks that one stalled node doesn't slow other sockets down.")
+    parser.add_argument("--sockets", type=int, default=20)
+    parser.add_argument("--samples", type=int, default=30)
+    parser.add_argument("--interval", type=float, default=0.1)
+    parser.add_argument("--stall", type=float, default=5.0)
+    parser.add_argument("--node-port", type=int, default=18101)
+    parser.add_argument("--agent-port", type=int, default=18100)
+    args = parser.parse_args()
+
+    node = uvicorn.Server(uvicorn.Config(fake_node(args.stall), host="127.0.0.1", port=args.node_port, log_level="warning"))
+    node_task = asyncio.create_task(node.serve())
+    agent = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.agent_port), "--log-level", "warning"],
+        cwd=os.path.join(os.path.dirname(__file__), ".."),
+        env={**os.environ, "NODE_HTTP_RETRIES": "0"},
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        await wait_for_port(args.node_port)
+        await wait_for_port(args.agent_port)
+        node_url = f"http://127.0.0.1:{args.node_port}"
+        machines = [{"name": "fast", "url": node_url}, {"name": "stalled", "url": node_url}]
+        url = f"ws://127.0.0.1:{args.agent_port}/ws"
+        for label, stalled in (("baseline", False), ("with stalled upstream", True)):
+            stats = await run_phase(url, machines, args.sockets, args.samples, args.interval, stalled)
+            print(f"{label:>22}: " + "  ".join(f"{k}={v:.1f}" for k, v in stats.items()))
+    finally:
+        agent.terminate()
+        agent.wait()
+        node.should_exit = True
+        await node_task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.outbox import CLOSE_OVERLOADED, ClientOutbox
+
+
+class FakeSocket:
+    def __init__(self):
+        self.messages: list[dict] = []
+        self.closed: int | None = None
+
+    async def send(self, text: str):
+        self.messages.append(json.loads(text))
+
+    async def close(self, code: int):
+        self.closed = code
+
+
+def sample(stream: str, n: int) -> dict:
+    return {"type": "stream_data", "stream_id": stream, "n": n}
+
+
+class OutboxTests(unittest.TestCase):
+    def drain(self, policy: str, fill, maxsize: int = 3):
+        sock = FakeSocket()
+
+        async def main():
+            outbox = ClientOutbox(sock.send, sock.close, maxsize=maxsize, policy=policy)
+            # Queue everything before the writer runs, as a slow client would
+            fill(outbox)
+            outbox.start()
+            await asyncio.sleep(0.05)
+            outbox.stop()
+            return outbox
+
+        return sock, asyncio.run(main())
+
+    def test_conflate_keeps_newest_sample_per_stream(self):
+        def fill(outbox):
+            for n in range(5):
+                outbox.put(sample("a", n), "a")
+                outbox.put(sample("b", n), "b")
+
+        sock, outbox = self.drain("conflate", fill)
+        data = [m for m in sock.messages if m["type"] == "stream_data"]
+        self.assertEqual([(m["stream_id"], m["n"]) for m in data], [("a", 4), ("b", 4)])
+        self.assertEqual(outbox.conflated, 8)
+
+    def test_drop_oldest_keeps_the_last_maxsize(self):
+        def fill(outbox):
+            for n in range(6):
+                outbox.put(sample("a", n), "a")
+
+        sock, outbox = self.drain("drop_oldest", fill)
+        data = [m["n"] for m in sock.messages if m["type"] == "stream_data"]
+        self.assertEqual(data, [3, 4, 5])
+        self.assertEqual(outbox.dropped, 3)
+
+    def test_control_messages_are_never_dropped(self):
+        def fill(outbox):
+            outbox.put({"type": "reply", "n": 0})
+            for n in range(6):
+                outbox.put(sample("a", n), "a")
+                outbox.put({"type": "reply", "n": n + 1})
+
+        for policy in ("conflate", "drop_oldest"):
+            sock, _ = self.drain(policy, fill)
+            replies = [m["n"] for m in sock.messages if m["type"] == "reply"]
+            self.assertEqual(replies, list(range(7)), policy)
+
+    def test_disconnect_closes_when_full(self):
+        def fill(outbox):
+            for n in range(4):
+                outbox.put(sample("a", n), "a")
+
+        sock, outbox = self.drain("disconnect", fill)
+        self.assertTrue(outbox.overflowed)
+        self.assertEqual(sock.closed, CLOSE_OVERLOADED)
+        self.assertEqual(sock.messages, [])
+
+    def test_queue_stats_reported_after_drops(self):
+        def fill(outbox):
+            for n in range(5):
+                outbox.put(sample("a", n), "a")
+
+        sock, outbox = self.drain("drop_oldest", fill)
+        stats = [m for m in sock.messages if m["type"] == "queue_stats"]
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0]["policy"], "drop_oldest")
+        self.assertEqual(stats[0]["dropped"], 2)
+        self.assertEqual(stats[0]["encoding"], "json")
+        self.assertEqual(outbox.stats()["sent"], 3)
+
+    def test_no_stats_without_loss(self):
+        sock, _ = self.drain("drop_oldest", lambda outbox: outbox.put(sample("a", 0), "a"))
+        self.assertEqual([m["type"] for m in sock.messages], ["stream_data"])
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            ClientOutbox(FakeSocket().send, policy="bogus")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.router import DecisionCache, decision_key, route
+
+MACHINES = [
+    {"name": "alpha", "url": "http://127.0.0.1:8001"},
+    {"name": "beta", "url": "http://127.0.0.1:8002"},
+]
+
+
+class RouteTests(unittest.TestCase):
+    def test_stop(self):
+        self.assertEqual(route("Stop", MACHINES), {"tool_name": "Stop", "tool_args": {}})
+        self.assertEqual(route("please cancel monitoring!", MACHINES)["tool_name"], "Stop")
+
+    def test_usage_with_interval_and_samples(self):
+        out = route("monitor pid 123 every 2s for 3 samples", MACHINES)
+        self.assertEqual(out["tool_name"], "GetUsage")
+        self.assertEqual(out["tool_args"], {"machine_url": "http://127.0.0.1:8001", "pid": 123, "interval": 2.0, "samples": 3})
+
+    def test_usage_on_named_machine(self):
+        out = route("Monitor process id 42 on machine beta every 500ms", MACHINES)
+        self.assertEqual(out["tool_args"]["machine_url"], "http://127.0.0.1:8002")
+        self.assertAlmostEqual(out["tool_args"]["interval"], 0.5)
+
+    def test_list_processes(self):
+        out = route("list processes on beta", MACHINES)
+        self.assertEqual(out, {"tool_name": "ListProcesses", "tool_args": {"machine_url": "http://127.0.0.1:8002"}})
+
+    def test_cluster_tools(self):
+        self.assertEqual(route("list processes everywhere", MACHINES)["tool_name"], "ClusterListProcesses")
+        self.assertEqual(route("check pid 7 on all machines", MACHINES),
+                         {"tool_name": "ClusterGetUsage", "tool_args": {"pid": 7}})
+
+    def test_unknown_shapes_fall_back(self):
+        self.assertIsNone(route("which process is eating my memory", MACHINES))
+        self.assertIsNone(route("monitor pid 5 on gamma", MACHINES))
+        self.assertIsNone(route("monitor pid 5 until it crashes", MACHINES))
+        self.assertIsNone(route("list processes", []))
+
+
+class DecisionCacheTests(unittest.TestCase):
+    def test_key_normalizes_query_and_hashes_machines(self):
+        self.assertEqual(decision_key("  Top  PIDs? ", MACHINES), decision_key("top pids", MACHINES))
+        self.assertNotEqual(decision_key("top pids", MACHINES), decision_key("top pids", MACHINES[:1]))
+
+    def test_lru_eviction_and_copies(self):
+        cache = DecisionCache(maxsize=1)
+        cache.put(("a", "x"), {"tool_name": "Stop", "tool_args": {}})
+        hit = cache.get(("a", "x"))
+        hit["tool_args"]["mutated"] = True
+        self.assertEqual(cache.get(("a", "x"))["tool_args"], {})
+        cache.put(("b", "x"), {"tool_name": "Stop", "tool_args": {}})
+        self.assertIsNone(cache.get(("a", "x")))
+
+    def test_failed_decisions_not_cached(self):
+        cache = DecisionCache()
+        cache.put(("a", "x"), {"tool_name": None, "tool_args": {}})
+        self.assertIsNone(cache.get(("a", "x")))
+
+
+if __name__ == "__main__":
+    unittest.main()
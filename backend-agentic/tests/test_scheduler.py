@@ -0,0 +1,109 @@
+import asyncio
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.scheduler import SubscriptionScheduler
+
+URL = "http://127.0.0.1:8001"
+
+
+class FakeFetch:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls: list[tuple[float, str, int]] = []
+
+    async def __call__(self, machine_url, pid, timings=False):
+        self.calls.append((asyncio.get_running_loop().time(), machine_url, pid))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return {"pid": pid}
+
+
+class SchedulerTests(unittest.TestCase):
+    def run_for(self, seconds: float, setup):
+        async def main():
+            scheduler = SubscriptionScheduler(fetch=self.fetch, min_interval=0.05)
+            out = setup(scheduler)
+            await asyncio.sleep(seconds)
+            stats = scheduler.stats()
+            await scheduler.stop()
+            return scheduler, out, stats
+
+        return asyncio.run(main())
+
+    def test_one_fetch_per_key_per_tick(self):
+        self.fetch = FakeFetch()
+        seen = {"a": 0, "b": 0}
+
+        def setup(scheduler):
+            for name in seen:
+                scheduler.subscribe(URL, 7, 0.05, lambda ts, usage, breakdown, name=name: seen.__setitem__(name, seen[name] + 1))
+
+        _, _, stats = self.run_for(0.22, setup)
+        self.assertEqual(stats["keys"], 1)
+        self.assertEqual(stats["subscribers"], 2)
+        self.assertGreaterEqual(len(self.fetch.calls), 3)
+        self.assertEqual(stats["fetches"], len(self.fetch.calls))
+        self.assertEqual(seen, {"a": len(self.fetch.calls), "b": len(self.fetch.calls)})
+
+    def test_ticks_stay_on_the_grid(self):
+        # Each fetch takes most of an interval; the schedule must not absorb it
+        self.fetch = FakeFetch(delay=0.03)
+
+        def setup(scheduler):
+            scheduler.subscribe(URL, 7, 0.05, lambda *a: None)
+            (sub,) = scheduler.subscriptions.values()
+            return sub.due
+
+        _, start, _ = self.run_for(0.53, setup)
+        times = [t for t, _, _ in self.fetch.calls]
+        self.assertGreaterEqual(len(times), 8)
+        for n, t in enumerate(times):
+            self.assertAlmostEqual(t - start, n * 0.05, delta=0.02)
+
+    def test_tick_skipped_while_fetch_in_flight(self):
+        self.fetch = FakeFetch(delay=0.3)
+
+        def setup(scheduler):
+            scheduler.subscribe(URL, 7, 0.05, lambda *a: None)
+
+        _, _, stats = self.run_for(0.27, setup)
+        self.assertEqual(len(self.fetch.calls), 1)
+        self.assertGreaterEqual(stats["skipped_ticks"], 3)
+
+    def test_interval_raised_to_minimum(self):
+        self.fetch = FakeFetch()
+
+        def setup(scheduler):
+            scheduler.subscribe(URL, 7, 0.001, lambda *a: None)
+            scheduler.subscribe(URL, 7, None, lambda *a: None)
+            return list(scheduler.subscriptions)
+
+        _, keys, _ = self.run_for(0.0, setup)
+        self.assertEqual(keys, [(URL, 7, 0.05)])
+
+    def test_last_unsubscribe_tears_key_down(self):
+        self.fetch = FakeFetch(delay=0.3)
+
+        async def main():
+            scheduler = SubscriptionScheduler(fetch=self.fetch, min_interval=0.05)
+            first = scheduler.subscribe(URL, 7, 0.05, lambda *a: None)
+            second = scheduler.subscribe(URL, 7, 0.05, lambda *a: None)
+            await asyncio.sleep(0.01)
+            (sub,) = scheduler.subscriptions.values()
+            scheduler.unsubscribe(first)
+            self.assertEqual(len(scheduler.subscriptions), 1)
+            scheduler.unsubscribe(second)
+            self.assertEqual(scheduler.subscriptions, {})
+            await asyncio.sleep(0.1)
+            self.assertTrue(sub.fetch.cancelled())
+            self.assertEqual(len(self.fetch.calls), 1)
+            await scheduler.stop()
+
+        asyncio.run(main())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import asyncio
+import unittest
+import sys
+import os
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app import streams as streams_module
+from app.scheduler import SubscriptionScheduler
+from app.streams import DEFAULT_STREAM_ID, ConnectionStreams
+
+URL = "http://127.0.0.1:8001"
+
+
+class FakeOutbox:
+    def __init__(self):
+        self.messages: list[tuple[dict, str | None]] = []
+
+    def put(self, message: dict, stream_id: str | None = None):
+        self.messages.append((message, stream_id))
+
+    def of_type(self, kind: str) -> list[dict]:
+        return [m for m, _ in self.messages if m.get("type") == kind]
+
+
+async def fetch(machine_url, pid, timings=False):
+    return {"pid": pid}
+
+
+class ConnectionStreamsTests(unittest.TestCase):
+    def run_streams(self, body):
+        async def main():
+            scheduler = SubscriptionScheduler(fetch=fetch, min_interval=0.05)
+            with mock.patch.object(streams_module, "scheduler", scheduler):
+                outbox = FakeOutbox()
+                try:
+                    await body(ConnectionStreams(outbox, max_streams=2), outbox, scheduler)
+                finally:
+                    await scheduler.stop()
+
+        asyncio.run(main())
+
+    def test_start_delivers_samples_until_done(self):
+        async def body(streams, outbox, scheduler):
+            stream = streams.start("a", URL, 7, 0.05, 2)
+            self.assertEqual(stream.info()["stream_id"], "a")
+            await asyncio.sleep(0.15)
+            self.assertEqual([m["stream_id"] for m in outbox.of_type("usage")], ["a", "a"])
+            self.assertEqual([sid for m, sid in outbox.messages if m["type"] == "usage"], ["a", "a"])
+            self.assertEqual([m["stream_id"] for m in outbox.of_type("stream_done")], ["a"])
+            self.assertEqual(streams.streams, {})
+            self.assertEqual(scheduler.subscriptions, {})
+
+        self.run_streams(body)
+
+    def test_stop_one_and_all(self):
+        async def body(streams, outbox, scheduler):
+            streams.start("a", URL, 7, 0.05, None)
+            streams.start("b", URL, 8, 0.05, None)
+            self.assertIsNone(streams.start("c", URL, 9, 0.05, None)) # max_streams
+            self.assertEqual(streams.stop("a"), ["a"])
+            self.assertEqual(streams.stop("missing"), [])
+            self.assertEqual([s["stream_id"] for s in streams.info()], ["b"])
+            self.assertEqual(streams.stop(), ["b"])
+            self.assertEqual(scheduler.subscriptions, {})
+
+        self.run_streams(body)
+
+    def test_unnamed_stream_replaces_the_default(self):
+        async def body(streams, outbox, scheduler):
+            streams.start(None, URL, 7, 0.05, None)
+            streams.start(None, URL, 8, 0.05, None)
+            self.assertEqual(list(streams.streams), [DEFAULT_STREAM_ID])
+            self.assertEqual(streams.streams[DEFAULT_STREAM_ID].pid, 8)
+            self.assertEqual([key[1] for key in scheduler.subscriptions], [8])
+
+        self.run_streams(body)
+
+    def test_modify_moves_to_the_new_interval(self):
+        async def body(streams, outbox, scheduler):
+            streams.start("a", URL, 7, 0.05, None)
+            stream = streams.modify("a", interval=0.1, samples=5)
+            self.assertEqual((stream.interval, stream.samples), (0.1, 5))
+            self.assertEqual(list(scheduler.subscriptions), [(URL, 7, 0.1)])
+            self.assertIsNone(streams.modify("missing", interval=1.0))
+
+        self.run_streams(body)
+
+
+class ModifyPayloadTests(unittest.TestCase):
+    def test_bad_modify_payload_keeps_the_connection(self):
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        with TestClient(app).websocket_connect("/ws") as ws:
+            for bad in ({"interval": "x"}, {"samples": "many"}, {"interval": -1}, {"samples": [1]}):
+                ws.send_json({"type": "modify", "stream_id": "a", **bad})
+                self.assertEqual(ws.receive_json(), {"error": "invalid_modify", "stream_id": "a"})
+            ws.send_json({"type": "modify", "stream_id": "a", "interval": 1})
+            self.assertEqual(ws.receive_json(), {"error": "unknown_stream", "stream_id": "a"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import unittest
+import sys
+import os
+from unittest import mock
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app import agent_graph
+from app.toolcall import MAX_PREAMBLE, MalformedToolCall, ToolCallParser
+
+USAGE_CALL = '{"tool": "GetUsage", "args": {"machine_url": "http://127.0.0.1:8001", "pid": 42}}'
+USAGE_DECISION = {"tool_name": "GetUsage", "tool_args": {"machine_url": "http://127.0.0.1:8001", "pid": 42}}
+
+
+def feed_chars(parser: ToolCallParser, text: str) -> tuple[dict | None, int]:
+    """Feeds one character at a time; returns the decision and how much was fed."""
+    for i, c in enumerate(text, 1):
+        decision = parser.feed(c)
+        if decision:
+            return decision, i
+    return None, len(text)
+
+
+class ToolCallParserTests(unittest.TestCase):
+    def test_chunked_input(self):
+        decision, used = feed_chars(ToolCallParser(), USAGE_CALL)
+        self.assertEqual(decision, USAGE_DECISION)
+        self.assertEqual(used, len(USAGE_CALL))
+
+    def test_args_before_tool(self):
+        parser = ToolCallParser()
+        self.assertIsNone(parser.feed('{"args": {"machine_url": "http://a", "pid": 1}, '))
+        self.assertEqual(parser.feed('"tool": "GetUsage"}'),
+                         {"tool_name": "GetUsage", "tool_args": {"machine_url": "http://a", "pid": 1}})
+
+    def test_braces_and_escaped_quotes_inside_strings(self):
+        text = '{"tool": "GetUsage", "args": {"machine_url": "http://a/{x}\\"}],", "pid": 7}, "note": "}{"}'
+        decision, _ = feed_chars(ToolCallParser(), text)
+        self.assertEqual(decision["tool_args"], {"machine_url": 'http://a/{x}"}],', "pid": 7})
+
+    def test_code_fence_and_prose(self):
+        parser = ToolCallParser()
+        self.assertIsNone(parser.feed("Sure, here you go:\n```json\n"))
+        self.assertEqual(parser.feed(USAGE_CALL + "\n```"), USAGE_DECISION)
+
+    def test_preamble_limit(self):
+        parser = ToolCallParser()
+        self.assertIsNone(parser.feed("x" * MAX_PREAMBLE))
+        with self.assertRaises(MalformedToolCall):
+            parser.feed("x")
+
+    def test_unknown_tool_fails_when_its_member_ends(self):
+        parser = ToolCallParser()
+        self.assertIsNone(parser.feed('{"tool": "RmRf"'))
+        with self.assertRaises(MalformedToolCall):
+            parser.feed(",")
+
+    def test_closed_object_with_missing_args(self):
+        parser = ToolCallParser()
+        self.assertIsNone(parser.feed('{"tool": "GetUsage", "args": {"pid": 1}'))
+        with self.assertRaises(MalformedToolCall):
+            parser.feed("}")
+
+    def test_no_tool(self):
+        with self.assertRaises(MalformedToolCall):
+            ToolCallParser().feed('{"args": {}}')
+
+    def test_arg_free_tools_dispatch_on_the_tool_member(self):
+        for tool in ("Stop", "ClusterListProcesses"):
+            parser = ToolCallParser()
+            self.assertIsNone(parser.feed(f'{{"tool": "{tool}"'))
+            self.assertEqual(parser.feed(", "), {"tool_name": tool, "tool_args": {}})
+            self.assertFalse(parser.closed)
+
+
+class StreamDecisionTests(unittest.TestCase):
+    def run_with(self, handler) -> dict:
+        async def main():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            with mock.patch.object(agent_graph, "_llm_client", client):
+                try:
+                    return await agent_graph._stream_decision({}, {"messages": []})
+                finally:
+                    await client.aclose()
+
+        return asyncio.run(main())
+
+    def test_returns_before_the_stream_ends(self):
+        pulled = []
+
+        async def events():
+            for i, c in enumerate(USAGE_CALL + ' and some more text the model keeps generating'):
+                pulled.append(i)
+                delta = json.dumps({"choices": [{"delta": {"content": c}}]})
+                yield f"data: {delta}\n\n".encode()
+            yield b"data: [DONE]\n\n"
+
+        def handler(request):
+            self.assertTrue(json.loads(request.content)["stream"])
+            return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=events())
+
+        self.assertEqual(self.run_with(handler), USAGE_DECISION)
+        self.assertLess(len(pulled), len(USAGE_CALL) + 5)
+
+    def test_falls_back_when_not_event_stream(self):
+        def handler(request):
+            body = {"choices": [{"message": {"content": "```json\n" + USAGE_CALL + "\n```"}}]}
+            return httpx.Response(200, json=body)
+
+        self.assertEqual(self.run_with(handler), USAGE_DECISION)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import asyncio
+import unittest
+import sys
+import os
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app import tools
+
+
+class ClientPoolTests(unittest.TestCase):
+    def test_least_recently_used_client_is_closed(self):
+        async def run():
+            with mock.patch.object(tools, "NODE_HTTP_MAX_CLIENTS", 2):
+                a = tools.get_client("http://a")
+                tools.get_client("http://b")
+                self.assertIs(tools.get_client("http://a"), a)
+                b = tools._clients["http://b"]
+                tools._process_lists["http://b"] = ('"x"', [])
+                tools.get_client("http://c")
+                self.assertEqual(list(tools._clients), ["http://a", "http://c"])
+                self.assertNotIn("http://b", tools._process_lists)
+                await asyncio.sleep(0)
+                self.assertTrue(b.is_closed)
+                self.assertFalse(a.is_closed)
+                await tools.close_clients()
+                self.assertTrue(a.is_closed)
+
+        asyncio.run(run())
+
+
+class ClusterUsageOrderTests(unittest.TestCase):
+    def test_rates_rank_before_cumulative_time(self):
+        usage = {
+            "idle": {"user_time": 5000.0, "sys_time": 0.0, "rates": None},
+            "busy": {"user_time": 10.0, "sys_time": 0.0, "rates": {"cpu_percent": 90.0}},
+            "quiet": {"user_time": 9000.0, "sys_time": 0.0, "rates": {"cpu_percent": 0.0}},
+            "young": {"user_time": 1.0, "sys_time": 0.0},
+        }
+
+        async def fake_get_usage(machine_url, pid):
+            return usage[machine_url]
+
+        machines = [{"name": name, "url": name} for name in usage]
+        with mock.patch.object(tools, "get_usage", fake_get_usage):
+            out = asyncio.run(tools.get_usage_all(machines, 1))
+        self.assertEqual([u["machine"] for u in out["usage"]], ["busy", "quiet", "idle", "young"])
+
+
+class FanOutStatusTests(unittest.TestCase):
+    def cluster_usage(self, answers: dict) -> dict:
+        async def fake_get_usage(machine_url, pid):
+            return answers[machine_url]
+
+        machines = [{"name": name, "url": name} for name in answers]
+        with mock.patch.object(tools, "get_usage", fake_get_usage):
+            return asyncio.run(tools.get_usage_all(machines, 1))
+
+    def test_missing_pid_is_not_a_failure(self):
+        out = self.cluster_usage({
+            "has": {"pid": 1, "user_time": 1.0},
+            "lacks": {"error": tools.NOT_FOUND_ERROR, "pid": 1},
+        })
+        self.assertFalse(out["partial"])
+        self.assertEqual([h["status"] for h in out["hosts"]], ["ok", "not_found"])
+        self.assertEqual([u["machine"] for u in out["usage"]], ["has"])
+
+    def test_unreachable_or_failing_hosts_are_partial(self):
+        for answer in (None, {"error": "Syscall function not loaded."}):
+            out = self.cluster_usage({"has": {"pid": 1}, "broken": answer})
+            self.assertTrue(out["partial"])
+            self.assertEqual(out["hosts"][1]["status"], "error")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import math
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.outbox import ClientOutbox
+from app.wire import FETCH_FAILED, RATE_FIELDS, Codec, columnar, pack_binary, unpack_binary
+
+USAGE = {
+    "pid": 42, "process_name": "worker", "engine": "procfs",
+    "user_time": 1.5, "sys_time": 0.25, "max_rss_kb": 2048,
+    "minor_page_faults": 10, "major_page_faults": 1, "block_input_ops": 2, "block_output_ops": 3,
+    "voluntary_ctx_switches": 4, "involuntary_ctx_switches": 5,
+    "rates": {field: float(i) for i, field in enumerate(RATE_FIELDS)},
+}
+
+
+def message(n: int, data) -> dict:
+    return {"ts": 100.0 + n, "type": "usage", "stream_id": f"s{n}", "data": data}
+
+
+class BinaryTests(unittest.TestCase):
+    def test_round_trip(self):
+        first_sample = {**USAGE, "rates": None}
+        frame = pack_binary([
+            message(0, USAGE),
+            message(1, first_sample),
+            message(2, {"error": "No such process", "pid": 7, "engine": "procfs"}),
+            message(3, None),
+        ])
+        ok, first, failed, unreachable = unpack_binary(frame)
+        self.assertEqual(ok["stream_id"], "s0")
+        self.assertEqual(ok["ts"], 100.0)
+        self.assertEqual(ok["pid"], 42)
+        self.assertEqual(ok["engine"], "procfs")
+        self.assertIsNone(ok["error"])
+        for field in ("user_time", "sys_time", "max_rss_kb", "involuntary_ctx_switches"):
+            self.assertEqual(ok[field], USAGE[field])
+        self.assertEqual(ok["rates"], USAGE["rates"])
+        self.assertIsNone(first["rates"])
+        self.assertEqual(first["max_rss_kb"], 2048)
+        self.assertEqual(failed["error"], "No such process")
+        self.assertTrue(math.isnan(failed["user_time"]))
+        self.assertEqual(failed["minor_page_faults"], -1)
+        self.assertEqual(unreachable["error"], FETCH_FAILED)
+
+    def test_rejects_other_versions(self):
+        frame = bytearray(pack_binary([message(0, USAGE)]))
+        frame[0] = 1
+        with self.assertRaises(ValueError):
+            unpack_binary(bytes(frame))
+
+
+class ColumnarTests(unittest.TestCase):
+    def test_carries_rates_errors_and_timings(self):
+        timed = {**message(0, USAGE), "timings": {"fetch_ms": 1.0}}
+        batch = columnar([timed, message(1, {"error": "No such process", "pid": 7})])
+        self.assertEqual(batch["count"], 2)
+        self.assertEqual(batch["engine"], ["procfs", None])
+        self.assertEqual(batch["error"], [None, "No such process"])
+        self.assertEqual(batch["rates"]["cpu_percent"], [USAGE["rates"]["cpu_percent"], None])
+        self.assertEqual(batch["timings"], [{"fetch_ms": 1.0}, None])
+        self.assertNotIn("timings", columnar([message(0, USAGE)]))
+
+
+class CodecTests(unittest.TestCase):
+    def test_plain_json_is_unbatched(self):
+        codec = Codec("json", 1, 0)
+        self.assertFalse(codec.batched)
+        self.assertEqual(json.loads(codec.encode([message(0, USAGE)])), message(0, USAGE))
+
+    def test_timings_support(self):
+        self.assertTrue(Codec("json", 8, 0).supports_timings)
+        self.assertFalse(Codec("binary", 1, 0).supports_timings)
+
+    def test_unknown_encoding(self):
+        with self.assertRaises(ValueError):
+            Codec("xml", 1, 0)
+
+    def test_outbox_batches_samples_between_control_messages(self):
+        text, binary = [], []
+
+        async def send_text(frame):
+            text.append(json.loads(frame))
+
+        async def send_bytes(frame):
+            binary.append(frame)
+
+        async def main(encoding):
+            outbox = ClientOutbox(send_text, maxsize=64, policy="drop_oldest",
+                                  codec=Codec(encoding, 3, 20), send_bytes=send_bytes)
+            for n in range(4):
+                outbox.put(message(n, USAGE), "a")
+            outbox.put({"type": "stream_done", "stream_id": "a"})
+            outbox.put(message(4, USAGE), "a")
+            outbox.start()
+            await asyncio.sleep(0.1)
+            outbox.stop()
+            return outbox
+
+        outbox = asyncio.run(main("json"))
+        self.assertEqual([m["type"] for m in text], ["usage_batch", "usage_batch", "stream_done", "usage_batch"])
+        self.assertEqual([m.get("count") for m in text], [3, 1, None, 1])
+        self.assertEqual(outbox.sent, 6)
+        self.assertEqual(outbox.frames, 4)
+
+        text.clear()
+        asyncio.run(main("binary"))
+        self.assertEqual([m["type"] for m in text], ["stream_done"])
+        self.assertEqual([len(unpack_binary(f)) for f in binary], [3, 1, 1])
+        self.assertEqual(unpack_binary(binary[0])[2]["ts"], 102.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
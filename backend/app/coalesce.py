@@ -0,0 +1,87 @@
+import asyncio
+import os
+import time
+
+from .engines import DEFAULT_ENGINE, normalize_cgroup
+from .executor import run_usage
+from .rates import sample_cgroup_usage, sample_usage
+
+USAGE_CACHE_TTL = float(os.getenv("USAGE_CACHE_TTL_MS", "100")) / 1000.0
+USAGE_CACHE_MAX_ENTRIES = int(os.getenv("USAGE_CACHE_MAX_ENTRIES", "4096"))
+
+
+async def _read_usage_async(pid: int, engine: str | None) -> dict:
+    return await run_usage(sample_usage, pid, engine)
+
+
+async def _read_cgroup_usage_async(path: str) -> dict:
+    return await run_usage(sample_cgroup_usage, path)
+
+
+class UsageCoalescer:
+    """
+    Single-flight front for usage reads. Concurrent requests for the same
+    (pid, engine), or the same cgroup path, share one in-flight read, and its
+    result is reused by anyone asking within `ttl` seconds.
+    """
+
+    def __init__(self, fetch=_read_usage_async, ttl: float = USAGE_CACHE_TTL,
+                 max_entries: int = USAGE_CACHE_MAX_ENTRIES, fetch_cgroup=_read_cgroup_usage_async):
+        self.fetch = fetch
+        self.fetch_cgroup = fetch_cgroup
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._inflight: dict[tuple, asyncio.Task] = {}
+        # key -> (monotonic expiry, result)
+        self._cache: dict[tuple, tuple[float, dict]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, pid: int, engine: str | None = None) -> dict:
+        return await self._get((pid, (engine or DEFAULT_ENGINE).lower()), self.fetch, pid, engine)
+
+    async def get_cgroup(self, path: str) -> dict:
+        path = normalize_cgroup(path)
+        return await self._get(("cgroup", path), self.fetch_cgroup, path)
+
+    async def _get(self, key: tuple, fetch, *args) -> dict:
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self.hits += 1
+            return cached[1]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(fetch(*args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        # Shielded, so a client that goes away doesn't cancel the shared read
+        return await asyncio.shield(task)
+
+    def _finish(self, key: tuple, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None or self.ttl <= 0:
+            return
+        now = time.monotonic()
+        if len(self._cache) >= self.max_entries:
+            self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+            if len(self._cache) >= self.max_entries:
+                self._cache.clear()
+        self._cache[key] = (now + self.ttl, task.result())
+
+    def stats(self) -> dict:
+        return {
+            "ttl_ms": self.ttl * 1000.0,
+            "entries": len(self._cache),
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+
+usage_cache = UsageCoalescer()
@@ -0,0 +1,108 @@
+import math
+import os
+from bisect import bisect_left
+from operator import itemgetter
+
+MAX_CHART_POINTS = 10000
+# Longer series are pre-reduced to per-chunk min/max before LTTB's Python loop
+LTTB_MAX_INPUT_ROWS = int(os.getenv("LTTB_MAX_INPUT_ROWS", "20000"))
+
+
+def aggregate(ts: list[float], columns: dict[str, list[float]], bucket: float) -> list[dict]:
+    """
+    Groups samples into `bucket`-second windows aligned to the epoch and
+    reports min/max/avg/last of every column per window. `ts` must be
+    sorted; windows without samples are left out. Each column is reduced
+    with builtins over list slices, so per-sample work stays in C.
+    """
+    out = []
+    i, n = 0, len(ts)
+    while i < n:
+        start = math.floor(ts[i] / bucket) * bucket
+        j = bisect_left(ts, start + bucket, i)
+        row = {"ts": start, "count": j - i}
+        for field, column in columns.items():
+            window = column[i:j]
+            row[field] = {
+                "min": min(window),
+                "max": max(window),
+                "avg": sum(window) / len(window),
+                "last": window[-1],
+            }
+        out.append(row)
+        i = j
+    return out
+
+
+def _extremes(values: list[float], rows: int) -> list[int]:
+    """
+    Indices of the min and max of each of `rows // 2` equal chunks, plus the
+    last sample. Slices, min/max and index all run in C, so this bounds the
+    input LTTB iterates over without losing spikes.
+    """
+    n = len(values)
+    size = -(-n // max(rows // 2, 1))
+    picked = []
+    for lo in range(0, n, size):
+        window = values[lo:lo + size]
+        low, high = window.index(min(window)), window.index(max(window))
+        if low > high:
+            low, high = high, low
+        picked.append(lo + low)
+        if high != low:
+            picked.append(lo + high)
+    if picked[-1] != n - 1:
+        picked.append(n - 1)
+    return picked
+
+
+def lttb(ts: list[float], values: list[float], points: int,
+         max_rows: int = LTTB_MAX_INPUT_ROWS) -> list[int]:
+    """
+    Largest-Triangle-Three-Buckets: indices of at most `points` samples that
+    keep the visual shape of the series. The first and last samples are
+    always kept; each bucket in between contributes the sample forming the
+    largest triangle with the previous pick and the next bucket's average.
+    Series longer than `max_rows` are first cut down with `_extremes` to a
+    few candidates per point, which costs a fraction of the full loop.
+    """
+    n = len(ts)
+    if n <= points:
+        return list(range(n))
+    if points < 3:
+        return [0, n - 1][:max(points, 0)]
+    if n > max(max_rows, points):
+        kept = _extremes(values, min(max_rows, 4 * points))
+        pick = itemgetter(*kept)
+        idx = lttb(pick(ts), pick(values), points, len(kept))
+        return [kept[i] for i in idx]
+    picked = [0]
+    every = (n - 2) / (points - 2)
+    a = 0
+    for b in range(points - 2):
+        lo = int(b * every) + 1
+        hi = int((b + 1) * every) + 1
+        nlo, nhi = hi, min(int((b + 2) * every) + 1, n)
+        if nlo >= nhi:
+            nlo, nhi = n - 1, n
+        avg_x = sum(ts[nlo:nhi]) / (nhi - nlo)
+        avg_y = sum(values[nlo:nhi]) / (nhi - nlo)
+        ax, ay = ts[a], values[a]
+        best, best_area = lo, -1.0
+        for i in range(lo, hi):
+            area = abs((ax - avg_x) * (values[i] - ay) - (ax - ts[i]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = i, area
+        picked.append(best)
+        a = best
+    picked.append(n - 1)
+    return picked
+
+
+def downsample(ts: list[float], columns: dict[str, list[float]], points: int) -> dict:
+    """Per-field LTTB series of at most `points` points each."""
+    series = {}
+    for field, column in columns.items():
+        idx = lttb(ts, column, points)
+        series[field] = {"ts": [ts[i] for i in idx], "values": [column[i] for i in idx]}
+    return series
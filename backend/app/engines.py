@@ -0,0 +1,502 @@
+import ctypes
+import errno
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from .syscall_wrapper import (
+    CRusage,
+    batch_buffers,
+    lookup_process_name,
+    read_subtree_rusage,
+    rusage_to_dict,
+    syscall,
+)
+from .timing import span
+
+# --- Pluggable usage engines ---
+#
+# An engine fills a CRusage struct with the aggregated usage of a process
+# and all of its descendants. Every engine shares the same struct, so the
+# conversion to the API dictionary is identical no matter which one ran.
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+PROC_ROOT = "/proc"
+
+
+class UsageEngine:
+    name = "base"
+
+    def available(self) -> bool:
+        return True
+
+    def read(self, pid: int, usage: CRusage) -> int:
+        """Fills `usage` for the subtree rooted at `pid`. Returns 0 or an errno."""
+        raise NotImplementedError
+
+
+class SyscallEngine(UsageEngine):
+    """The custom get_proc_subtree_rusage syscall (needs the patched kernel)."""
+
+    name = "syscall"
+
+    def __init__(self):
+        self._available: bool | None = None
+
+    def available(self) -> bool:
+        if self._available is None:
+            # libc always exports syscall(); a stock kernel answers ENOSYS
+            self._available = (
+                syscall is not None
+                and read_subtree_rusage(os.getpid(), CRusage()) != errno.ENOSYS
+            )
+        return self._available
+
+    def read(self, pid: int, usage: CRusage) -> int:
+        return read_subtree_rusage(pid, usage)
+
+
+class ProcfsEngine(UsageEngine):
+    """
+    Pure userspace fallback that walks /proc. Descendants come from
+    /proc/<pid>/task/<tid>/children (or one scan of every /proc/<pid>/stat
+    when the kernel lacks CONFIG_PROC_CHILDREN), and each process is read
+    exactly once.
+
+    Differences from the syscall: reaped children only contribute CPU time
+    and page faults (the only cumulative fields /proc exposes), and block I/O
+    is read from /proc/<pid>/io, which needs ptrace access to the target.
+    """
+
+    name = "procfs"
+
+    def __init__(self, buffer_size: int = 16384):
+        self.buffer_size = buffer_size
+        # One reusable read buffer per worker thread
+        self._local = threading.local()
+
+    def available(self) -> bool:
+        return os.path.isdir(PROC_ROOT)
+
+    def _read(self, path: str) -> bytes | None:
+        buf = getattr(self._local, "buf", None)
+        if buf is None:
+            buf = self._local.buf = bytearray(self.buffer_size)
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return None
+        try:
+            n = os.readv(fd, [buf])
+        except OSError:
+            return None
+        finally:
+            os.close(fd)
+        return bytes(memoryview(buf)[:n])
+
+    def _children(self, pid: int) -> list[int] | None:
+        """Direct children of `pid`, or None if the children files don't exist."""
+        try:
+            tids = os.listdir(f"{PROC_ROOT}/{pid}/task")
+        except OSError:
+            return []
+        children = []
+        for tid in tids:
+            data = self._read(f"{PROC_ROOT}/{pid}/task/{tid}/children")
+            if data is None:
+                if os.path.isdir(f"{PROC_ROOT}/{pid}/task/{tid}"):
+                    return None
+                continue
+            children.extend(int(c) for c in data.split())
+        return children
+
+    def _children_map(self) -> dict[int, list[int]]:
+        """ppid -> children for every process, built from one pass over /proc."""
+        tree: dict[int, list[int]] = {}
+        for entry in os.listdir(PROC_ROOT):
+            if not entry.isdigit():
+                continue
+            data = self._read(f"{PROC_ROOT}/{entry}/stat")
+            if data is None:
+                continue
+            ppid = int(data[data.rindex(b")") + 2:].split(None, 2)[1])
+            tree.setdefault(ppid, []).append(int(entry))
+        return tree
+
+    def descendants(self, pid: int) -> list[int]:
+        """`pid` followed by all of its descendants, breadth first."""
+        return [p for p, _, _ in self.walk(pid)]
+
+    def walk(self, pid: int) -> list[tuple[int, int | None, int]]:
+        """(pid, parent, depth) for `pid` and every descendant, breadth first."""
+        order = [(pid, None, 0)]
+        children = self._children(pid)
+        tree = self._children_map() if children is None else None
+        i = 0
+        while i < len(order):
+            p, _, depth = order[i]
+            if tree is not None:
+                kids = tree.get(p, ())
+            else:
+                kids = children if i == 0 else self._children(p)
+            order.extend((k, p, depth + 1) for k in kids or ())
+            i += 1
+        return order
+
+    def read_process(self, pid: int) -> list[int] | None:
+        """
+        Own usage of one process including its reaped children, as
+        [utime_ticks, stime_ticks, maxrss_kb, minflt, majflt, inblock,
+        oublock, nvcsw, nivcsw], or None if it has gone away.
+        """
+        stat = self._read(f"{PROC_ROOT}/{pid}/stat")
+        if stat is None:
+            return None
+        # Fields after "comm" start at field 3 (state); see proc(5)
+        f = stat[stat.rindex(b")") + 2:].split()
+        minflt = int(f[7]) + int(f[8])
+        majflt = int(f[9]) + int(f[10])
+        utime = int(f[11]) + int(f[13])
+        stime = int(f[12]) + int(f[14])
+
+        maxrss = nvcsw = nivcsw = 0
+        status = self._read(f"{PROC_ROOT}/{pid}/status")
+        if status is not None:
+            for line in status.splitlines():
+                if line.startswith(b"VmHWM:"):
+                    maxrss = int(line.split()[1])
+                elif line.startswith(b"voluntary_ctxt_switches:"):
+                    nvcsw = int(line.split()[1])
+                elif line.startswith(b"nonvoluntary_ctxt_switches:"):
+                    nivcsw = int(line.split()[1])
+
+        inblock = oublock = 0
+        io = self._read(f"{PROC_ROOT}/{pid}/io")
+        if io is not None:
+            for line in io.splitlines():
+                if line.startswith(b"read_bytes:"):
+                    inblock = int(line.split()[1]) >> 9
+                elif line.startswith(b"write_bytes:"):
+                    oublock = int(line.split()[1]) >> 9
+
+        return [utime, stime, maxrss, minflt, majflt, inblock, oublock, nvcsw, nivcsw]
+
+    def read(self, pid: int, usage: CRusage) -> int:
+        if not os.path.exists(f"{PROC_ROOT}/{pid}"):
+            return errno.ESRCH
+        totals = [0] * 9
+        found = False
+        for p in self.descendants(pid):
+            own = self.read_process(p)
+            if own is None:
+                continue # Exited while we were walking
+            found = True
+            for i in (0, 1, 3, 4, 5, 6, 7, 8):
+                totals[i] += own[i]
+            totals[2] = max(totals[2], own[2])
+        if not found:
+            return errno.ESRCH
+        fill_rusage(usage, *totals)
+        return 0
+
+
+def fill_rusage(usage: CRusage, utime_ticks, stime_ticks, maxrss, minflt, majflt,
+                inblock, oublock, nvcsw, nivcsw):
+    """Fills `usage` from clock-tick CPU times and plain counters."""
+    ctypes.memset(ctypes.addressof(usage), 0, ctypes.sizeof(usage))
+    usage.ru_utime.tv_sec, rem = divmod(utime_ticks, CLK_TCK)
+    usage.ru_utime.tv_usec = rem * 1_000_000 // CLK_TCK
+    usage.ru_stime.tv_sec, rem = divmod(stime_ticks, CLK_TCK)
+    usage.ru_stime.tv_usec = rem * 1_000_000 // CLK_TCK
+    usage.ru_maxrss = maxrss
+    usage.ru_minflt = minflt
+    usage.ru_majflt = majflt
+    usage.ru_inblock = inblock
+    usage.ru_oublock = oublock
+    usage.ru_nvcsw = nvcsw
+    usage.ru_nivcsw = nivcsw
+
+
+class CgroupEngine(UsageEngine):
+    """
+    cgroup v2 accounting: usage of the cgroup a PID belongs to (or of an
+    explicit cgroup path), read from cpu.stat, memory.peak, memory.stat and
+    io.stat. The kernel keeps these aggregated, so a read costs the same no
+    matter how many processes the cgroup holds.
+
+    This matches the subtree semantics when the workload runs in its own
+    cgroup (a container or systemd service). The counters cover everything
+    that ever ran in the cgroup. Context switches are not accounted per
+    cgroup and are reported as 0. The open files of recently read cgroups
+    are cached and re-read with pread.
+    """
+
+    name = "cgroup"
+    FILES = ("cpu.stat", "memory.peak", "memory.stat", "io.stat")
+
+    def __init__(self, root: str = os.getenv("CGROUP_ROOT", "/sys/fs/cgroup"),
+                 proc_root: str = PROC_ROOT, max_open: int = int(os.getenv("CGROUP_FD_CACHE_SIZE", "256"))):
+        self.root = root
+        self.proc_root = proc_root
+        self.max_open = max_open
+        # cgroup path -> {file name: fd or None when the file is missing}
+        self._open: OrderedDict[str, dict[str, int | None]] = OrderedDict()
+        # Held across reads too, so an evicted fd is never closed mid-pread
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return os.path.exists(os.path.join(self.root, "cgroup.controllers"))
+
+    def cgroup_of(self, pid: int) -> str | None:
+        """The cgroup v2 path of `pid` relative to the mount, or None."""
+        try:
+            with open(f"{self.proc_root}/{pid}/cgroup", "rb") as f:
+                for line in f:
+                    if line.startswith(b"0::"):
+                        return line[3:].strip().decode()
+        except OSError:
+            pass
+        return None
+
+    def read(self, pid: int, usage: CRusage) -> int:
+        path = self.cgroup_of(pid)
+        if path is None:
+            return errno.ESRCH
+        return self.read_cgroup(path, usage)
+
+    def cgroup_id(self, path: str) -> int | None:
+        """Inode of the cgroup directory; it changes when the cgroup is recreated."""
+        try:
+            return os.stat(self.root + normalize_cgroup(path)).st_ino
+        except OSError:
+            return None
+
+    def read_cgroup(self, path: str, usage: CRusage) -> int:
+        path = normalize_cgroup(path)
+        if ".." in path.split("/"):
+            return errno.EINVAL
+        with self._lock:
+            for attempt in (0, 1):
+                files = self._files(path)
+                if files is None:
+                    return errno.ENOENT
+                try:
+                    data = {name: _pread_all(fd) if fd is not None else b"" for name, fd in files.items()}
+                    break
+                except OSError:
+                    # The cgroup was removed (and maybe recreated): reopen once
+                    self._close(path)
+                    if attempt:
+                        return errno.ENOENT
+
+        cpu = _keyed(data["cpu.stat"])
+        memory = _keyed(data["memory.stat"])
+        rbytes = wbytes = 0
+        for line in data["io.stat"].splitlines():
+            for item in line.split()[1:]:
+                key, _, value = item.partition(b"=")
+                if key == b"rbytes":
+                    rbytes += int(value)
+                elif key == b"wbytes":
+                    wbytes += int(value)
+        peak = data["memory.peak"].strip()
+        majflt = memory.get(b"pgmajfault", 0)
+
+        fill_rusage(usage, 0, 0, int(peak) // 1024 if peak else 0,
+                    memory.get(b"pgfault", 0) - majflt, majflt, rbytes >> 9, wbytes >> 9, 0, 0)
+        usage.ru_utime.tv_sec, usage.ru_utime.tv_usec = divmod(cpu.get(b"user_usec", 0), 1_000_000)
+        usage.ru_stime.tv_sec, usage.ru_stime.tv_usec = divmod(cpu.get(b"system_usec", 0), 1_000_000)
+        return 0
+
+    def _files(self, path: str) -> dict[str, int | None] | None:
+        files = self._open.get(path)
+        if files is not None:
+            self._open.move_to_end(path)
+            return files
+        directory = self.root + path
+        try:
+            cpu_fd = os.open(os.path.join(directory, "cpu.stat"), os.O_RDONLY)
+        except OSError:
+            return None
+        files = {"cpu.stat": cpu_fd}
+        for name in self.FILES[1:]:
+            try:
+                files[name] = os.open(os.path.join(directory, name), os.O_RDONLY)
+            except OSError:
+                files[name] = None # e.g. memory.peak needs Linux 5.19
+        self._open[path] = files
+        while len(self._open) > self.max_open:
+            self._close(next(iter(self._open)))
+        return files
+
+    def _close(self, path: str):
+        for fd in (self._open.pop(path, None) or {}).values():
+            if fd is not None:
+                os.close(fd)
+
+
+def normalize_cgroup(path: str) -> str:
+    """cgroup path relative to the mount, with one leading slash."""
+    return "/" + path.strip("/")
+
+
+def _pread_all(fd: int, size: int = 8192) -> bytes:
+    chunks = []
+    offset = 0
+    while True:
+        chunk = os.pread(fd, size, offset)
+        chunks.append(chunk)
+        if len(chunk) < size:
+            return b"".join(chunks)
+        offset += len(chunk)
+
+
+def _keyed(data: bytes) -> dict[bytes, int]:
+    """Parses "key value" lines as in cpu.stat and memory.stat."""
+    out = {}
+    for line in data.splitlines():
+        key, _, value = line.partition(b" ")
+        if value.strip().isdigit():
+            out[key] = int(value)
+    return out
+
+
+class FakeEngine(UsageEngine):
+    """
+    Deterministic synthetic usage for benchmarks and offline development.
+    Counters grow with time at a per-PID rate, and every read can be made to
+    take USAGE_FAKE_LATENCY_MS to stand in for a slow kernel walk. Only
+    registered when USAGE_FAKE_ENGINE=1, so production nodes never serve it.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_ms: float = float(os.getenv("USAGE_FAKE_LATENCY_MS", "0"))):
+        self.latency = latency_ms / 1000.0
+        self.started = time.monotonic()
+
+    def read(self, pid: int, usage: CRusage) -> int:
+        if pid <= 0:
+            return errno.ESRCH
+        if self.latency:
+            time.sleep(self.latency)
+        elapsed = time.monotonic() - self.started
+        share = (pid % 7 + 1) / 10.0 # 10-80% of a CPU
+        ticks = int(elapsed * CLK_TCK * share)
+        fill_rusage(
+            usage, ticks, ticks // 4, 10_000 + (pid % 97) * 512,
+            int(elapsed * 50 * share), pid % 5, int(elapsed * 8), int(elapsed * 4),
+            int(elapsed * 100 * share), int(elapsed * 10 * share),
+        )
+        return 0
+
+
+ENGINES: dict[str, UsageEngine] = {
+    engine.name: engine for engine in (SyscallEngine(), ProcfsEngine(), CgroupEngine())
+}
+if os.getenv("USAGE_FAKE_ENGINE") == "1":
+    ENGINES["fake"] = FakeEngine()
+
+# "auto" prefers the syscall and falls back to /proc on stock kernels
+DEFAULT_ENGINE = os.getenv("USAGE_ENGINE", "auto")
+
+
+def get_engine(name: str | None = None) -> UsageEngine | None:
+    name = (name or DEFAULT_ENGINE).lower()
+    if name == "auto":
+        syscall_engine = ENGINES["syscall"]
+        return syscall_engine if syscall_engine.available() else ENGINES["procfs"]
+    return ENGINES.get(name)
+
+
+def _engine_error(name: str | None, engine: UsageEngine | None) -> str | None:
+    if engine is None:
+        return f"Unknown usage engine '{name}'."
+    if not engine.available():
+        if engine.name == "syscall":
+            return "Syscall function not loaded."
+        return f"Usage engine '{engine.name}' is not available."
+    return None
+
+
+def read_usage(pid: int, engine: str | None = None) -> dict:
+    """Subtree usage for one PID through the selected (or default) engine."""
+    impl = get_engine(engine)
+    error = _engine_error(engine, impl)
+    if error:
+        print(f"Fatal: {error} Cannot get usage.", file=sys.stderr)
+        return {"error": error}
+    usage = batch_buffers(1)[0]
+    with span(f"usage.read.{impl.name}"):
+        e = impl.read(pid, usage)
+    if e:
+        error_message = os.strerror(e)
+        print(f"{impl.name} engine failed for PID {pid}: {error_message}", file=sys.stderr)
+        return {"error": error_message, "pid": pid, "engine": impl.name}
+    with span("usage.name_lookup"):
+        name = lookup_process_name(pid)
+    result = rusage_to_dict(pid, name, usage)
+    result["engine"] = impl.name
+    return result
+
+
+def read_usage_batch(pids: list[int], engine: str | None = None) -> list[dict]:
+    """
+    Subtree usage for every PID in one go, in the same order. Failing PIDs get
+    their own {"error", "pid"} entry instead of failing the whole batch.
+    """
+    impl = get_engine(engine)
+    error = _engine_error(engine, impl)
+    if error:
+        print(f"Fatal: {error} Cannot get usage.", file=sys.stderr)
+        return [{"error": error, "pid": pid} for pid in pids]
+
+    buffers = batch_buffers(len(pids))
+    errors = [0] * len(pids)
+
+    # 1. Read every subtree back to back so the snapshots are close in time
+    with span(f"usage.read_batch.{impl.name}"):
+        for i, pid in enumerate(pids):
+            errors[i] = impl.read(pid, buffers[i])
+
+    # 2. Convert the filled structs (and look up names) afterwards
+    results = []
+    for i, pid in enumerate(pids):
+        if errors[i]:
+            error_message = os.strerror(errors[i])
+            print(f"{impl.name} engine failed for PID {pid}: {error_message}", file=sys.stderr)
+            results.append({"error": error_message, "pid": pid, "engine": impl.name})
+        else:
+            with span("usage.name_lookup"):
+                name = lookup_process_name(pid)
+            result = rusage_to_dict(pid, name, buffers[i])
+            result["engine"] = impl.name
+            results.append(result)
+    return results
+
+
+def read_cgroup_usage(path: str) -> dict:
+    """Usage of a cgroup v2 path (relative to the mount) in the /usage schema."""
+    impl = ENGINES["cgroup"]
+    error = _engine_error("cgroup", impl)
+    if error:
+        return {"error": error, "cgroup": path}
+    path = normalize_cgroup(path)
+    usage = batch_buffers(1)[0]
+    with span("usage.read.cgroup"):
+        e = impl.read_cgroup(path, usage)
+    if e:
+        return {"error": os.strerror(e), "cgroup": path, "engine": impl.name}
+    result = rusage_to_dict(None, path, usage)
+    result["engine"] = impl.name
+    result["cgroup"] = path
+    return result
+
+
+def list_engines() -> dict:
+    return {
+        "default": DEFAULT_ENGINE,
+        "engines": [{"name": e.name, "available": e.available()} for e in ENGINES.values()],
+    }
@@ -0,0 +1,27 @@
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .timing import timings
+
+# Usage reads (ctypes syscall, /proc walks, psutil) run on their own small
+# pool instead of the shared threadpool FastAPI uses for sync endpoints, so
+# a burst of usage polls can't starve the rest of the API.
+USAGE_WORKERS = int(os.getenv("USAGE_WORKERS", "4"))
+
+usage_executor = ThreadPoolExecutor(max_workers=USAGE_WORKERS, thread_name_prefix="usage")
+
+
+async def run_usage(fn, *args, **kwargs):
+    """Runs `fn` on the usage pool in the caller's context, so spans reach its trace."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    submitted = time.perf_counter_ns()
+
+    def call():
+        timings.record("usage.executor_wait", time.perf_counter_ns() - submitted)
+        return fn(*args, **kwargs)
+
+    return await loop.run_in_executor(usage_executor, ctx.run, call)
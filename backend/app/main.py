@@ -1,24 +1,258 @@
-from fastapi import FastAPI, Query
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Query, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from .syscall_wrapper import call_custom_syscall, list_processes
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+from .coalesce import usage_cache
+from .downsample import MAX_CHART_POINTS, aggregate, downsample
+from .engines import list_engines
+from .executor import run_usage
+from .metadata import metadata_cache
+from .metrics import OPENMETRICS_TYPE, PROMETHEUS_TYPE, metrics_collector, render
+from .process_index import PROCESS_FIELDS, process_index
+from .rates import sample_usage_batch
+from .sampler import MIN_WATCH_INTERVAL, USAGE_FIELDS, next_tick, sampler
+from .store import USAGE_RANGE_MAX_ROWS
+from .timing import span, timings, trace
+from .tree import MAX_TREE_DEPTH, usage_tree
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await sampler.stop()
+
+app = FastAPI(lifespan=lifespan)
+
+MAX_BATCH_PIDS = 4096
+MAX_PROCESS_PAGE = 10000
 
-app = FastAPI()
+class UsageBatchRequest(BaseModel):
+    pids: list[int] = Field(..., max_length=MAX_BATCH_PIDS, description="PIDs to sample")
+
+class WatchRequest(BaseModel):
+    pid: int = Field(..., description="PID")
+    interval: float = Field(default=1.0, gt=0, description="seconds between samples")
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
-    allow_methods=["*"]
+    allow_methods=["*"],
+    expose_headers=["ETag", "X-Process-Generation", "X-Total-Count"]
 )
 
 @app.get("/")
 def root():
     return {"status": "ok"}
 
+async def _timed_usage(pid: int | None, engine: str | None, with_timings: bool, cgroup: str | None = None) -> dict:
+    def read():
+        return usage_cache.get_cgroup(cgroup) if cgroup is not None else usage_cache.get(pid, engine)
+
+    if not with_timings:
+        with span("http.usage"):
+            return await read()
+    with trace() as stages:
+        usage = await read()
+    timings.record("http.usage", int(stages["total"] * 1e6))
+    # Stages other than "total" are absent when the read was cached or shared
+    return {**usage, "timings": stages}
+
 @app.get("/usage")
-def get_usage(pid: int = Query(...)):
-    return call_custom_syscall(pid)
+async def get_usage(pid: int | None = Query(default=None), engine: str | None = Query(default=None),
+                    cgroup: str | None = Query(default=None, description="cgroup v2 path, instead of a pid"),
+                    timings: bool = Query(default=False, description="include a per-stage latency breakdown")):
+    if pid is None and cgroup is None:
+        return JSONResponse({"error": "Either pid or cgroup is required."}, status_code=422)
+    return await _timed_usage(pid, engine, timings, cgroup)
+
+@app.get("/debug/timings")
+async def get_debug_timings(reset: bool = Query(default=False)):
+    snapshot = timings.snapshot()
+    if reset:
+        timings.reset()
+    return snapshot
+
+async def _push_usage(ws: WebSocket, pid: int, interval: float, samples: int | None, engine: str | None,
+                      with_timings: bool = False):
+    tick = asyncio.get_running_loop().time()
+    count = 0
+    while True:
+        usage = await _timed_usage(pid, engine, with_timings)
+        await ws.send_json({"ts": time.time(), "type": "usage", "data": usage})
+        count += 1
+        if samples and count >= samples:
+            return
+        tick = await next_tick(tick, interval)
+
+async def _wait_for_disconnect(ws: WebSocket):
+    while True:
+        message = await ws.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+@app.websocket("/usage/stream")
+async def usage_stream(
+    ws: WebSocket,
+    pid: int = Query(...),
+    interval: float = Query(default=1.0, gt=0),
+    samples: int | None = Query(default=None, ge=1),
+    engine: str | None = Query(default=None),
+    timings: bool = Query(default=False, description="include a per-stage latency breakdown"),
+):
+    await ws.accept()
+    interval = max(interval, MIN_WATCH_INTERVAL)
+    pusher = asyncio.create_task(_push_usage(ws, pid, interval, samples, engine, timings))
+    listener = asyncio.create_task(_wait_for_disconnect(ws))
+    done, pending = await asyncio.wait({pusher, listener}, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    if pusher in done and not pusher.cancelled() and pusher.exception() is None:
+        await ws.send_json({"ts": time.time(), "type": "done"})
+        await ws.close()
+
+@app.get("/usage/tree")
+async def get_usage_tree(
+    pid: int = Query(...),
+    depth: int | None = Query(default=None, ge=0, le=MAX_TREE_DEPTH, description="deepest level to list"),
+    min_share: float = Query(default=0.0, ge=0, le=1, description="fold children below this share of the root's CPU time"),
+):
+    return await run_usage(usage_tree, pid, depth, min_share)
+
+@app.post("/usage/batch")
+async def get_usage_batch(req: UsageBatchRequest, engine: str | None = Query(default=None)):
+    return await run_usage(sample_usage_batch, req.pids, engine)
+
+@app.get("/usage/stats")
+async def get_usage_stats():
+    return {"cache": usage_cache.stats(), "metadata": metadata_cache.stats()}
+
+@app.get("/metrics")
+async def get_metrics(request: Request):
+    samples = await metrics_collector.collect(sampler.watches)
+    openmetrics = "application/openmetrics-text" in request.headers.get("accept", "")
+    return Response(render(samples, openmetrics), media_type=OPENMETRICS_TYPE if openmetrics else PROMETHEUS_TYPE)
+
+@app.get("/engines")
+def get_engines():
+    return list_engines()
 
 @app.get("/processes")
-def get_processes():
-    return list_processes()
\ No newline at end of file
+def get_processes(
+    request: Request,
+    since: int | None = Query(default=None, ge=0),
+    fields: str | None = Query(default=None, description="comma separated: " + ",".join(PROCESS_FIELDS)),
+    filter: str | None = Query(default=None, description="name substring, or name:<s> / user:<s>"),
+    sort: str | None = Query(default=None, description="field to sort by, prefix with - for descending"),
+    limit: int | None = Query(default=None, ge=1, le=MAX_PROCESS_PAGE),
+    offset: int = Query(default=0, ge=0),
+):
+    generation = process_index.refresh()
+    etag = f'"{process_index.instance}-{generation}"'
+    headers = {"ETag": etag, "X-Process-Generation": str(generation)}
+    querying = fields or filter or sort or limit is not None or offset
+    # Resource fields change without the process table changing
+    if not querying and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    if since is not None:
+        return JSONResponse(process_index.delta(since), headers=headers)
+    if not querying:
+        return Response(process_index.snapshot_json(), media_type="application/json", headers=headers)
+
+    name = user = None
+    for term in (filter or "").split(","):
+        kind, sep, value = term.partition(":")
+        if not sep:
+            name = term or name
+        elif kind == "user":
+            user = value
+        elif kind == "name":
+            name = value
+    try:
+        total, page = process_index.query(
+            fields=fields.split(",") if fields else None,
+            name=name, user=user, sort=sort, limit=limit, offset=offset,
+        )
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    del headers["ETag"]
+    headers["X-Total-Count"] = str(total)
+    return JSONResponse(page, headers=headers)
+
+@app.post("/watches")
+async def add_watch(req: WatchRequest):
+    return sampler.add_watch(req.pid, req.interval).info()
+
+@app.get("/watches")
+async def get_watches():
+    return [w.info() for w in sampler.watches.values()]
+
+@app.delete("/watches/{pid}")
+async def remove_watch(pid: int):
+    return {"pid": pid, "removed": sampler.remove_watch(pid)}
+
+def _shape_series(ts: list[float], columns: dict[str, list[float]],
+                  bucket: float | None, points: int | None) -> dict:
+    """Server-side reduction for chart queries: time buckets or LTTB series."""
+    if bucket is not None:
+        return {"bucket": bucket, "buckets": aggregate(ts, columns, bucket)}
+    return {"points": points, "series": downsample(ts, columns, points)}
+
+def _series_fields(fields: str | None) -> tuple[str, ...] | None:
+    if not fields:
+        return None
+    wanted = tuple(f for f in fields.split(",") if f in USAGE_FIELDS)
+    return wanted or None
+
+@app.get("/usage/history")
+async def get_usage_history(
+    pid: int = Query(...),
+    since: int = Query(default=0, ge=0),
+    bucket: float | None = Query(default=None, gt=0, description="aggregate into buckets of this many seconds"),
+    points: int | None = Query(default=None, ge=3, le=MAX_CHART_POINTS, description="LTTB-downsample to at most this many points"),
+    fields: str | None = Query(default=None, description="comma-separated usage fields"),
+):
+    watch = sampler.watches.get(pid)
+    if watch is None:
+        return {"error": "PID is not being watched.", "pid": pid}
+    body = {
+        "pid": pid,
+        "process_name": watch.process_name,
+        "next": watch.history.next_seq,
+    }
+    if bucket is None and points is None:
+        start, samples = watch.history.since(since)
+        return {**body, "missed": start - since, "samples": samples}
+    start, ts, columns = watch.history.columns_since(since, _series_fields(fields))
+    return {**body, "missed": start - since, **_shape_series(ts, columns, bucket, points)}
+
+@app.get("/usage/range")
+async def get_usage_range(
+    pid: int = Query(...),
+    start: float | None = Query(default=None, alias="from", description="unix seconds"),
+    end: float | None = Query(default=None, alias="to", description="unix seconds"),
+    limit: int = Query(default=USAGE_RANGE_MAX_ROWS, ge=1, le=USAGE_RANGE_MAX_ROWS),
+    bucket: float | None = Query(default=None, gt=0, description="aggregate into buckets of this many seconds"),
+    points: int | None = Query(default=None, ge=3, le=MAX_CHART_POINTS, description="LTTB-downsample to at most this many points"),
+    fields: str | None = Query(default=None, description="comma-separated usage fields"),
+    start_time: int | None = Query(default=None, ge=0, description="process start time in clock ticks; defaults to the newest process with this pid"),
+):
+    store = sampler.store
+    if store is None:
+        return {"error": "Usage store is disabled; set USAGE_STORE_DIR.", "pid": pid}
+    if start_time is None:
+        start_time = await run_usage(store.latest, pid)
+    body = {"pid": pid, "start_time": start_time, "from": start, "to": end}
+    if bucket is None and points is None:
+        samples, truncated = await run_usage(store.range, pid, start, end, limit, start_time)
+        return {**body, "truncated": truncated, "samples": samples}
+
+    def reduce():
+        ts, columns, truncated = store.range_columns(pid, start, end, limit, _series_fields(fields), start_time)
+        return truncated, _shape_series(ts, columns, bucket, points)
+
+    truncated, shaped = await run_usage(reduce)
+    return {**body, "truncated": truncated, **shaped}
@@ -0,0 +1,68 @@
+import os
+import threading
+from collections import OrderedDict
+
+import psutil
+
+PROCESS_METADATA_CACHE_SIZE = int(os.getenv("PROCESS_METADATA_CACHE_SIZE", "4096"))
+
+
+def process_start_time(pid: int) -> int | None:
+    """
+    Start time of `pid` in clock ticks since boot (field 22 of
+    /proc/<pid>/stat), or None if the process doesn't exist. Together with the
+    PID it identifies a process even across PID reuse.
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Fields after "comm" start at field 3 (state); see proc(5)
+    return int(stat[stat.rindex(b")") + 2:].split()[19])
+
+
+class ProcessMetadataCache:
+    """
+    LRU cache of process names keyed by (pid, start time). A lookup costs one
+    /proc/<pid>/stat read; psutil is only used on a miss, i.e. for a new
+    process or when a PID has been reused.
+    """
+
+    def __init__(self, maxsize: int = PROCESS_METADATA_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[tuple[int, int], str] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def name(self, pid: int) -> str:
+        start_time = process_start_time(pid)
+        if start_time is None:
+            # Process is dead, but we can still get stats
+            return "N/A"
+        key = (pid, start_time)
+        with self._lock:
+            name = self._entries.get(key)
+            if name is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return name
+            self.misses += 1
+        try:
+            name = psutil.Process(pid).name()
+        except Exception:
+            return "N/A" # Gone in the meantime, or other errors (e.g., permissions)
+        with self._lock:
+            self._entries[key] = name
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return name
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "maxsize": self.maxsize,
+                "hits": self.hits, "misses": self.misses}
+
+
+metadata_cache = ProcessMetadataCache()
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import time
+
+from .engines import read_usage_batch
+from .executor import run_usage
+from .process_index import process_index
+
+METRICS_PIDS = [int(p) for p in os.getenv("METRICS_PIDS", "").replace(" ", "").split(",") if p.isdigit()]
+METRICS_PROCESS_NAMES = [n.strip() for n in os.getenv("METRICS_PROCESS_NAMES", "").split(",") if n.strip()]
+METRICS_CACHE_TTL = float(os.getenv("METRICS_CACHE_TTL", "5"))
+METRICS_MAX_TARGETS = int(os.getenv("METRICS_MAX_TARGETS", "1024"))
+
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# usage field -> (metric name, type, help, scale)
+METRICS = {
+    "user_time": ("rusage_cpu_user_seconds", "counter", "User CPU time of the process subtree.", 1.0),
+    "sys_time": ("rusage_cpu_system_seconds", "counter", "System CPU time of the process subtree.", 1.0),
+    "max_rss_kb": ("rusage_max_rss_bytes", "gauge", "Largest resident set size in the process subtree.", 1024.0),
+    "minor_page_faults": ("rusage_minor_page_faults", "counter", "Page faults served without I/O.", 1.0),
+    "major_page_faults": ("rusage_major_page_faults", "counter", "Page faults that required I/O.", 1.0),
+    "block_input_ops": ("rusage_block_input_ops", "counter", "Block input operations.", 1.0),
+    "block_output_ops": ("rusage_block_output_ops", "counter", "Block output operations.", 1.0),
+    "voluntary_ctx_switches": ("rusage_voluntary_context_switches", "counter", "Voluntary context switches.", 1.0),
+    "involuntary_ctx_switches": ("rusage_involuntary_context_switches", "counter", "Involuntary context switches.", 1.0),
+}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(sample: dict) -> str:
+    return '{pid="%s",process_name="%s",engine="%s"}' % (
+        sample.get("pid"), _escape(sample.get("process_name", "N/A")), _escape(sample.get("engine", "")),
+    )
+
+
+def render(samples: list[dict], openmetrics: bool = True) -> str:
+    """Formats usage samples as OpenMetrics (or Prometheus 0.0.4) text."""
+    ok = [s for s in samples if "error" not in s]
+    lines = []
+    for field, (name, kind, help_text, scale) in METRICS.items():
+        # OpenMetrics names the counter family without the _total suffix
+        family = name if openmetrics or kind != "counter" else name + "_total"
+        suffix = "_total" if kind == "counter" else ""
+        lines.append(f"# TYPE {family} {kind}")
+        lines.append(f"# HELP {family} {help_text}")
+        for s in ok:
+            lines.append(f"{name}{suffix}{_labels(s)} {float(s.get(field) or 0) * scale!r}")
+    lines.append("# TYPE rusage_up gauge")
+    lines.append("# HELP rusage_up Whether the subtree of a target PID could be read.")
+    for s in samples:
+        lines.append(f'rusage_up{{pid="{s.get("pid")}"}} {0 if "error" in s else 1}')
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsCollector:
+    """
+    Scrape-time collection for /metrics. Targets are METRICS_PIDS, live
+    processes named in METRICS_PROCESS_NAMES and the sampler's watches; all
+    of them are read in one batch, and that result is shared by every scrape
+    (and every concurrent scraper) for `ttl` seconds.
+    """
+
+    def __init__(self, read=read_usage_batch, pids: list[int] = METRICS_PIDS,
+                 names: list[str] = METRICS_PROCESS_NAMES, ttl: float = METRICS_CACHE_TTL,
+                 max_targets: int = METRICS_MAX_TARGETS):
+        self.read = read
+        self.pids = pids
+        self.names = set(names)
+        self.ttl = ttl
+        self.max_targets = max_targets
+        self._cached: tuple[float, list[dict]] | None = None
+        self._lock: asyncio.Lock | None = None
+        self.collections = 0
+
+    def targets(self, watched=()) -> list[int]:
+        pids = dict.fromkeys(self.pids)
+        pids.update(dict.fromkeys(watched))
+        if self.names:
+            process_index.refresh()
+            pids.update(dict.fromkeys(process_index.pids_named(self.names)))
+        return list(pids)[:self.max_targets]
+
+    async def collect(self, watched=()) -> list[dict]:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock: # Scrapers arriving mid-collection wait and share it
+            cached = self._cached
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+            pids = await run_usage(self.targets, list(watched))
+            samples = await run_usage(self.read, pids) if pids else []
+            self.collections += 1
+            self._cached = (time.monotonic() + self.ttl, samples)
+            return samples
+
+
+metrics_collector = MetricsCollector()
@@ -0,0 +1,242 @@
+import heapq
+import json
+import os
+import threading
+import time
+
+import psutil
+
+PROCESS_REFRESH_INTERVAL = float(os.getenv("PROCESS_REFRESH_INTERVAL", "1.0"))
+PROCESS_HISTORY_GENERATIONS = int(os.getenv("PROCESS_HISTORY_GENERATIONS", "256"))
+
+# Extra per-process fields /processes can project, mapped to psutil attrs
+PROCESS_FIELDS = {
+    "ppid": "ppid",
+    "rss": "memory_info",
+    "cpu_times": "cpu_times",
+    "num_threads": "num_threads",
+    "username": "username",
+}
+SORT_FIELDS = ("pid", "name") + tuple(PROCESS_FIELDS)
+
+
+def _read_attrs(pid: int, fields: set[str]) -> dict | None:
+    """Reads the requested extra fields of one process, or None if it is gone."""
+    try:
+        p = psutil.Process(pid)
+        info = p.as_dict(attrs=[PROCESS_FIELDS[f] for f in fields])
+    except (psutil.NoSuchProcess, psutil.ZombieProcess):
+        return None
+    out = {}
+    for f in fields:
+        value = info.get(PROCESS_FIELDS[f])
+        if f == "rss":
+            value = value.rss if value is not None else None
+        elif f == "cpu_times":
+            value = {"user": value.user, "system": value.system} if value is not None else None
+        out[f] = value
+    return out
+
+
+def _sort_value(field: str, item: dict):
+    value = item.get(field)
+    if field == "cpu_times":
+        return value["user"] + value["system"] if value else -1.0
+    if value is None:
+        return "" if field in ("name", "username") else -1
+    return value
+
+
+class ProcessIndex:
+    """
+    Incrementally refreshed process table keyed by (pid, create_time).
+
+    Every refresh that finds a difference bumps `generation`. Entries remember
+    the generation they were added/last changed in, and removed processes
+    leave a tombstone, so `delta(since)` can answer with only what changed.
+    Refreshes closer together than `min_refresh` seconds are shared.
+    """
+
+    def __init__(self, min_refresh: float = PROCESS_REFRESH_INTERVAL,
+                 history: int = PROCESS_HISTORY_GENERATIONS):
+        # Distinguishes generations of different server runs in ETags
+        self.instance = f"{os.getpid():x}{time.time_ns():x}"
+        self.min_refresh = min_refresh
+        self.history = history
+        self.generation = 0
+        # pid -> [create_time, name, added_generation, changed_generation]
+        self.entries: dict[int, list] = {}
+        # (pid, create_time) -> generation the process disappeared in
+        self.tombstones: dict[tuple[int, float], int] = {}
+        self._refreshed_at = float("-inf")
+        self._snapshot: tuple[int, bytes] | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def oldest_generation(self) -> int:
+        """Deltas can be answered for any `since` at or after this generation."""
+        return max(0, self.generation - self.history)
+
+    def refresh(self, force: bool = False) -> int:
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._refreshed_at < self.min_refresh:
+                return self.generation
+            self._refreshed_at = now
+
+            gen = self.generation + 1
+            dirty = False
+            seen = set()
+            for p in psutil.process_iter(["name", "create_time"]):
+                pid = p.pid
+                create_time = p.info["create_time"] or 0.0
+                name = p.info["name"]
+                seen.add(pid)
+                entry = self.entries.get(pid)
+                if entry is None:
+                    self.entries[pid] = [create_time, name, gen, gen]
+                    dirty = True
+                elif entry[0] != create_time:
+                    # PID reuse: the old process is gone, this is a new one
+                    self.tombstones[(pid, entry[0])] = gen
+                    self.entries[pid] = [create_time, name, gen, gen]
+                    dirty = True
+                elif entry[1] != name:
+                    entry[1] = name
+                    entry[3] = gen
+                    dirty = True
+
+            for pid in [pid for pid in self.entries if pid not in seen]:
+                entry = self.entries.pop(pid)
+                self.tombstones[(pid, entry[0])] = gen
+                dirty = True
+
+            if dirty:
+                self.generation = gen
+                horizon = self.oldest_generation
+                self.tombstones = {k: g for k, g in self.tombstones.items() if g > horizon}
+            return self.generation
+
+    def snapshot(self) -> list[dict]:
+        with self._lock:
+            return [{"pid": pid, "name": e[1]} for pid, e in self.entries.items()]
+
+    def pids_named(self, names: set[str]) -> list[int]:
+        with self._lock:
+            return [pid for pid, e in self.entries.items() if e[1] in names]
+
+    def snapshot_json(self) -> bytes:
+        """The full listing, serialized once per generation."""
+        cached = self._snapshot
+        if cached is not None and cached[0] == self.generation:
+            return cached[1]
+        with self._lock:
+            gen = self.generation
+            body = json.dumps(
+                [{"pid": pid, "name": e[1]} for pid, e in self.entries.items()]
+            ).encode()
+        self._snapshot = (gen, body)
+        return body
+
+    def delta(self, since: int) -> dict:
+        """
+        Changes after generation `since`. If `since` is older than the kept
+        history (or from the future, e.g. after a restart), the full table is
+        returned in `added` with `reset` set.
+        """
+        with self._lock:
+            if since < self.oldest_generation or since > self.generation:
+                return {
+                    "generation": self.generation,
+                    "since": since,
+                    "reset": True,
+                    "added": [
+                        {"pid": pid, "name": e[1], "create_time": e[0]}
+                        for pid, e in self.entries.items()
+                    ],
+                    "changed": [],
+                    "removed": [],
+                }
+            added, changed = [], []
+            for pid, e in self.entries.items():
+                if e[3] <= since:
+                    continue
+                item = {"pid": pid, "name": e[1], "create_time": e[0]}
+                (added if e[2] > since else changed).append(item)
+            removed = [
+                {"pid": pid, "create_time": create_time}
+                for (pid, create_time), g in self.tombstones.items()
+                if g > since
+            ]
+            return {
+                "generation": self.generation,
+                "since": since,
+                "reset": False,
+                "added": added,
+                "changed": changed,
+                "removed": removed,
+            }
+
+    def query(self, fields: list[str] | None = None, name: str | None = None,
+              user: str | None = None, sort: str | None = None,
+              limit: int | None = None, offset: int = 0) -> tuple[int, list[dict]]:
+        """
+        Filtered, sorted and paginated listing. Returns (total matches, page).
+
+        Name filtering runs on the index itself. psutil is only consulted for
+        the user filter and sort key over the matching processes, and for the
+        remaining projected fields over the returned page. With a limit, the
+        page is picked by heap selection instead of sorting every match.
+        """
+        fields = [f for f in (fields or []) if f in PROCESS_FIELDS]
+        descending = bool(sort) and sort.startswith("-")
+        sort_field = sort.lstrip("-+") if sort else None
+        if sort_field is not None and sort_field not in SORT_FIELDS:
+            raise ValueError(f"Cannot sort by '{sort_field}'.")
+
+        with self._lock:
+            items = [{"pid": pid, "name": e[1]} for pid, e in self.entries.items()]
+        if name:
+            needle = name.lower()
+            items = [i for i in items if needle in (i["name"] or "").lower()]
+
+        # Fields needed for every match (filter/sort) vs only for the page
+        early = set()
+        if user:
+            early.add("username")
+        if sort_field in PROCESS_FIELDS:
+            early.add(sort_field)
+        if early:
+            matched = []
+            for item in items:
+                attrs = _read_attrs(item["pid"], early)
+                if attrs is None:
+                    continue
+                item.update(attrs)
+                if user and user.lower() not in (item.get("username") or "").lower():
+                    continue
+                matched.append(item)
+            items = matched
+
+        total = len(items)
+        if sort_field is not None:
+            key = lambda i: _sort_value(sort_field, i)
+            if limit is not None:
+                select = heapq.nlargest if descending else heapq.nsmallest
+                items = select(offset + limit, items, key=key)
+            else:
+                items = sorted(items, key=key, reverse=descending)
+        end = offset + limit if limit is not None else None
+        page = items[offset:end]
+
+        late = set(fields) - early
+        if late:
+            for item in page:
+                item.update(_read_attrs(item["pid"], late) or dict.fromkeys(late))
+        for item in page:
+            for f in early - set(fields):
+                item.pop(f, None)
+        return total, page
+
+
+process_index = ProcessIndex()
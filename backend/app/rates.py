@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+
+from .engines import ENGINES, read_cgroup_usage, read_usage, read_usage_batch
+from .metadata import process_start_time
+from .timing import span
+
+RATE_TRACKER_MAX_ENTRIES = int(os.getenv("RATE_TRACKER_MAX_ENTRIES", "4096"))
+# Shortest window rates are computed over. CPU times move in clock ticks
+# (10 ms at CLK_TCK=100), so back-to-back reads would report rounding noise.
+RATE_MIN_INTERVAL = float(os.getenv("RATE_MIN_INTERVAL", "0.5"))
+
+# Cumulative counters of a usage sample -> name of the derived per-second rate
+RATE_FIELDS = {
+    "minor_page_faults": "minor_faults_per_sec",
+    "major_page_faults": "major_faults_per_sec",
+    "voluntary_ctx_switches": "voluntary_ctx_switches_per_sec",
+    "involuntary_ctx_switches": "involuntary_ctx_switches_per_sec",
+    "block_input_ops": "block_input_ops_per_sec",
+    "block_output_ops": "block_output_ops_per_sec",
+}
+
+
+class RateTracker:
+    """
+    Remembers a baseline sample per (pid, start time, engine) and derives
+    rates from the difference to the current one, using monotonic time.
+
+    The baseline only moves once `min_interval` has passed. Reads closer
+    together than that get the rates of the last full window (or None if
+    there has been none yet) instead of a rate over a few milliseconds.
+
+    Counters can go down when a descendant leaves the subtree (e.g. it is
+    reparented away before being reaped); such deltas are clamped to zero.
+    """
+
+    def __init__(self, max_entries: int = RATE_TRACKER_MAX_ENTRIES, min_interval: float = RATE_MIN_INTERVAL):
+        self.max_entries = max_entries
+        self.min_interval = min_interval
+        # key -> (monotonic time of the baseline, baseline sample, last rates)
+        self._previous: dict[tuple, tuple[float, dict, dict | None]] = {}
+        self._lock = threading.Lock()
+
+    def annotate(self, sample: dict, now: float | None = None, key: tuple | None = None) -> dict:
+        """
+        Returns `sample` with a "rates" entry (None for the first sample).
+        Samples are matched by `key`, which defaults to the process identity.
+        """
+        if not sample or "error" in sample:
+            return sample
+        now = time.monotonic() if now is None else now
+        if key is None:
+            start_time = process_start_time(sample["pid"])
+            if start_time is None:
+                return {**sample, "rates": None}
+            key = (sample["pid"], start_time, sample.get("engine"))
+        with self._lock:
+            previous = self._previous.pop(key, None)
+            if previous is None:
+                entry = (now, sample, None)
+            elif now - previous[0] < self.min_interval:
+                entry = previous # Too soon: keep the baseline and the last rates
+            else:
+                entry = (now, sample, compute_rates(previous[1], sample, now - previous[0]))
+            self._previous[key] = entry
+            if len(self._previous) > self.max_entries:
+                # Oldest-updated first, since updated keys are re-inserted
+                del self._previous[next(iter(self._previous))]
+        return {**sample, "rates": entry[2]}
+
+
+def compute_rates(previous: dict, current: dict, interval: float) -> dict:
+    def delta(field):
+        return max(0.0, (current.get(field) or 0) - (previous.get(field) or 0))
+
+    user = delta("user_time")
+    system = delta("sys_time")
+    rates = {
+        "interval": interval,
+        "cpu_percent": (user + system) / interval * 100.0,
+        "user_percent": user / interval * 100.0,
+        "sys_percent": system / interval * 100.0,
+    }
+    for field, name in RATE_FIELDS.items():
+        rates[name] = delta(field) / interval
+    return rates
+
+
+rate_tracker = RateTracker()
+
+
+def sample_usage(pid: int, engine: str | None = None) -> dict:
+    """read_usage plus rates over the interval since the previous sample."""
+    usage = read_usage(pid, engine)
+    with span("usage.rates"):
+        return rate_tracker.annotate(usage)
+
+
+def sample_cgroup_usage(path: str) -> dict:
+    """read_cgroup_usage plus rates; a recreated cgroup starts over."""
+    usage = read_cgroup_usage(path)
+    if "error" in usage:
+        return usage
+    cgroup_id = ENGINES["cgroup"].cgroup_id(path)
+    if cgroup_id is None:
+        return {**usage, "rates": None}
+    with span("usage.rates"):
+        return rate_tracker.annotate(usage, key=("cgroup", usage["cgroup"], cgroup_id))
+
+
+def sample_usage_batch(pids: list[int], engine: str | None = None) -> list[dict]:
+    now = time.monotonic()
+    return [rate_tracker.annotate(r, now) for r in read_usage_batch(pids, engine)]
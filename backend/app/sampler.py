@@ -0,0 +1,205 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from array import array
+
+from .coalesce import usage_cache
+from .executor import run_usage
+from .metadata import process_start_time
+from .store import USAGE_STORE_DIR, UsageStore
+
+# Numeric fields of a usage sample that are kept in the history buffers.
+USAGE_FIELDS = (
+    "user_time",
+    "sys_time",
+    "max_rss_kb",
+    "minor_page_faults",
+    "major_page_faults",
+    "block_input_ops",
+    "block_output_ops",
+    "voluntary_ctx_switches",
+    "involuntary_ctx_switches",
+)
+
+HISTORY_CAPACITY = int(os.getenv("HISTORY_CAPACITY", "3600"))
+MIN_WATCH_INTERVAL = float(os.getenv("MIN_WATCH_INTERVAL", "0.1"))
+
+
+async def next_tick(tick: float, interval: float) -> float:
+    """
+    Sleeps until `tick + interval` on the event loop clock and returns that
+    time. Scheduling against fixed ticks keeps slow samples from adding
+    drift; if a tick was missed entirely, the schedule restarts from now.
+    """
+    loop = asyncio.get_running_loop()
+    tick += interval
+    delay = tick - loop.time()
+    if delay < 0:
+        tick = loop.time()
+        delay = 0
+    await asyncio.sleep(delay)
+    return tick
+
+
+class RingBuffer:
+    """
+    Fixed-capacity sample history stored column-wise in flat float arrays.
+    Every appended sample gets a monotonically increasing sequence number,
+    which clients pass back as `since` to fetch only what they missed.
+    """
+
+    def __init__(self, capacity: int = HISTORY_CAPACITY, fields: tuple[str, ...] = USAGE_FIELDS):
+        self.capacity = capacity
+        self.fields = fields
+        self.ts = array("d", [0.0]) * capacity
+        self.columns = [array("d", [0.0]) * capacity for _ in fields]
+        self.next_seq = 0
+
+    def __len__(self) -> int:
+        return min(self.next_seq, self.capacity)
+
+    @property
+    def first_seq(self) -> int:
+        return max(0, self.next_seq - self.capacity)
+
+    def append(self, ts: float, sample: dict) -> int:
+        seq = self.next_seq
+        i = seq % self.capacity
+        self.ts[i] = ts
+        for column, field in zip(self.columns, self.fields):
+            column[i] = sample.get(field) or 0.0
+        self.next_seq = seq + 1
+        return seq
+
+    def since(self, seq: int = 0) -> tuple[int, list[dict]]:
+        """
+        Returns (first returned seq, samples) for every sample with a sequence
+        number >= seq that is still in the buffer.
+        """
+        start, ts, columns = self.columns_since(seq)
+        rows = []
+        for k, t in enumerate(ts):
+            row = {"seq": start + k, "ts": t}
+            for field, column in columns.items():
+                row[field] = column[k]
+            rows.append(row)
+        return start, rows
+
+    def columns_since(self, seq: int = 0, fields: tuple[str, ...] | None = None) -> tuple[int, list[float], dict[str, list[float]]]:
+        """Like since(), but as (start, timestamps, {field: values}) slices."""
+        start = max(seq, self.first_seq)
+        n = max(0, self.next_seq - start)
+        i = start % self.capacity
+
+        def take(arr: array) -> list[float]:
+            if i + n <= self.capacity:
+                return arr[i:i + n].tolist()
+            return arr[i:].tolist() + arr[:i + n - self.capacity].tolist()
+
+        columns = {f: take(c) for f, c in zip(self.fields, self.columns) if fields is None or f in fields}
+        return start, take(self.ts), columns
+
+
+class Watch:
+    def __init__(self, pid: int, interval: float, capacity: int = HISTORY_CAPACITY):
+        self.pid = pid
+        self.interval = interval
+        self.history = RingBuffer(capacity)
+        self.process_name = "N/A"
+        self.last_error: str | None = None
+        self.task: asyncio.Task | None = None
+
+    def info(self) -> dict:
+        return {
+            "pid": self.pid,
+            "interval": self.interval,
+            "process_name": self.process_name,
+            "samples": len(self.history),
+            "next": self.history.next_seq,
+            "last_error": self.last_error,
+        }
+
+
+class Sampler:
+    """
+    Background sampler: one asyncio task per watched PID collects a usage
+    sample every `interval` seconds into that watch's ring buffer, and into
+    the on-disk store when one is configured.
+    """
+
+    def __init__(self, sample_fn=usage_cache.get, store: UsageStore | None = None):
+        self.sample_fn = sample_fn
+        self.store = store
+        self.watches: dict[int, Watch] = {}
+        # Orders persists on the usage pool against watch removal, so a late
+        # append can't reopen a segment after its watch closed it
+        self._persist_lock = threading.Lock()
+
+    def add_watch(self, pid: int, interval: float) -> Watch:
+        interval = max(float(interval), MIN_WATCH_INTERVAL)
+        watch = self.watches.get(pid)
+        if watch is not None:
+            # The running loop picks the new interval up on its next tick
+            watch.interval = interval
+            return watch
+        watch = Watch(pid, interval)
+        watch.task = asyncio.create_task(self._run(watch))
+        self.watches[pid] = watch
+        return watch
+
+    def remove_watch(self, pid: int) -> bool:
+        with self._persist_lock:
+            watch = self.watches.pop(pid, None)
+            if watch is None:
+                return False
+            if self.store is not None:
+                self.store.close(pid)
+        if watch.task and not watch.task.done():
+            watch.task.cancel()
+        return True
+
+    async def stop(self):
+        for pid in list(self.watches):
+            self.remove_watch(pid)
+        if self.store is not None:
+            self.store.close()
+
+    def _persist(self, watch: Watch, ts: float, sample: dict):
+        """Appends to the store; runs on the usage pool since it does file I/O."""
+        start_time = process_start_time(watch.pid)
+        if start_time is None:
+            return # Exited since the sample was taken
+        with self._persist_lock:
+            if self.watches.get(watch.pid) is not watch:
+                return # Removed while this sample was on its way
+            try:
+                self.store.append(watch.pid, start_time, ts, sample)
+            except OSError as e:
+                print(f"Could not persist sample of PID {watch.pid}: {e}", file=sys.stderr)
+
+    async def _run(self, watch: Watch):
+        tick = asyncio.get_running_loop().time()
+        while True:
+            try:
+                sample = await self.sample_fn(watch.pid)
+            except Exception as e:
+                sample = {"error": str(e)}
+            if sample and "error" not in sample:
+                watch.process_name = sample.get("process_name", watch.process_name)
+                watch.last_error = None
+                ts = time.time()
+                watch.history.append(ts, sample)
+                if self.store is not None:
+                    await run_usage(self._persist, watch, ts, sample)
+            else:
+                error = (sample or {}).get("error", "no sample")
+                # A dead PID fails every tick; only report when the error changes
+                if error != watch.last_error:
+                    print(f"Watch on PID {watch.pid} failed: {error}", file=sys.stderr)
+                watch.last_error = error
+            tick = await next_tick(tick, watch.interval)
+
+
+sampler = Sampler(store=UsageStore(USAGE_STORE_DIR, USAGE_FIELDS) if USAGE_STORE_DIR else None)
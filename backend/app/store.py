@@ -0,0 +1,279 @@
+import mmap
+import os
+import struct
+import sys
+import threading
+
+USAGE_STORE_DIR = os.getenv("USAGE_STORE_DIR", "")
+USAGE_STORE_SEGMENT_RECORDS = int(os.getenv("USAGE_STORE_SEGMENT_RECORDS", "86400"))
+USAGE_STORE_RETENTION_HOURS = float(os.getenv("USAGE_STORE_RETENTION_HOURS", "24"))
+USAGE_STORE_MAX_SEGMENTS = int(os.getenv("USAGE_STORE_MAX_SEGMENTS", "16"))
+USAGE_RANGE_MAX_ROWS = int(os.getenv("USAGE_RANGE_MAX_ROWS", "100000"))
+
+# Segment header: magic, format version, fields per record, padding to 16
+HEADER = struct.Struct("<4sHH8x")
+MAGIC = b"USG1"
+VERSION = 1
+SUFFIX = ".seg"
+
+
+def _segment_name(ts: float) -> str:
+    return f"{int(ts * 1000):015d}{SUFFIX}"
+
+
+def _segment_start(name: str) -> float:
+    return int(name[:-len(SUFFIX)]) / 1000.0
+
+
+def _unlink(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class _Segment:
+    """The open segment a process's samples are currently appended to."""
+
+    def __init__(self, path: str, fd: int, count: int, start_time: int):
+        self.path = path
+        self.fd = fd
+        self.count = count
+        self.start_time = start_time
+
+
+class UsageStore:
+    """
+    Append-only on-disk usage history, one directory per process, named
+    `<pid>-<start time>` so a reused PID never continues another process's
+    history. Reads go to the newest process with that PID unless a start
+    time is given.
+
+    Each directory holds segments named after their first timestamp. A
+    segment is a 16-byte header followed by fixed-size records of float64:
+    the timestamp, then one value per field (the fields `sample_usage`
+    reports). Writes are plain appends; reads mmap the segment and binary
+    search the timestamp column in place. A segment is sealed after
+    `segment_records` records, and old segments are deleted once they fall
+    out of the retention window or exceed `max_segments` per process.
+    """
+
+    def __init__(self, directory: str, fields: tuple[str, ...],
+                 segment_records: int = USAGE_STORE_SEGMENT_RECORDS,
+                 retention_hours: float = USAGE_STORE_RETENTION_HOURS,
+                 max_segments: int = USAGE_STORE_MAX_SEGMENTS):
+        self.directory = directory
+        self.fields = fields
+        self.record = struct.Struct("<" + "d" * (len(fields) + 1))
+        self.width = len(fields) + 1
+        self.segment_records = max(1, segment_records)
+        self.retention = retention_hours * 3600.0
+        self.max_segments = max(1, max_segments)
+        self._open: dict[int, _Segment] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    # --- Writing ---
+
+    def append(self, pid: int, start_time: int, ts: float, sample: dict):
+        """Appends a sample of the process (pid, start_time), in clock ticks since boot."""
+        row = self.record.pack(ts, *(float(sample.get(f) or 0.0) for f in self.fields))
+        with self._lock:
+            seg = self._open.get(pid)
+            if seg is not None and seg.start_time != start_time:
+                os.close(seg.fd) # The PID now belongs to another process
+                seg = None
+            seg = seg or self._resume(pid, start_time)
+            if seg is None or seg.count >= self.segment_records:
+                if seg is not None:
+                    os.close(seg.fd)
+                seg = self._create(pid, start_time, ts)
+                self._expire(pid, start_time, ts)
+            os.write(seg.fd, row)
+            seg.count += 1
+            self._open[pid] = seg
+
+    def close(self, pid: int | None = None):
+        with self._lock:
+            for p in list(self._open) if pid is None else [pid]:
+                seg = self._open.pop(p, None)
+                if seg is not None:
+                    os.close(seg.fd)
+
+    def _dir(self, pid: int, start_time: int) -> str:
+        return os.path.join(self.directory, f"{int(pid)}-{int(start_time)}")
+
+    def _segments(self, pid: int, start_time: int) -> list[str]:
+        try:
+            names = os.listdir(self._dir(pid, start_time))
+        except FileNotFoundError:
+            return []
+        return sorted(n for n in names if n.endswith(SUFFIX))
+
+    def _resume(self, pid: int, start_time: int) -> _Segment | None:
+        """Reopens the newest segment after a restart, dropping a torn tail."""
+        names = self._segments(pid, start_time)
+        if not names:
+            return None
+        path = os.path.join(self._dir(pid, start_time), names[-1])
+        if self._check_header(path) is None:
+            return None
+        size = os.path.getsize(path)
+        count = (size - HEADER.size) // self.record.size
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+        os.ftruncate(fd, HEADER.size + count * self.record.size)
+        return _Segment(path, fd, count, start_time)
+
+    def _create(self, pid: int, start_time: int, ts: float) -> _Segment:
+        directory = self._dir(pid, start_time)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, _segment_name(ts))
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.write(fd, HEADER.pack(MAGIC, VERSION, len(self.fields)))
+        return _Segment(path, fd, 0, start_time)
+
+    def _expire(self, pid: int, start_time: int, now: float):
+        names = self._segments(pid, start_time)
+        directory = self._dir(pid, start_time)
+        # A segment's data ends where the next one starts
+        for i, name in enumerate(names[:-1]):
+            too_many = len(names) - i > self.max_segments
+            if too_many or _segment_start(names[i + 1]) < now - self.retention:
+                _unlink(os.path.join(directory, name))
+        # Earlier processes with this PID have stopped writing; drop them
+        # whole once their last sample is out of the retention window
+        for other in self.start_times(pid):
+            if other == start_time:
+                continue
+            directory = self._dir(pid, other)
+            names = self._segments(pid, other)
+            try:
+                last_write = os.path.getmtime(os.path.join(directory, names[-1])) if names else 0.0
+            except FileNotFoundError:
+                last_write = 0.0
+            if last_write < now - self.retention:
+                for name in names:
+                    _unlink(os.path.join(directory, name))
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    pass
+
+    def _check_header(self, path: str) -> bool | None:
+        with open(path, "rb") as f:
+            head = f.read(HEADER.size)
+        if len(head) < HEADER.size:
+            return None
+        magic, version, nfields = HEADER.unpack(head)
+        if magic != MAGIC or version != VERSION or nfields != len(self.fields):
+            print(f"Skipping usage segment with unexpected layout: {path}", file=sys.stderr)
+            return None
+        return True
+
+    # --- Reading ---
+
+    def _processes(self) -> list[tuple[int, int]]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        out = []
+        for name in names:
+            pid, sep, start_time = name.partition("-")
+            if sep and pid.isdigit() and start_time.isdigit():
+                out.append((int(pid), int(start_time)))
+        return out
+
+    def pids(self) -> list[int]:
+        return sorted({pid for pid, _ in self._processes()})
+
+    def start_times(self, pid: int) -> list[int]:
+        """Start times of the processes stored under `pid`, oldest first."""
+        return sorted(s for p, s in self._processes() if p == pid)
+
+    def latest(self, pid: int) -> int | None:
+        """Start time of the newest process stored under `pid`."""
+        start_times = self.start_times(pid)
+        return start_times[-1] if start_times else None
+
+    def range(self, pid: int, start: float | None = None, end: float | None = None,
+              limit: int = USAGE_RANGE_MAX_ROWS, start_time: int | None = None) -> tuple[list[dict], bool]:
+        """
+        Samples of `pid` with start <= ts <= end, oldest first. Returns
+        (rows, truncated) where truncated means `limit` cut the result short.
+        """
+        ts, columns, truncated = self.range_columns(pid, start, end, limit, start_time=start_time)
+        rows = []
+        for k, t in enumerate(ts):
+            row = {"ts": t}
+            for field, column in columns.items():
+                row[field] = column[k]
+            rows.append(row)
+        return rows, truncated
+
+    def range_columns(self, pid: int, start: float | None = None, end: float | None = None,
+                      limit: int = USAGE_RANGE_MAX_ROWS, fields: tuple[str, ...] | None = None,
+                      start_time: int | None = None) -> tuple[list[float], dict[str, list[float]], bool]:
+        """Like range(), but as (timestamps, {field: values}, truncated)."""
+        start = float("-inf") if start is None else start
+        end = float("inf") if end is None else end
+        wanted = [(j, f) for j, f in enumerate(self.fields, 1) if fields is None or f in fields]
+        ts: list[float] = []
+        columns: dict[str, list[float]] = {f: [] for _, f in wanted}
+        if start_time is None:
+            start_time = self.latest(pid)
+            if start_time is None:
+                return ts, columns, False
+        names = self._segments(pid, start_time)
+        for i, name in enumerate(names):
+            if _segment_start(name) > end:
+                break
+            if i + 1 < len(names) and _segment_start(names[i + 1]) < start:
+                continue
+            path = os.path.join(self._dir(pid, start_time), name)
+            if not self._read_segment(path, start, end, limit - len(ts), wanted, ts, columns):
+                return ts, columns, True
+        return ts, columns, False
+
+    def _read_segment(self, path: str, start: float, end: float, budget: int,
+                      wanted: list[tuple[int, str]], ts: list[float], columns: dict[str, list[float]]) -> bool:
+        """Extends `ts`/`columns` with one segment's matches; False if `budget` ran out."""
+        try:
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                count = (size - HEADER.size) // self.record.size
+                if count <= 0 or not self._check_header(path):
+                    return True
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    view = memoryview(mm)[HEADER.size:HEADER.size + count * self.record.size].cast("d")
+                    try:
+                        return self._scan(view, count, start, end, budget, wanted, ts, columns)
+                    finally:
+                        view.release()
+        except FileNotFoundError: # Expired while we were reading
+            return True
+
+    def _scan(self, view: memoryview, count: int, start: float, end: float, budget: int,
+              wanted: list[tuple[int, str]], ts: list[float], columns: dict[str, list[float]]) -> bool:
+        w = self.width
+        lo = self._search(view, count, start, False)
+        hi = self._search(view, count, end, True)
+        full = hi - lo <= budget
+        hi = min(hi, lo + max(budget, 0))
+        # Strided slices pull whole columns straight out of the mapping
+        ts.extend(view[lo * w:hi * w:w].tolist())
+        for j, field in wanted:
+            columns[field].extend(view[lo * w + j:hi * w:w].tolist())
+        return full
+
+    def _search(self, view: memoryview, count: int, t: float, right: bool) -> int:
+        """First record with ts >= t (or > t when `right`)."""
+        w = self.width
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if view[mid * w] < t or (right and view[mid * w] == t):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
@@ -1,9 +1,9 @@
 import ctypes
 import ctypes.util
-import errno
-import os
 import sys
-import psutil
+import threading
+
+from .metadata import metadata_cache
 
 # --- Part 1: Define the C structures from your syscall ---
 class CTimeval(ctypes.Structure):
@@ -46,50 +46,21 @@ except Exception as e:
     print(f"Error loading libc or syscall: {e}", file=sys.stderr)
     syscall = None
 
-# --- Part 3: The "tool" function our app will call ---
-
-def call_custom_syscall(pid: int) -> dict | None:
-    """
-    This function calls your REAL custom 'get_proc_subtree_rusage' syscall
-    and returns a rich dictionary with all the resource fields.
-    """
-    
-    if not syscall:
-        print("Fatal: syscall function is not loaded. Cannot get usage.", file=sys.stderr)
-        return {"error": "Syscall function not loaded."}
-
-    process_name = "N/A"
-    try:
-        # We use psutil just to get the friendly name
-        p = psutil.Process(pid)
-        process_name = p.name()
-    except psutil.NoSuchProcess:
-        # Process is dead, but we can still get stats
-        pass 
-    except Exception:
-        pass # Other errors (e.g., permissions)
+# --- Part 3: Helpers shared by the usage engines ---
 
-    # 1. Create an empty C-style rusage struct
-    usage = CRusage()
-    
-    # 2. We must set errno to 0 before the call
-    ctypes.set_errno(0)
-    
-    # 3. Call the syscall
-    ret = syscall(NR_GET_PROC_SUBTREE_RUSAGE, pid, 0, ctypes.byref(usage))
+def lookup_process_name(pid: int) -> str:
+    # Cached by (pid, start time); psutil only runs for processes not seen yet
+    return metadata_cache.name(pid)
 
-    # 4. Check for errors
-    if ret < 0:
-        e = ctypes.get_errno()
-        error_message = os.strerror(e)
-        print(f"syscall(...) failed for PID {pid}: {error_message}", file=sys.stderr)
-        return {"error": error_message, "pid": pid}
 
-    # 5. Success! Convert C data to Python types.
+def rusage_to_dict(pid: int, process_name: str, usage: CRusage) -> dict:
+    """
+    Converts a filled CRusage struct into the dictionary returned by the API.
+    The kernel only fills the fields below; ixrss/idrss/isrss/nswap/msgsnd/
+    msgrcv/nsignals are always zero on Linux, so they are left out.
+    """
     user_time = usage.ru_utime.tv_sec + (usage.ru_utime.tv_usec / 1_000_000.0)
     sys_time = usage.ru_stime.tv_sec + (usage.ru_stime.tv_usec / 1_000_000.0)
-    
-    # 6. Return the full dictionary
     return {
         "pid": pid,
         "process_name": process_name,
@@ -97,12 +68,34 @@ def call_custom_syscall(pid: int) -> dict | None:
         "sys_time": sys_time,
         "max_rss_kb": usage.ru_maxrss,
         "minor_page_faults": usage.ru_minflt,
-        "major_page_faults": usage.ru_majflt
+        "major_page_faults": usage.ru_majflt,
+        "block_input_ops": usage.ru_inblock,
+        "block_output_ops": usage.ru_oublock,
+        "voluntary_ctx_switches": usage.ru_nvcsw,
+        "involuntary_ctx_switches": usage.ru_nivcsw
     }
 
 
-def list_processes() -> list[dict]:
-    procs = []
-    for p in psutil.process_iter(['pid', 'name']):
-        procs.append(p.info)
-    return procs
+# Each worker thread keeps its own preallocated array of structs, so batch
+# calls never allocate per PID and never share buffers across threads.
+_batch_local = threading.local()
+
+
+def batch_buffers(n: int):
+    buffers = getattr(_batch_local, "buffers", None)
+    if buffers is None or len(buffers) < n:
+        buffers = (CRusage * max(n, 64))()
+        _batch_local.buffers = buffers
+    return buffers
+
+
+def read_subtree_rusage(pid: int, usage: CRusage) -> int:
+    """
+    Fills `usage` through the custom syscall. Returns 0 on success or the
+    errno of the failed call.
+    """
+    ctypes.set_errno(0)
+    if syscall(NR_GET_PROC_SUBTREE_RUSAGE, pid, 0, ctypes.byref(usage)) < 0:
+        return ctypes.get_errno()
+    return 0
+
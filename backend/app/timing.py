@@ -0,0 +1,125 @@
+# Kept in sync with backend-agentic/app/timing.py on purpose: the two services are packaged
+# and deployed separately and share no code, so fix both copies together.
+import contextvars
+import os
+import threading
+import time
+
+TIMING_ENABLED = os.getenv("TIMING_ENABLED", "1") != "0"
+
+# Bucket i counts durations under 2**i microseconds; the last one is open
+BUCKETS = 28
+
+# Per-request breakdown: stage -> milliseconds, when the caller asked for one
+_trace: contextvars.ContextVar[dict | None] = contextvars.ContextVar("timing_trace", default=None)
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns: int):
+        self.counts[min((ns // 1000).bit_length(), BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile, in ms."""
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return min(2 ** i / 1000.0, self.max / 1e6)
+        return self.max / 1e6
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": self.total / self.count / 1e6 if self.count else 0.0,
+            "p50_ms": self.quantile(0.50),
+            "p90_ms": self.quantile(0.90),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": self.max / 1e6,
+            # Non-cumulative counts keyed by bucket upper bound in µs
+            "buckets": {2 ** i: n for i, n in enumerate(self.counts) if n},
+        }
+
+
+class Timings:
+    """
+    In-process latency histograms per stage name. Recording is a lock, an
+    integer bit_length and a few adds, so spans can wrap every hot-path call.
+    """
+
+    def __init__(self, enabled: bool = TIMING_ENABLED):
+        self.enabled = enabled
+        self.histograms: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, ns: int):
+        trace = _trace.get()
+        if trace is not None:
+            trace[name] = trace.get(name, 0.0) + ns / 1e6
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.record(ns)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: h.snapshot() for name, h in sorted(self.histograms.items())}
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+
+
+timings = Timings()
+
+
+class span:
+    """`with span("stage"):` records the block's duration under "stage"."""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        timings.record(self.name, time.perf_counter_ns() - self.start)
+        return False
+
+
+class trace:
+    """
+    Collects the spans recorded in this context (including executor work
+    started from it) into a dict of stage -> ms, plus "total".
+    """
+
+    __slots__ = ("stages", "start", "token")
+
+    def __enter__(self) -> dict:
+        self.stages = {}
+        self.start = time.perf_counter_ns()
+        self.token = _trace.set(self.stages)
+        return self.stages
+
+    def __exit__(self, *exc):
+        _trace.reset(self.token)
+        self.stages["total"] = (time.perf_counter_ns() - self.start) / 1e6
+        return False
@@ -0,0 +1,120 @@
+import errno
+import os
+import time
+
+from .engines import CLK_TCK, ENGINES, ProcfsEngine
+from .syscall_wrapper import lookup_process_name
+
+MAX_TREE_DEPTH = int(os.getenv("MAX_TREE_DEPTH", "64"))
+
+# Indices into ProcfsEngine.read_process() rows
+_UTIME, _STIME, _MAXRSS = 0, 1, 2
+_FIELDS = (
+    "user_time",
+    "sys_time",
+    "max_rss_kb",
+    "minor_page_faults",
+    "major_page_faults",
+    "block_input_ops",
+    "block_output_ops",
+    "voluntary_ctx_switches",
+    "involuntary_ctx_switches",
+)
+
+
+def _add(total: list[int], row: list[int]):
+    for i, value in enumerate(row):
+        if i == _MAXRSS:
+            total[i] = max(total[i], value)
+        else:
+            total[i] += value
+
+
+def _as_dict(row: list[int]) -> dict:
+    out = dict(zip(_FIELDS, row))
+    out["user_time"] = row[_UTIME] / CLK_TCK
+    out["sys_time"] = row[_STIME] / CLK_TCK
+    return out
+
+
+def _cpu(row: list[int]) -> int:
+    return row[_UTIME] + row[_STIME]
+
+
+def usage_tree(pid: int, max_depth: int | None = None, min_share: float = 0.0,
+               engine: ProcfsEngine | None = None) -> dict:
+    """
+    The process tree under `pid` with self and subtree usage for every node,
+    from one /proc walk that reads each process once and sums bottom-up.
+
+    Nodes deeper than `max_depth` are left out but still counted in their
+    ancestors' subtree totals. Children whose subtree CPU time is below
+    `min_share` of the root's are folded into their parent's "pruned" entry,
+    so every level still adds up.
+    """
+    engine = engine or ENGINES["procfs"]
+    if not engine.available():
+        return {"error": "Usage engine 'procfs' is not available.", "pid": pid}
+
+    walk = engine.walk(pid)
+    own: dict[int, list[int]] = {}
+    for p, _, _ in walk:
+        row = engine.read_process(p)
+        if row is not None:
+            own[p] = row
+    if pid not in own:
+        return {"error": os.strerror(errno.ESRCH), "pid": pid}
+
+    # Processes whose parent exited mid-walk are dropped with it
+    children: dict[int, list[int]] = {p: [] for p in own}
+    depth_of: dict[int, int] = {}
+    for p, parent, depth in walk:
+        if p in own and (parent is None or parent in depth_of):
+            depth_of[p] = depth
+            if parent is not None:
+                children[parent].append(p)
+
+    subtree: dict[int, list[int]] = {}
+    counts: dict[int, int] = {}
+    for p, _, _ in reversed(walk):
+        if p not in depth_of:
+            continue
+        total = list(own[p])
+        count = 1
+        for c in children[p]:
+            _add(total, subtree[c])
+            count += counts[c]
+        subtree[p] = total
+        counts[p] = count
+
+    threshold = _cpu(subtree[pid]) * min_share
+    max_depth = MAX_TREE_DEPTH if max_depth is None else min(max_depth, MAX_TREE_DEPTH)
+    nodes: dict[int, dict] = {}
+    for p, _, _ in reversed(walk):
+        depth = depth_of.get(p)
+        if depth is None or depth > max_depth:
+            continue
+        node = {
+            "pid": p,
+            "process_name": lookup_process_name(p),
+            "processes": counts[p],
+            "self": _as_dict(own[p]),
+            "subtree": _as_dict(subtree[p]),
+            "children": [],
+        }
+        if depth == max_depth:
+            node["truncated"] = len(children[p])
+        else:
+            shown = [c for c in children[p] if _cpu(subtree[c]) >= threshold]
+            shown.sort(key=lambda c: _cpu(subtree[c]), reverse=True)
+            node["children"] = [nodes.pop(c) for c in shown]
+            pruned = [c for c in children[p] if _cpu(subtree[c]) < threshold]
+            if pruned:
+                total = [0] * len(_FIELDS)
+                for c in pruned:
+                    _add(total, subtree[c])
+                    nodes.pop(c, None)
+                node["pruned"] = {"count": len(pruned), "processes": sum(counts[c] for c in pruned),
+                                  "subtree": _as_dict(total)}
+        nodes[p] = node
+    return {"pid": pid, "engine": engine.name, "ts": time.time(), "processes": counts[pid], "root": nodes[pid]}
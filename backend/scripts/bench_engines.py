@@ -0,0 +1,60 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.engines import ENGINES
+from app.syscall_wrapper import CRusage
+
+SIZES = (1, 10, 100, 500, 1000)
+REPEATS = 50
+
+
+def spawn_children(n):
+    """Start n sleeping children so this process roots a subtree of n + 1."""
+    return [subprocess.Popen(["sleep", "600"]) for _ in range(n)]
+
+
+def time_engine(engine, pid, repeats):
+    usage = CRusage()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        e = engine.read(pid, usage)
+        samples.append((time.perf_counter() - start) * 1000.0)
+        if e:
+            return None, os.strerror(e)
+    samples.sort()
+    return samples, None
+
+
+def main():
+    sizes = [int(s) for s in sys.argv[1:]] or list(SIZES)
+    engines = [e for e in ENGINES.values() if e.available()]
+    print(f"Engines: {', '.join(e.name for e in engines)} (skipped: "
+          f"{', '.join(e.name for e in ENGINES.values() if not e.available()) or 'none'})")
+    print(f"{'subtree':>8} {'engine':>8} {'p50 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+
+    children = []
+    try:
+        for size in sizes:
+            children.extend(spawn_children(size - 1 - len(children)))
+            for engine in engines:
+                samples, error = time_engine(engine, os.getpid(), REPEATS)
+                if error:
+                    print(f"{size:>8} {engine.name:>8} failed: {error}")
+                    continue
+                p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+                print(f"{size:>8} {engine.name:>8} {statistics.median(samples):>10.3f} "
+                      f"{p99:>10.3f} {samples[-1]:>10.3f}")
+    finally:
+        for child in children:
+            child.kill()
+        for child in children:
+            child.wait()
+
+
+if __name__ == "__main__":
+    main()
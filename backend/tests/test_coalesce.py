@@ -0,0 +1,51 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.coalesce import UsageCoalescer
+
+
+class CoalescerTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.calls = 0
+
+    async def fetch(self, pid, engine):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return {"pid": pid, "call": self.calls}
+
+    async def test_concurrent_requests_share_one_read(self):
+        cache = UsageCoalescer(fetch=self.fetch, ttl=0)
+        results = await asyncio.gather(*(cache.get(1) for _ in range(10)))
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(r == results[0] for r in results))
+        self.assertEqual((cache.misses, cache.coalesced), (1, 9))
+
+    async def test_result_reused_within_ttl(self):
+        cache = UsageCoalescer(fetch=self.fetch, ttl=60)
+        await cache.get(1)
+        await cache.get(1)
+        await cache.get(2)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(cache.hits, 1)
+
+    async def test_expired_result_is_refetched(self):
+        cache = UsageCoalescer(fetch=self.fetch, ttl=0.001)
+        await cache.get(1)
+        await asyncio.sleep(0.005)
+        second = await cache.get(1)
+        self.assertEqual(second["call"], 2)
+
+    async def test_cancelled_waiter_does_not_cancel_read(self):
+        cache = UsageCoalescer(fetch=self.fetch, ttl=0)
+        first = asyncio.ensure_future(cache.get(1))
+        second = asyncio.ensure_future(cache.get(1))
+        await asyncio.sleep(0)
+        first.cancel()
+        self.assertEqual((await second)["call"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import sys
+import os
+import math
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.downsample import aggregate, downsample, lttb
+from app.sampler import RingBuffer
+
+
+class AggregateTests(unittest.TestCase):
+    def test_buckets_report_min_max_avg_last(self):
+        ts = [0.0, 0.5, 1.0, 1.5, 3.2]
+        out = aggregate(ts, {"a": [4.0, 2.0, 1.0, 3.0, 9.0]}, 1.0)
+        self.assertEqual([b["ts"] for b in out], [0.0, 1.0, 3.0])
+        self.assertEqual([b["count"] for b in out], [2, 2, 1])
+        self.assertEqual(out[0]["a"], {"min": 2.0, "max": 4.0, "avg": 3.0, "last": 2.0})
+        self.assertEqual(out[2]["a"]["last"], 9.0)
+
+    def test_empty_series(self):
+        self.assertEqual(aggregate([], {"a": []}, 5.0), [])
+
+
+class LttbTests(unittest.TestCase):
+    def test_caps_points_and_keeps_endpoints(self):
+        n = 10000
+        ts = [float(i) for i in range(n)]
+        values = [math.sin(i / 300.0) for i in range(n)]
+        idx = lttb(ts, values, 200)
+        self.assertEqual(len(idx), 200)
+        self.assertEqual((idx[0], idx[-1]), (0, n - 1))
+        self.assertEqual(idx, sorted(idx))
+
+    def test_keeps_spikes(self):
+        ts = [float(i) for i in range(1000)]
+        values = [0.0] * 1000
+        values[437] = 100.0
+        self.assertIn(437, lttb(ts, values, 20))
+
+    def test_long_input_is_capped_but_keeps_spikes(self):
+        n = 50000
+        ts = [float(i) for i in range(n)]
+        values = [math.sin(i / 900.0) for i in range(n)]
+        values[31337] = 50.0
+        idx = lttb(ts, values, 100, max_rows=1000)
+        self.assertEqual(len(idx), 100)
+        self.assertEqual((idx[0], idx[-1]), (0, n - 1))
+        self.assertEqual(idx, sorted(idx))
+        self.assertIn(31337, idx)
+
+    def test_short_series_is_untouched(self):
+        series = downsample([1.0, 2.0], {"a": [5.0, 6.0]}, 100)
+        self.assertEqual(series["a"], {"ts": [1.0, 2.0], "values": [5.0, 6.0]})
+
+
+class RingBufferColumnsTests(unittest.TestCase):
+    def test_columns_follow_wraparound(self):
+        rb = RingBuffer(capacity=3, fields=("a", "b"))
+        for i in range(5):
+            rb.append(float(i), {"a": i, "b": -i})
+        start, ts, cols = rb.columns_since(0, ("a",))
+        self.assertEqual(start, 2)
+        self.assertEqual(ts, [2.0, 3.0, 4.0])
+        self.assertEqual(cols, {"a": [2.0, 3.0, 4.0]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import errno
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.engines import ENGINES, CgroupEngine, FakeEngine, ProcfsEngine, get_engine, read_usage, read_usage_batch
+from app.syscall_wrapper import CRusage
+
+
+class ProcfsEngineTests(unittest.TestCase):
+    def setUp(self):
+        self.engine = ProcfsEngine()
+
+    def test_descendants_include_children(self):
+        child = subprocess.Popen(["sleep", "30"])
+        try:
+            tree = self.engine.descendants(os.getpid())
+            self.assertEqual(tree[0], os.getpid())
+            self.assertIn(child.pid, tree)
+        finally:
+            child.kill()
+            child.wait()
+
+    def test_read_fills_rusage(self):
+        usage = CRusage()
+        self.assertEqual(self.engine.read(os.getpid(), usage), 0)
+        self.assertGreater(usage.ru_maxrss, 0)
+        self.assertGreater(usage.ru_minflt, 0)
+        self.assertLess(usage.ru_utime.tv_usec, 1_000_000)
+
+    def test_missing_pid(self):
+        self.assertEqual(self.engine.read(2**22 + 1, CRusage()), errno.ESRCH)
+
+
+class BatchTests(unittest.TestCase):
+    def test_order_and_per_pid_errors(self):
+        missing = 2**22 + 1
+        pids = [os.getpid(), missing, os.getppid()]
+        results = read_usage_batch(pids, engine="procfs")
+        self.assertEqual([r["pid"] for r in results], pids)
+        self.assertEqual(results[1]["error"], os.strerror(errno.ESRCH))
+        self.assertNotIn("error", results[0])
+        self.assertNotIn("error", results[2])
+
+    @mock.patch.dict(ENGINES, {"fake": FakeEngine()})
+    def test_io_and_context_switch_fields(self):
+        for engine in ("procfs", "fake"):
+            (result,) = read_usage_batch([os.getpid()], engine=engine)
+            self.assertEqual(result["engine"], engine)
+            for field in ("block_input_ops", "block_output_ops", "voluntary_ctx_switches", "involuntary_ctx_switches"):
+                self.assertIsInstance(result[field], int)
+        self.assertGreater(read_usage_batch([os.getpid()], engine="procfs")[0]["voluntary_ctx_switches"], 0)
+
+    def test_fake_engine_is_opt_in(self):
+        env = {**os.environ, "USAGE_FAKE_ENGINE": ""}
+        code = "from app.engines import ENGINES; print('fake' in ENGINES)"
+        for flag, expected in (("", "False"), ("1", "True")):
+            env["USAGE_FAKE_ENGINE"] = flag
+            out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True,
+                                 cwd=os.path.join(os.path.dirname(__file__), ".."))
+            self.assertEqual(out.stdout.strip(), expected)
+
+    def test_unknown_engine_fails_every_pid(self):
+        results = read_usage_batch([1, 2], engine="nope")
+        self.assertEqual([r["pid"] for r in results], [1, 2])
+        self.assertTrue(all("error" in r for r in results))
+
+
+class CgroupEngineTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = os.path.join(tmp.name, "cgroup")
+        self.proc = os.path.join(tmp.name, "proc")
+        os.makedirs(os.path.join(self.proc, "42"))
+        with open(os.path.join(self.proc, "42", "cgroup"), "w") as f:
+            f.write("0::/system.slice/app.service\n")
+        self.write("", "cgroup.controllers", "cpu memory io\n")
+        self.write("system.slice/app.service", "cpu.stat", "usage_usec 3500000\nuser_usec 2500000\nsystem_usec 1000000\n")
+        self.write("system.slice/app.service", "memory.peak", "10485760\n")
+        self.write("system.slice/app.service", "memory.stat", "anon 1\npgfault 120\npgmajfault 20\n")
+        self.write("system.slice/app.service", "io.stat",
+                   "8:0 rbytes=1024 wbytes=2048 rios=1 wios=2\n8:16 rbytes=1024 wbytes=0 rios=1 wios=0\n")
+        self.engine = CgroupEngine(root=self.root, proc_root=self.proc)
+
+    def write(self, cgroup, name, text):
+        directory = os.path.join(self.root, cgroup)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, name), "w") as f:
+            f.write(text)
+
+    def test_pid_resolves_to_cgroup_totals(self):
+        usage = CRusage()
+        self.assertTrue(self.engine.available())
+        self.assertEqual(self.engine.read(42, usage), 0)
+        self.assertEqual((usage.ru_utime.tv_sec, usage.ru_utime.tv_usec), (2, 500000))
+        self.assertEqual(usage.ru_stime.tv_sec, 1)
+        self.assertEqual(usage.ru_maxrss, 10240)
+        self.assertEqual((usage.ru_minflt, usage.ru_majflt), (100, 20))
+        self.assertEqual((usage.ru_inblock, usage.ru_oublock), (4, 4))
+
+    def test_cached_fds_see_new_values(self):
+        self.engine.read_cgroup("system.slice/app.service", CRusage())
+        self.write("system.slice/app.service", "cpu.stat", "user_usec 9000000\nsystem_usec 0\n")
+        usage = CRusage()
+        self.assertEqual(self.engine.read_cgroup("/system.slice/app.service/", usage), 0)
+        self.assertEqual(usage.ru_utime.tv_sec, 9)
+        self.assertEqual(len(self.engine._open), 1)
+
+    def test_missing_cgroup_and_pid(self):
+        self.assertEqual(self.engine.read_cgroup("nope", CRusage()), errno.ENOENT)
+        self.assertEqual(self.engine.read_cgroup("../etc", CRusage()), errno.EINVAL)
+        self.assertEqual(self.engine.read(7, CRusage()), errno.ESRCH)
+
+    def test_usage_endpoint_shares_cache_rates_and_timings(self):
+        from fastapi.testclient import TestClient
+        from app.coalesce import usage_cache
+        from app.main import app
+        from app.rates import rate_tracker
+
+        client = TestClient(app)
+        with mock.patch.dict(ENGINES, {"cgroup": self.engine}), mock.patch.object(rate_tracker, "min_interval", 0.1):
+            first = client.get("/usage", params={"cgroup": "system.slice/app.service"}).json()
+            hits = usage_cache.hits
+            again = client.get("/usage", params={"cgroup": "/system.slice/app.service/"}).json()
+            self.assertEqual(usage_cache.hits, hits + 1)
+            self.assertEqual(again, first)
+            time.sleep(usage_cache.ttl + 0.05)
+            self.write("system.slice/app.service", "cpu.stat", "user_usec 2600000\nsystem_usec 1000000\n")
+            later = client.get("/usage", params={"cgroup": "system.slice/app.service", "timings": "true"}).json()
+        self.assertEqual(first["cgroup"], "/system.slice/app.service")
+        self.assertEqual(first["engine"], "cgroup")
+        self.assertIsNone(first["rates"])
+        self.assertGreater(later["rates"]["cpu_percent"], 0)
+        self.assertIn("total", later["timings"])
+
+
+class EngineSelectionTests(unittest.TestCase):
+    def test_unknown_engine(self):
+        self.assertIsNone(get_engine("nope"))
+        self.assertIn("error", read_usage(os.getpid(), "nope"))
+
+    def test_procfs_result_schema(self):
+        result = read_usage(os.getpid(), "procfs")
+        self.assertEqual(result["engine"], "procfs")
+        self.assertEqual(result["pid"], os.getpid())
+        for key in ("user_time", "sys_time", "max_rss_kb", "voluntary_ctx_switches"):
+            self.assertIn(key, result)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.metadata import ProcessMetadataCache, process_start_time
+
+
+class MetadataCacheTests(unittest.TestCase):
+    def test_repeated_lookups_hit(self):
+        cache = ProcessMetadataCache(maxsize=8)
+        first = cache.name(os.getpid())
+        self.assertEqual(cache.name(os.getpid()), first)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_pid_reuse_is_a_miss(self):
+        cache = ProcessMetadataCache(maxsize=8)
+        pid = os.getpid()
+        cache._entries[(pid, process_start_time(pid) - 1)] = "stale"
+        self.assertNotEqual(cache.name(pid), "stale")
+        self.assertEqual(cache.misses, 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = ProcessMetadataCache(maxsize=1)
+        cache.name(os.getpid())
+        cache.name(os.getppid())
+        self.assertEqual(len(cache._entries), 1)
+        self.assertIn(os.getppid(), [pid for pid, _ in cache._entries])
+
+    def test_missing_process(self):
+        self.assertIsNone(process_start_time(2**22 + 1))
+        self.assertEqual(ProcessMetadataCache().name(2**22 + 1), "N/A")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.metrics import MetricsCollector, render
+
+
+class RenderTests(unittest.TestCase):
+    sample = {"pid": 7, "process_name": 'a"b', "engine": "procfs", "user_time": 1.5, "max_rss_kb": 2}
+
+    def test_openmetrics_counters_and_eof(self):
+        text = render([self.sample, {"error": "No such process", "pid": 9}])
+        self.assertIn("# TYPE rusage_cpu_user_seconds counter", text)
+        self.assertIn('rusage_cpu_user_seconds_total{pid="7",process_name="a\\"b",engine="procfs"} 1.5', text)
+        self.assertIn('rusage_max_rss_bytes{pid="7",process_name="a\\"b",engine="procfs"} 2048.0', text)
+        self.assertIn('rusage_up{pid="9"} 0', text)
+        self.assertTrue(text.endswith("# EOF\n"))
+
+    def test_prometheus_text_format(self):
+        text = render([self.sample], openmetrics=False)
+        self.assertIn("# TYPE rusage_cpu_user_seconds_total counter", text)
+        self.assertNotIn("# EOF", text)
+
+
+class CollectorTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.reads = []
+
+    def read(self, pids):
+        self.reads.append(list(pids))
+        return [{"pid": p} for p in pids]
+
+    async def test_concurrent_scrapes_share_one_read(self):
+        collector = MetricsCollector(read=self.read, pids=[1, 2], names=[], ttl=60)
+        results = await asyncio.gather(*(collector.collect(watched=[2, 3]) for _ in range(5)))
+        self.assertEqual(self.reads, [[1, 2, 3]])
+        self.assertTrue(all(r == results[0] for r in results))
+
+    async def test_expired_scrape_reads_again(self):
+        collector = MetricsCollector(read=self.read, pids=[1], names=[], ttl=0)
+        await collector.collect()
+        await collector.collect()
+        self.assertEqual(collector.collections, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import subprocess
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.process_index import ProcessIndex
+
+
+class ProcessIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.index = ProcessIndex(min_refresh=0, history=4)
+        self.base = self.index.refresh()
+
+    def test_delta_reports_added_and_removed(self):
+        child = subprocess.Popen(["sleep", "30"])
+        try:
+            gen = self.index.refresh()
+            delta = self.index.delta(self.base)
+            self.assertFalse(delta["reset"])
+            self.assertIn(child.pid, [p["pid"] for p in delta["added"]])
+        finally:
+            child.kill()
+            child.wait()
+        self.index.refresh()
+        delta = self.index.delta(gen)
+        self.assertEqual([p["pid"] for p in delta["added"]], [])
+        self.assertIn(child.pid, [p["pid"] for p in delta["removed"]])
+
+    def test_unchanged_generation_is_empty(self):
+        delta = self.index.delta(self.index.generation)
+        self.assertEqual((delta["added"], delta["changed"], delta["removed"]), ([], [], []))
+
+    def test_stale_since_resets(self):
+        self.index.generation += 10
+        delta = self.index.delta(0)
+        self.assertTrue(delta["reset"])
+        self.assertIn(os.getpid(), [p["pid"] for p in delta["added"]])
+
+    def test_snapshot_json_cached_per_generation(self):
+        self.assertIs(self.index.snapshot_json(), self.index.snapshot_json())
+
+    def test_query_top_n_by_rss(self):
+        total, page = self.index.query(fields=["rss"], sort="-rss", limit=3)
+        self.assertGreaterEqual(total, len(page))
+        self.assertLessEqual(len(page), 3)
+        values = [p["rss"] for p in page]
+        self.assertEqual(values, sorted(values, reverse=True))
+
+    def test_query_filter_and_projection(self):
+        total, page = self.index.query(fields=["ppid"], name="python", sort="pid")
+        self.assertIn(os.getpid(), [p["pid"] for p in page])
+        self.assertEqual(total, len(page))
+        self.assertTrue(all("ppid" in p and "rss" not in p for p in page))
+
+    def test_query_rejects_unknown_sort(self):
+        with self.assertRaises(ValueError):
+            self.index.query(sort="bogus")
+
+    def test_instances_do_not_share_etags(self):
+        # A restarted server starts counting generations from 0 again
+        other = ProcessIndex(min_refresh=0)
+        self.assertNotEqual(other.instance, self.index.instance)
+
+
+class ProcessesEndpointTests(unittest.TestCase):
+    def test_etag_from_another_run_is_not_matched(self):
+        from fastapi.testclient import TestClient
+        from app.main import app
+        from app.process_index import process_index
+
+        client = TestClient(app)
+        first = client.get("/processes")
+        self.assertTrue(first.headers["etag"].startswith(f'"{process_index.instance}-'))
+        generation = first.headers["x-process-generation"]
+        stale = client.get("/processes", headers={"If-None-Match": f'"{generation}"'})
+        self.assertEqual(stale.status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
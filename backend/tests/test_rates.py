@@ -0,0 +1,56 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.rates import RateTracker, compute_rates
+
+
+class RateTests(unittest.TestCase):
+    def test_first_sample_has_no_rates(self):
+        out = RateTracker().annotate({"pid": os.getpid(), "user_time": 1.0}, now=10.0)
+        self.assertIsNone(out["rates"])
+
+    def test_rates_over_interval(self):
+        tracker = RateTracker()
+        pid = os.getpid()
+        tracker.annotate({"pid": pid, "user_time": 1.0, "sys_time": 0.5, "minor_page_faults": 100}, now=10.0)
+        out = tracker.annotate({"pid": pid, "user_time": 1.5, "sys_time": 1.0, "minor_page_faults": 300}, now=12.0)
+        rates = out["rates"]
+        self.assertAlmostEqual(rates["interval"], 2.0)
+        self.assertAlmostEqual(rates["cpu_percent"], 50.0)
+        self.assertAlmostEqual(rates["user_percent"], 25.0)
+        self.assertAlmostEqual(rates["minor_faults_per_sec"], 100.0)
+
+    def test_back_to_back_reads_keep_the_baseline(self):
+        tracker = RateTracker(min_interval=0.5)
+        pid = os.getpid()
+        tracker.annotate({"pid": pid, "user_time": 1.0}, now=10.0)
+        # 7 ms later a single clock tick would read as 143% CPU
+        self.assertIsNone(tracker.annotate({"pid": pid, "user_time": 1.01}, now=10.007)["rates"])
+        rates = tracker.annotate({"pid": pid, "user_time": 1.5}, now=11.0)["rates"]
+        self.assertAlmostEqual(rates["interval"], 1.0)
+        self.assertAlmostEqual(rates["cpu_percent"], 50.0)
+        # Reads inside the next window repeat the last full-window rates
+        again = tracker.annotate({"pid": pid, "user_time": 1.52}, now=11.005)["rates"]
+        self.assertEqual(again, rates)
+        rates = tracker.annotate({"pid": pid, "user_time": 1.75}, now=11.5)["rates"]
+        self.assertAlmostEqual(rates["cpu_percent"], 50.0)
+
+    def test_counter_decrease_is_clamped(self):
+        rates = compute_rates({"major_page_faults": 10}, {"major_page_faults": 4}, 1.0)
+        self.assertEqual(rates["major_faults_per_sec"], 0.0)
+
+    def test_errors_pass_through(self):
+        sample = {"error": "No such process", "pid": 1}
+        self.assertIs(RateTracker().annotate(sample), sample)
+
+    def test_bounded_entries(self):
+        tracker = RateTracker(max_entries=1)
+        tracker.annotate({"pid": os.getpid()}, now=1.0)
+        tracker.annotate({"pid": os.getppid()}, now=1.0)
+        self.assertEqual(len(tracker._previous), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import asyncio
+import contextlib
+import io
+import tempfile
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.metadata import process_start_time
+from app.sampler import RingBuffer, Sampler
+from app.store import UsageStore
+
+
+class RingBufferTests(unittest.TestCase):
+    def test_since_returns_only_new_samples(self):
+        rb = RingBuffer(capacity=4, fields=("a",))
+        for i in range(3):
+            rb.append(float(i), {"a": i * 10})
+        start, rows = rb.since(1)
+        self.assertEqual(start, 1)
+        self.assertEqual([r["a"] for r in rows], [10.0, 20.0])
+        self.assertEqual(rb.next_seq, 3)
+
+    def test_wraps_and_drops_oldest(self):
+        rb = RingBuffer(capacity=3, fields=("a",))
+        for i in range(5):
+            rb.append(float(i), {"a": i})
+        self.assertEqual(len(rb), 3)
+        start, rows = rb.since(0)
+        self.assertEqual(start, 2)
+        self.assertEqual([r["seq"] for r in rows], [2, 3, 4])
+        self.assertEqual([r["ts"] for r in rows], [2.0, 3.0, 4.0])
+
+    def test_missing_fields_default_to_zero(self):
+        rb = RingBuffer(capacity=2, fields=("a", "b"))
+        rb.append(1.0, {"a": 5})
+        _, rows = rb.since(0)
+        self.assertEqual(rows[0]["b"], 0.0)
+
+
+class SamplerTests(unittest.TestCase):
+    def test_repeated_failure_is_logged_once(self):
+        async def dead(pid):
+            return {"error": "No such process", "pid": pid}
+
+        async def run():
+            sampler = Sampler(sample_fn=dead)
+            watch = sampler.add_watch(4242, 0.1)
+            await asyncio.sleep(0.35)
+            await sampler.stop()
+            return watch
+
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            watch = asyncio.run(run())
+        self.assertEqual(watch.last_error, "No such process")
+        self.assertEqual(stderr.getvalue().count("Watch on PID 4242 failed"), 1)
+
+    def test_samples_persist_under_the_process_start_time(self):
+        pid = os.getpid()
+
+        async def alive(pid):
+            return {"pid": pid, "user_time": 1.0}
+
+        async def run(store):
+            sampler = Sampler(sample_fn=alive, store=store)
+            sampler.add_watch(pid, 0.1)
+            await asyncio.sleep(0.25)
+            await sampler.stop()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = UsageStore(tmp, ("user_time",))
+            asyncio.run(run(store))
+            self.assertEqual(store.start_times(pid), [process_start_time(pid)])
+            rows, _ = store.range(pid)
+            self.assertGreaterEqual(len(rows), 2)
+            self.assertEqual(rows[0]["user_time"], 1.0)
+
+    def test_late_persist_after_removal_leaves_no_open_segment(self):
+        async def run(store):
+            sampler = Sampler(sample_fn=lambda pid: asyncio.sleep(3600), store=store)
+            watch = sampler.add_watch(os.getpid(), 0.1)
+            sampler.remove_watch(os.getpid())
+            # An append that was already queued on the usage pool
+            sampler._persist(watch, 1.0, {"user_time": 1.0})
+            await sampler.stop()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = UsageStore(tmp, ("user_time",))
+            asyncio.run(run(store))
+            self.assertEqual(store._open, {})
+            self.assertEqual(store.pids(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import sys
+import os
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.store import HEADER, UsageStore
+
+START = 1000
+
+
+class UsageStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def make_store(self, **kw):
+        store = UsageStore(self.tmp.name, ("a", "b"), **kw)
+        self.addCleanup(store.close)
+        return store
+
+    def test_range_is_inclusive_and_ordered(self):
+        store = self.make_store()
+        for i in range(10):
+            store.append(1, START, 100.0 + i, {"a": i, "b": i * 2})
+        rows, truncated = store.range(1, 103, 106)
+        self.assertFalse(truncated)
+        self.assertEqual([r["ts"] for r in rows], [103.0, 104.0, 105.0, 106.0])
+        self.assertEqual(rows[0], {"ts": 103.0, "a": 3.0, "b": 6.0})
+
+    def test_range_spans_rotated_segments(self):
+        store = self.make_store(segment_records=3, retention_hours=1000, max_segments=100)
+        for i in range(10):
+            store.append(1, START, 100.0 + i, {"a": i})
+        self.assertEqual(len(store._segments(1, START)), 4)
+        rows, _ = store.range(1, 102, 108)
+        self.assertEqual([r["a"] for r in rows], [2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0])
+
+    def test_limit_truncates(self):
+        store = self.make_store()
+        for i in range(5):
+            store.append(1, START, float(i), {})
+        rows, truncated = store.range(1, limit=2)
+        self.assertTrue(truncated)
+        self.assertEqual(len(rows), 2)
+
+    def test_retention_drops_old_segments(self):
+        store = self.make_store(segment_records=2, retention_hours=1000, max_segments=2)
+        for i in range(10):
+            store.append(1, START, float(i), {})
+        self.assertEqual(len(store._segments(1, START)), 2)
+        rows, _ = store.range(1)
+        self.assertEqual(rows[0]["ts"], 6.0)
+
+    def test_survives_restart_and_torn_tail(self):
+        store = self.make_store()
+        for i in range(3):
+            store.append(7, START, float(i), {"a": i})
+        store.close()
+        path = os.path.join(self.tmp.name, f"7-{START}", store._segments(7, START)[0])
+        with open(path, "ab") as f:
+            f.write(b"\x01\x02\x03") # Partial record from a crash
+        reopened = self.make_store()
+        reopened.append(7, START, 3.0, {"a": 3})
+        rows, _ = reopened.range(7)
+        self.assertEqual([r["a"] for r in rows], [0.0, 1.0, 2.0, 3.0])
+        self.assertEqual(os.path.getsize(path), HEADER.size + 4 * reopened.record.size)
+        self.assertEqual(reopened.pids(), [7])
+
+    def test_reused_pid_starts_a_new_history(self):
+        store = self.make_store()
+        store.append(5, START, 1.0, {"a": 1})
+        store.append(5, START + 50, 2.0, {"a": 2})
+        self.assertEqual(store.start_times(5), [START, START + 50])
+        self.assertEqual(store.pids(), [5])
+        rows, _ = store.range(5)
+        self.assertEqual([r["a"] for r in rows], [2.0])
+        rows, _ = store.range(5, start_time=START)
+        self.assertEqual([r["a"] for r in rows], [1.0])
+
+    def test_previous_process_expires_with_retention(self):
+        store = self.make_store(retention_hours=1)
+        store.append(5, START, 1.0, {})
+        old = os.path.join(self.tmp.name, f"5-{START}")
+        seg = os.path.join(old, store._segments(5, START)[0])
+        os.utime(seg, (0, 0))
+        store.append(5, START + 50, 7200.0, {})
+        self.assertFalse(os.path.exists(old))
+        self.assertEqual(store.start_times(5), [START + 50])
+
+    def test_unknown_pid_is_empty(self):
+        self.assertEqual(self.make_store().range(42), ([], False))
+
+
+if __name__ == "__main__":
+    unittest.main()
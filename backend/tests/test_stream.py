@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from fastapi.testclient import TestClient
+from app.coalesce import usage_cache
+from app.engines import ENGINES, FakeEngine
+from app.main import app
+
+
+class UsageStreamTests(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+        patcher = mock.patch.dict(ENGINES, {"fake": FakeEngine()})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_pushes_samples_then_done(self):
+        with self.client.websocket_connect("/usage/stream?pid=42&interval=0.1&samples=3&engine=fake") as ws:
+            messages = [ws.receive_json() for _ in range(4)]
+        self.assertEqual([m["type"] for m in messages], ["usage", "usage", "usage", "done"])
+        self.assertEqual(messages[0]["data"]["pid"], 42)
+        self.assertEqual(messages[0]["data"]["engine"], "fake")
+        self.assertLessEqual(messages[0]["ts"], messages[2]["ts"])
+
+    def test_errors_are_pushed_as_samples(self):
+        with self.client.websocket_connect("/usage/stream?pid=0&interval=0.1&samples=1&engine=fake") as ws:
+            message = ws.receive_json()
+            self.assertEqual(ws.receive_json()["type"], "done")
+        self.assertIn("error", message["data"])
+
+    def test_timings_breakdown(self):
+        with self.client.websocket_connect("/usage/stream?pid=43&samples=1&engine=fake&timings=true") as ws:
+            message = ws.receive_json()
+        self.assertIn("total", message["data"]["timings"])
+
+    def test_client_disconnect_stops_the_stream(self):
+        reads = []
+        get = usage_cache.get
+
+        async def counting_get(pid, engine=None):
+            reads.append(pid)
+            return await get(pid, engine)
+
+        with mock.patch.object(usage_cache, "get", counting_get):
+            with self.client.websocket_connect("/usage/stream?pid=44&interval=0.1&engine=fake") as ws:
+                self.assertEqual(ws.receive_json()["type"], "usage")
+            time.sleep(0.15)
+            stopped_at = len(reads)
+            time.sleep(0.3)
+        self.assertEqual(len(reads), stopped_at)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.executor import run_usage
+from app.timing import Histogram, Timings, span, timings, trace
+
+
+class HistogramTests(unittest.TestCase):
+    def test_quantiles_come_from_log_buckets(self):
+        h = Histogram()
+        for _ in range(99):
+            h.record(3_000) # 3 µs -> bucket under 4 µs
+        h.record(5_000_000) # 5 ms
+        snap = h.snapshot()
+        self.assertEqual(snap["count"], 100)
+        self.assertEqual(snap["p50_ms"], 0.004)
+        self.assertEqual(snap["max_ms"], 5.0)
+        self.assertEqual(snap["buckets"], {4: 99, 8192: 1})
+
+    def test_disabled_timings_keep_no_histograms(self):
+        t = Timings(enabled=False)
+        t.record("x", 10)
+        self.assertEqual(t.snapshot(), {})
+
+
+class TraceTests(unittest.IsolatedAsyncioTestCase):
+    async def test_trace_collects_spans_from_executor(self):
+        def work():
+            with span("test.stage"):
+                return 42
+
+        with trace() as stages:
+            self.assertEqual(await run_usage(work), 42)
+        self.assertIn("test.stage", stages)
+        self.assertIn("usage.executor_wait", stages)
+        self.assertIn("total", stages)
+        self.assertIn("test.stage", timings.snapshot())
+
+    async def test_untraced_spans_do_not_leak_into_traces(self):
+        with trace() as stages:
+            pass
+        with span("test.other"):
+            await asyncio.sleep(0)
+        self.assertEqual(list(stages), ["total"])
+
+
+if __name__ == "__main__":
+    unittest.main()
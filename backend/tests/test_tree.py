@@ -0,0 +1,82 @@
+import os
+import subprocess
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from app.engines import CLK_TCK, ProcfsEngine
+from app.tree import usage_tree
+
+
+class FakeTree(ProcfsEngine):
+    """1 -> (2 -> 4, 3); rows are [utime, stime, maxrss, ...] in ticks."""
+
+    edges = {1: None, 2: 1, 3: 1, 4: 2}
+    rows = {
+        1: [10, 0, 100, 1, 0, 0, 0, 0, 0],
+        2: [20, 10, 300, 1, 0, 0, 0, 0, 0],
+        3: [1, 0, 50, 1, 0, 0, 0, 0, 0],
+        4: [40, 0, 200, 1, 0, 0, 0, 0, 0],
+    }
+
+    def available(self) -> bool:
+        return True
+
+    def walk(self, pid):
+        depth = {1: 0, 2: 1, 3: 1, 4: 2}
+        return [(p, self.edges[p], depth[p]) for p in (1, 2, 3, 4)]
+
+    def read_process(self, pid):
+        row = self.rows.get(pid)
+        return list(row) if row else None
+
+
+class UsageTreeTests(unittest.TestCase):
+    def test_self_and_subtree_aggregates(self):
+        tree = usage_tree(1, engine=FakeTree())
+        root = tree["root"]
+        self.assertEqual(tree["processes"], 4)
+        self.assertEqual(root["self"]["user_time"], 10 / CLK_TCK)
+        self.assertEqual(root["subtree"]["user_time"], 71 / CLK_TCK)
+        self.assertEqual(root["subtree"]["max_rss_kb"], 300)
+        self.assertEqual(root["subtree"]["minor_page_faults"], 4)
+        # Children are ordered by subtree CPU time
+        self.assertEqual([c["pid"] for c in root["children"]], [2, 3])
+        self.assertEqual(root["children"][0]["subtree"]["user_time"], 60 / CLK_TCK)
+        self.assertEqual(root["children"][0]["processes"], 2)
+
+    def test_min_share_folds_small_children(self):
+        root = usage_tree(1, min_share=0.05, engine=FakeTree())["root"]
+        self.assertEqual([c["pid"] for c in root["children"]], [2])
+        self.assertEqual(root["pruned"]["count"], 1)
+        self.assertEqual(root["pruned"]["subtree"]["user_time"], 1 / CLK_TCK)
+
+    def test_depth_truncates_but_keeps_totals(self):
+        root = usage_tree(1, max_depth=1, engine=FakeTree())["root"]
+        child = root["children"][0]
+        self.assertEqual(child["children"], [])
+        self.assertEqual(child["truncated"], 1)
+        self.assertEqual(child["subtree"]["user_time"], 60 / CLK_TCK)
+
+    def test_exited_process_drops_its_subtree(self):
+        engine = FakeTree()
+        engine.rows = {p: r for p, r in FakeTree.rows.items() if p != 2}
+        tree = usage_tree(1, engine=engine)
+        self.assertEqual(tree["processes"], 2)
+        self.assertEqual([c["pid"] for c in tree["root"]["children"]], [3])
+
+    def test_missing_root(self):
+        self.assertIn("error", usage_tree(2**22 + 1, engine=FakeTree()))
+
+    def test_live_child(self):
+        child = subprocess.Popen(["sleep", "30"])
+        try:
+            tree = usage_tree(os.getpid(), engine=ProcfsEngine())
+            self.assertIn(child.pid, [c["pid"] for c in tree["root"]["children"]])
+        finally:
+            child.kill()
+            child.wait()
+
+
+if __name__ == "__main__":
+    unittest.main()